@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('eraser.ico', '.')],
-    hiddenimports=[],
+    hiddenimports=['stripeoff.core'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
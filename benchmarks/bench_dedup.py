@@ -0,0 +1,94 @@
+"""Выигрыш от поиска дубликатов в пакете: одинаковые файлы под разными именами.
+
+Два набора: с сильным дублированием (несколько логотипов и шаблонов страниц,
+каждый в десятках копий, плюс уникальные файлы) и без дубликатов — на нём
+видна цена хэширования. Каждый набор обрабатывается с dedup=False и
+dedup=True; результаты обоих прогонов сверяются побайтно.
+
+Запуск: python benchmarks/bench_dedup.py [--workers 2] [--copies 20]
+"""
+
+import argparse
+import filecmp
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import build_corpus, case_path
+from stripeoff.batch import BatchProcessor
+
+# (формат, размер, рамка): повторяющиеся файлы и уникальные
+REPEATED = (('png', '1mp', 'wide'), ('png-alpha', '1mp', 'wide'), ('jpg', '12mp', 'wide'), ('png', '12mp', 'none'))
+UNIQUE = (('jpg', '1mp', 'wide'), ('png', '1mp', 'none'), ('jpg', '12mp', 'none'), ('png', '12mp', 'wide'))
+
+
+def prepare(corpus: str, directory: str, cases: tuple, copies: int) -> list[str]:
+    """Скопировать каждый файл набора copies раз под разными именами."""
+    os.makedirs(directory)
+    paths = []
+    for fmt, size, border in cases:
+        source = case_path(corpus, fmt, size, border)
+        name, ext = os.path.splitext(os.path.basename(source))
+        for index in range(copies):
+            path = os.path.join(directory, f'{name}_{index}{ext}')
+            shutil.copyfile(source, path)
+            paths.append(path)
+    return paths
+
+
+def run_batch(paths: list[str], output_dir: str, workers: int, dedup: bool) -> tuple[float, BatchProcessor]:
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    processor = BatchProcessor(lambda task, result: None, workers, dedup=dedup)
+    for index, path in enumerate(paths):
+        processor.add_task(index, path, os.path.join(output_dir, os.path.basename(path)))
+    processor.close()
+    start = time.perf_counter()
+    processor.run()
+    return time.perf_counter() - start, processor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--copies', type=int, default=20, help='copies of each repeated file')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per variant (median is reported)')
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='stripeoff_dedup_')
+    try:
+        corpus = os.path.join(work, 'corpus')
+        build_corpus(corpus, list(REPEATED + UNIQUE))
+        sets = {
+            'duplicated': prepare(corpus, os.path.join(work, 'duplicated'), REPEATED, args.copies)
+            + prepare(corpus, os.path.join(work, 'duplicated_unique'), UNIQUE, 1),
+            'unique': prepare(corpus, os.path.join(work, 'unique'), REPEATED + UNIQUE, 1),
+        }
+        print(f'workers: {args.workers}')
+        print(f'{"set":<11} {"files":>6} {"MB":>6} {"no dedup":>9} {"dedup":>8} {"speedup":>8} {"duplicates":>11}')
+        for name, paths in sets.items():
+            outputs = {dedup: os.path.join(work, f'out_{dedup}') for dedup in (False, True)}
+            times = {}
+            for dedup in (False, True):
+                runs = [run_batch(paths, outputs[dedup], args.workers, dedup) for _ in range(args.repeat)]
+                times[dedup] = statistics.median(elapsed for elapsed, _ in runs)
+                processor = runs[-1][1]
+            mismatch = filecmp.dircmp(outputs[False], outputs[True])
+            if mismatch.left_only or mismatch.right_only or filecmp.cmpfiles(
+                    outputs[False], outputs[True], os.listdir(outputs[False]), shallow=False)[1]:
+                sys.exit(f'FAIL: results differ on the {name} set')
+            total_mb = sum(os.path.getsize(path) for path in paths) / 2 ** 20
+            print(f'{name:<11} {len(paths):>6} {total_mb:>6.0f} {times[False]:>8.2f}s {times[True]:>7.2f}s '
+                  f'{times[False] / times[True]:>7.2f}x {processor.duplicates:>4} '
+                  f'({processor.duplicate_bytes / 2 ** 20:.0f} MB)', flush=True)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Время кодирования и размер результата для наборов параметров кодера (ENCODER_PRESETS).
+
+Замеряется только cv2.imencode с параметрами набора — то, что remove_borders
+делает на этапе encode. Изображения детерминированы: «скриншот» (плоские
+области и текст), «фотография» (гладкий шум из bench_suite) и «фотография»
+после JPEG (с артефактами сжатия, как у большинства входных файлов).
+
+Запуск: python benchmarks/bench_encoders.py [--size 12mp] [--formats png,jpg] [--repeat 3]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from bench_suite import SIZES, make_image, parse_list
+from stripeoff.constants import DEFAULT_ENCODER_PRESET, ENCODER_PRESETS
+from stripeoff.core import _encode_params
+
+FORMATS = ('png', 'jpg', 'webp', 'bmp')   # WebP и BMP наборы не меняют, они здесь для проверки
+
+
+def make_screenshot(size: str) -> np.ndarray:
+    """Интерфейс на светлом фоне: залитые прямоугольники и строки текста."""
+    width, height = SIZES[size]
+    rng = np.random.default_rng(1)
+    image = np.full((height, width, 3), 245, np.uint8)
+    for _ in range(width * height // 30000):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        color = tuple(int(value) for value in rng.integers(0, 255, 3))
+        cv2.rectangle(image, (x, y), (x + int(rng.integers(20, 400)), y + int(rng.integers(10, 200))), color, -1)
+    for index in range(width * height // 4000):
+        origin = (int(rng.integers(0, width)), int(rng.integers(20, height)))
+        cv2.putText(image, f'Lorem ipsum {index}', origin, cv2.FONT_HERSHEY_SIMPLEX, 0.6, (20, 20, 20), 1, cv2.LINE_AA)
+    return image
+
+
+def make_images(size: str) -> dict[str, np.ndarray]:
+    photo = make_image('png', size, 'none')
+    jpeg = cv2.imdecode(cv2.imencode('.jpg', photo)[1], cv2.IMREAD_UNCHANGED)
+    return {'screenshot': make_screenshot(size), 'photo': photo, 'photo-jpeg': jpeg}
+
+
+def measure(image: np.ndarray, ext: str, preset: str, repeat: int) -> tuple[float, int]:
+    """Медиана времени кодирования, с, и размер результата, байт."""
+    params = _encode_params(ext, preset)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ok, buffer = cv2.imencode(ext, image, params)
+        times.append(time.perf_counter() - start)
+        if not ok:
+            raise RuntimeError(f'cannot encode {ext} with preset {preset}')
+    return statistics.median(times), buffer.size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', choices=SIZES, default='12mp', help='image size')
+    parser.add_argument('--formats', type=lambda v: parse_list(v, dict.fromkeys(FORMATS)), default=['png', 'jpg'],
+                        help=f'comma-separated subset of: {",".join(FORMATS)}')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case (median is reported)')
+    args = parser.parse_args()
+
+    images = make_images(args.size)
+    print(f'size: {args.size}, OpenCV {cv2.__version__}; sizes relative to {DEFAULT_ENCODER_PRESET}')
+    print(f'{"image":<11} {"format":<6} {"preset":<9} {"encode":>9} {"output":>9} {"size":>6}')
+    for name, image in images.items():
+        for fmt in args.formats:
+            baseline = None
+            for preset in ENCODER_PRESETS:
+                elapsed, output = measure(image, f'.{fmt}', preset, args.repeat)
+                baseline = baseline or output
+                print(f'{name:<11} {fmt:<6} {preset:<9} {elapsed * 1000:>7.0f}ms {output / 2 ** 20:>7.2f}MB '
+                      f'{output / baseline:>6.0%}', flush=True)
+
+
+if __name__ == '__main__':
+    main()
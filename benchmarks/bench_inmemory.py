@@ -0,0 +1,96 @@
+"""Обработка в памяти против обработки через временные файлы.
+
+Так делает сервис, получивший изображение по сети: байты загрузки нужно
+обрезать и вернуть байты результата. Через remove_borders — записать
+временный файл, обработать его в другой временный файл и прочитать результат;
+через crop_bytes — передать байты напрямую. Для декодированного изображения
+crop_array возвращает срез массива без копирования.
+
+Запуск: python benchmarks/bench_inmemory.py [--repeat 5]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from bench_suite import build_corpus, case_path
+from stripeoff.core import crop_array, crop_bytes, remove_borders
+
+CASES = (('jpg', '1mp', 'wide'), ('png', '1mp', 'wide'), ('jpg', '12mp', 'wide'), ('png', '12mp', 'wide'),
+         ('jpg', '12mp', 'none'))
+
+
+def via_files(data: bytes, ext: str, directory: str) -> bytes:
+    """Обрезать байты через временные файлы, как пришлось бы с remove_borders."""
+    with tempfile.NamedTemporaryFile(suffix=ext, dir=directory, delete=False) as file:
+        file.write(data)
+    output_path = file.name + '.out' + ext
+    try:
+        remove_borders(file.name, output_path)
+        if not os.path.exists(output_path):
+            return data
+        with open(output_path, 'rb') as output:
+            return output.read()
+    finally:
+        os.remove(file.name)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+
+def in_memory(data: bytes) -> memoryview:
+    result = crop_bytes(data)
+    return result.encoded if result.encoded is not None else memoryview(data)
+
+
+def timed(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case (median is reported)')
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='stripeoff_inmemory_')
+    try:
+        build_corpus(work, list(CASES))
+        print(f'{"case":<16} {"temp files":>11} {"in memory":>10} {"speedup":>8}   {"crop+copy":>10} {"view":>8}')
+        for fmt, size, border in CASES:
+            path = case_path(work, fmt, size, border)
+            with open(path, 'rb') as file:
+                data = file.read()
+            if bytes(in_memory(data)) != via_files(data, os.path.splitext(path)[1], work):
+                sys.exit(f'FAIL: results differ for {path}')
+            files = timed(lambda: via_files(data, os.path.splitext(path)[1], work), args.repeat)
+            memory = timed(lambda: in_memory(data), args.repeat)
+            # Обрезка уже декодированного изображения: срез против копии результата
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+
+            def copy_crop():
+                cropped = crop_array(image).image
+                return None if cropped is None else cropped.copy()
+
+            copied = timed(copy_crop, args.repeat)
+            view = timed(lambda: crop_array(image), args.repeat)
+            print(f'{fmt}/{size}/{border:<8} {files * 1000:>9.1f}ms {memory * 1000:>8.1f}ms {files / memory:>7.2f}x '
+                  f'  {copied * 1000:>8.2f}ms {view * 1000:>6.2f}ms', flush=True)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Сравнение обрезки JPEG: перекодирование cv2.imencode против копирования блоков DCT (jpegtran).
+
+Запуск: python benchmarks/bench_jpeg_crop.py [--repeat 3]
+Путь к jpegtran берётся из STRIPEOFF_JPEGTRAN или PATH.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from stripeoff.core import _find_content_box
+from stripeoff.jpeg import crop_jpeg_lossless, find_jpegtran, read_jpeg_info, snap_box_to_mcu
+
+SIZES = ((2000, 1500), (4000, 3000), (6000, 4500), (8000, 6000))
+
+
+def make_scan(width: int, height: int) -> bytes:
+    """JPEG-«скан» с белыми полями и содержимым, похожим на фотографию."""
+    rng = np.random.default_rng(width)
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    top, left = height // 20 + 3, width // 25 + 5
+    noise = rng.integers(0, 230, size=(height - 2 * top, width - 2 * left, 3), dtype=np.uint8)
+    image[top:height - top, left:width - left] = cv2.GaussianBlur(noise, (0, 0), 2)
+    return cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def best_of(repeat: int, func) -> tuple[float, object]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement (best is reported)')
+    args = parser.parse_args()
+    if find_jpegtran() is None:
+        sys.exit('jpegtran not found: install libjpeg-turbo or set STRIPEOFF_JPEGTRAN')
+
+    print(f'{"size":>11} {"decode":>9} {"imencode":>9} {"jpegtran":>9} {"speedup":>8} '
+          f'{"imencode size":>14} {"jpegtran size":>14}')
+    for width, height in SIZES:
+        data = make_scan(width, height)
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+        top, bottom, left, right = box = _find_content_box(image)
+        snapped = snap_box_to_mcu(box, read_jpeg_info(data))
+
+        decode_time, _ = best_of(args.repeat, lambda: cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED))
+        encode_time, encoded = best_of(args.repeat, lambda: cv2.imencode('.jpg', image[top:bottom, left:right])[1])
+        lossless_time, lossless = best_of(args.repeat, lambda: crop_jpeg_lossless(data, snapped))
+        print(f'{width:>5}x{height:<5} {decode_time * 1000:>7.0f}ms {encode_time * 1000:>7.0f}ms '
+              f'{lossless_time * 1000:>7.0f}ms {encode_time / lossless_time:>7.2f}x '
+              f'{encoded.size / 1024:>12.0f}KB {len(lossless) / 1024:>12.0f}KB')
+
+
+if __name__ == '__main__':
+    main()
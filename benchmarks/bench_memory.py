@@ -0,0 +1,160 @@
+"""Проверка предела памяти пакетной обработки на смешанном наборе файлов.
+
+Набор: много мелких изображений, несколько 24 Мп и несколько 100 Мп, одно
+из которых больше предела. Пакет обрабатывается дважды — без предела и с ним;
+во время обработки суммарный RSS процессов пула снимается каждые 10 мс.
+Проверка проходит, если с пределом пик не превышает memory_limit (или оценку
+файла, который один больше предела) плюс память простаивающих процессов
+(интерпретатор с OpenCV).
+
+Только для Linux: RSS дочерних процессов читается из /proc.
+Запуск: python benchmarks/bench_memory.py [--workers 4] [--memory-limit 600]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import build_corpus, case_path
+from stripeoff.batch import BatchProcessor
+from stripeoff.headers import estimate_memory
+
+# (формат, размер, рамка, число копий)
+MIXED_CORPUS = (
+    ('png', '1mp', 'wide', 20),
+    ('jpg', '1mp', 'wide', 20),
+    ('png', '24mp', 'wide', 6),
+    ('jpg', '100mp', 'wide', 2),
+    ('png', '100mp', 'wide', 1),
+)
+
+
+def rss_bytes(pid: int) -> int:
+    try:
+        with open(f'/proc/{pid}/statm', encoding='ascii') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def worker_pids() -> list[int]:
+    """Процессы пула: прямые потомки текущего процесса, кроме resource_tracker."""
+    me = os.getpid()
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', encoding='ascii') as file:
+                # Имя процесса в скобках может содержать пробелы — поля считаем после него
+                fields = file.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) != me:
+            continue
+        try:
+            with open(f'/proc/{entry}/cmdline', 'rb') as file:
+                if b'resource_tracker' in file.read():
+                    continue
+        except OSError:
+            continue
+        pids.append(int(entry))
+    return pids
+
+
+class RssSampler(threading.Thread):
+    """Фоновый замер пика суммарного RSS процессов пула."""
+
+    def __init__(self, interval: float = 0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._finished = threading.Event()
+
+    def run(self) -> None:
+        while not self._finished.is_set():
+            self.peak = max(self.peak, sum(rss_bytes(pid) for pid in worker_pids()))
+            self._finished.wait(self.interval)
+
+    def stop(self) -> None:
+        self._finished.set()
+        self.join()
+
+
+def _idle_rss() -> int:
+    import stripeoff.core  # noqa: F401 — тот же набор модулей, что у процесса пула
+    return rss_bytes(os.getpid())
+
+
+def idle_worker_rss() -> int:
+    """RSS процесса пула, в котором загружен OpenCV, но ничего не обрабатывается."""
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_idle_rss)
+
+
+def run_batch(tasks: list[tuple[str, str]], workers: int, memory_limit: int) -> tuple[int, float]:
+    """Обработать пакет; вернуть пик суммарного RSS пула и время."""
+    processor = BatchProcessor(lambda task, result: None, workers, memory_limit=memory_limit)
+    for index, (path, output_path) in enumerate(tasks):
+        processor.add_task(index, path, output_path)
+    processor.close()
+    sampler = RssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    processor.run()
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+    return sampler.peak, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help='worker processes')
+    parser.add_argument('--memory-limit', type=int, default=600, metavar='MB', help='memory limit to check')
+    parser.add_argument('--corpus', metavar='DIR', help='keep the generated images here and reuse them next time')
+    args = parser.parse_args()
+    if not os.path.isdir('/proc'):
+        sys.exit('this check reads /proc and runs on Linux only')
+    memory_limit = args.memory_limit * 2 ** 20
+
+    corpus = args.corpus or tempfile.mkdtemp(prefix='stripeoff_corpus_')
+    output_dir = tempfile.mkdtemp(prefix='stripeoff_bench_out_')
+    try:
+        build_corpus(corpus, [(fmt, size, border) for fmt, size, border, _ in MIXED_CORPUS])
+        tasks = []
+        for fmt, size, border, copies in MIXED_CORPUS:
+            path = case_path(corpus, fmt, size, border)
+            name, ext = os.path.splitext(os.path.basename(path))
+            tasks += [(path, os.path.join(output_dir, f'{name}_{i}{ext}')) for i in range(copies)]
+        estimates = [estimate_memory(path) for path, _ in tasks]
+        print(f'files: {len(tasks)}, workers: {args.workers}, limit: {args.memory_limit} MB, '
+              f'largest estimate: {max(estimates) / 2 ** 20:.0f} MB, total estimate: {sum(estimates) / 2 ** 20:.0f} MB')
+
+        idle = idle_worker_rss()
+        # Файл больше предела обрабатывается один, поэтому пик может дойти до его оценки
+        allowed = max(memory_limit, max(estimates)) + idle * args.workers
+        print(f'idle worker RSS: {idle / 2 ** 20:.0f} MB -> allowed pool peak {allowed / 2 ** 20:.0f} MB')
+
+        unlimited_peak, unlimited_time = run_batch(tasks, args.workers, sum(estimates) * 2)
+        limited_peak, limited_time = run_batch(tasks, args.workers, memory_limit)
+        print(f'no limit:   peak {unlimited_peak / 2 ** 20:6.0f} MB, {unlimited_time:.1f} s')
+        print(f'with limit: peak {limited_peak / 2 ** 20:6.0f} MB, {limited_time:.1f} s')
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        if not args.corpus:
+            shutil.rmtree(corpus, ignore_errors=True)
+
+    if limited_peak > allowed:
+        sys.exit(f'FAIL: peak {limited_peak / 2 ** 20:.0f} MB exceeds {allowed / 2 ** 20:.0f} MB')
+    print('OK: peak stays under the limit')
+
+
+if __name__ == '__main__':
+    main()
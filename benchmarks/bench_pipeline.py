@@ -0,0 +1,192 @@
+"""Замер конвейера пакетной обработки: чтение наперёд и запись в отдельных потоках.
+
+Пакет обрабатывается дважды: с io_threads=0 (процессы пула сами читают и
+записывают файлы) и с потоками ввода-вывода. Оба варианта замеряются на
+локальном диске и на имитации медленного хранилища (сетевая папка, HDD):
+каждое открытие файла стоит --latency мс, а данные идут со скоростью
+--bandwidth МБ/с. Имитация подменяет open() в этом процессе и в процессах
+пула; файл, прочитанный целиком, считается в кэше ОС, и повторное чтение
+стоит только задержку. Время чтения засчитывается при закрытии файла по позиции в нём.
+
+Запуск: python benchmarks/bench_pipeline.py [--workers 2] [--latency 15] [--bandwidth 40]
+"""
+
+import builtins
+import hashlib
+import io
+import os
+import sys
+import time
+
+SLOW_IO_ENV = 'STRIPEOFF_BENCH_SLOW_IO'   # "задержка_мс,МБ_в_с,каталог_данных,каталог_меток"
+
+
+class SlowFile:
+    """Файл, закрытие которого длится столько, сколько заняли бы его чтение или запись."""
+
+    def __init__(self, file, storage: 'SlowStorage', path: str, writing: bool):
+        self._file = file
+        self._storage = storage
+        self._path = path
+        self._writing = writing
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        position = self._file.tell()
+        self._file.close()
+        self._storage.charge(self._path, position, self._writing)
+
+
+class SlowStorage:
+    """Медленное хранилище для файлов в каталоге данных (см. SLOW_IO_ENV)."""
+
+    def __init__(self, spec: str):
+        latency_ms, mb_per_s, self.data_dir, self.marks_dir = spec.split(',', 3)
+        self.latency = float(latency_ms) / 1000
+        self.bandwidth = float(mb_per_s) * 2 ** 20
+        self.real_open = io.open
+
+    def _mark(self, path: str) -> str:
+        return os.path.join(self.marks_dir, hashlib.md5(path.encode()).hexdigest())
+
+    def charge(self, path: str, size: int, writing: bool) -> None:
+        if not writing:
+            # Файл, однажды прочитанный целиком, отдаётся из кэша ОС: остаётся только задержка
+            mark = self._mark(path)
+            if os.path.exists(mark):
+                size = 0
+            elif size >= os.path.getsize(path):
+                self.real_open(mark, 'w').close()
+        time.sleep(self.latency + size / self.bandwidth)
+
+    def open(self, file, mode='r', *args, **kwargs):
+        opened = self.real_open(file, mode, *args, **kwargs)
+        if not isinstance(file, (str, os.PathLike)):
+            return opened
+        path = os.path.abspath(file)
+        if not path.startswith(self.data_dir):
+            return opened
+        return SlowFile(opened, self, path, any(flag in mode for flag in 'wax+'))
+
+    def install(self) -> None:
+        io.open = builtins.open = self.open
+
+    def uninstall(self) -> None:
+        io.open = builtins.open = self.real_open
+
+
+# Процессы пула импортируют этот модуль первым, поэтому подмена open() попадает и в них
+if os.environ.get(SLOW_IO_ENV):
+    SlowStorage(os.environ[SLOW_IO_ENV]).install()
+
+import argparse
+import shutil
+import statistics
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import build_corpus, case_path
+from stripeoff.batch import IO_THREADS, BatchProcessor
+
+# (формат, размер, рамка, число копий)
+PIPELINE_CORPUS = (
+    ('jpg', '12mp', 'wide', 6),
+    ('jpg', '12mp', 'none', 6),
+    ('png', '12mp', 'wide', 3),
+    ('jpg', '1mp', 'wide', 20),
+    ('png', '1mp', 'none', 10),
+)
+
+
+def prepare_files(corpus: str, data_dir: str) -> list[str]:
+    """Разложить копии файлов набора по data_dir (жёсткими ссылками, если можно)."""
+    paths = []
+    for fmt, size, border, copies in PIPELINE_CORPUS:
+        source = case_path(corpus, fmt, size, border)
+        name, ext = os.path.splitext(os.path.basename(source))
+        for index in range(copies):
+            path = os.path.join(data_dir, f'{name}_{index}{ext}')
+            try:
+                os.link(source, path)
+            except OSError:
+                shutil.copyfile(source, path)
+            paths.append(path)
+    return paths
+
+
+def run_batch(paths: list[str], data_dir: str, workers: int, io_threads: int, slow_io: str) -> float:
+    """Обработать пакет; вернуть время в секундах."""
+    output_dir = os.path.join(data_dir, 'out')
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    marks_dir = tempfile.mkdtemp(prefix='stripeoff_marks_')
+    storage = None
+    if slow_io:
+        # Переменная окружения передаёт имитацию процессам пула, которые запустятся в run()
+        os.environ[SLOW_IO_ENV] = f'{slow_io},{data_dir},{marks_dir}'
+        storage = SlowStorage(os.environ[SLOW_IO_ENV])
+        storage.install()
+    try:
+        processor = BatchProcessor(lambda task, result: None, workers, io_threads=io_threads)
+        for index, path in enumerate(paths):
+            processor.add_task(index, path, os.path.join(output_dir, os.path.basename(path)))
+        processor.close()
+        start = time.perf_counter()
+        processor.run()
+        return time.perf_counter() - start
+    finally:
+        if storage is not None:
+            storage.uninstall()
+            del os.environ[SLOW_IO_ENV]
+        shutil.rmtree(marks_dir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--io-threads', type=int, default=IO_THREADS, help='I/O threads of the pipelined run')
+    parser.add_argument('--latency', type=float, default=15, metavar='MS', help='simulated latency per file')
+    parser.add_argument('--bandwidth', type=float, default=40, metavar='MB/S', help='simulated throughput')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per variant (median is reported)')
+    parser.add_argument('--corpus', metavar='DIR', help='keep the generated images here and reuse them next time')
+    args = parser.parse_args()
+
+    corpus = args.corpus or tempfile.mkdtemp(prefix='stripeoff_corpus_')
+    data_dir = os.path.realpath(tempfile.mkdtemp(prefix='stripeoff_pipeline_'))
+    try:
+        build_corpus(corpus, [(fmt, size, border) for fmt, size, border, _ in PIPELINE_CORPUS])
+        paths = prepare_files(corpus, data_dir)
+        total_mb = sum(os.path.getsize(path) for path in paths) / 2 ** 20
+        print(f'files: {len(paths)} ({total_mb:.0f} MB), workers: {args.workers}, '
+              f'slow storage: {args.latency:g} ms + {args.bandwidth:g} MB/s')
+        print(f'{"storage":<8} {"in workers":>11} {"pipelined":>11} {"speedup":>8}')
+        for storage, slow_io in (('local', ''), ('slow', f'{args.latency},{args.bandwidth}')):
+            times = {}
+            for io_threads in (0, args.io_threads):
+                times[io_threads] = statistics.median(
+                    run_batch(paths, data_dir, args.workers, io_threads, slow_io) for _ in range(args.repeat)
+                )
+            direct, pipelined = times[0], times[args.io_threads]
+            print(f'{storage:<8} {direct:>10.2f}s {pipelined:>10.2f}s {direct / pipelined:>7.2f}x', flush=True)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+        if not args.corpus:
+            shutil.rmtree(corpus, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Очерёдность по размеру и отмена: сколько ждут мелкие файлы за крупными.
+
+Пакет начинается с нескольких крупных PNG, за которыми идут миниатюры и
+снимки на 1 Мп, как при перетаскивании папки. Один и тот же пакет
+обрабатывается в порядке добавления (AGING_BYTES_PER_SECOND = inf) и с
+очерёдностью по сроку; для каждого варианта — время до результата мелких
+файлов (p50/p95), до последнего результата и до результата крупных.
+Затем замеряется отмена: пакет отменяется целиком, пока крупный файл в пуле,
+и засекается время до прихода всех результатов.
+
+Запуск: python benchmarks/bench_scheduling.py [--workers 1] [--large 2] [--small 100]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import build_corpus, case_path
+from stripeoff import batch
+from stripeoff.batch import BatchProcessor
+from stripeoff.constants import ProcessResult
+from stripeoff.profiling import percentile
+
+LARGE = ('png', '24mp', 'wide')
+SMALL = (('jpg', 'thumb', 'wide'), ('png', 'thumb', 'wide'), ('jpg', '1mp', 'wide'), ('png', '1mp', 'none'))
+
+
+def prepare(corpus: str, directory: str, large: int, small: int) -> list[str]:
+    """Скопировать файлы пакета: сначала крупные, затем мелкие по кругу."""
+    os.makedirs(directory)
+    sources = [case_path(corpus, *LARGE)] * large
+    sources += [case_path(corpus, *SMALL[index % len(SMALL)]) for index in range(small)]
+    paths = []
+    for index, source in enumerate(sources):
+        path = os.path.join(directory, f'{index:04d}{os.path.splitext(source)[1]}')
+        shutil.copyfile(source, path)
+        paths.append(path)
+    return paths
+
+
+def run_batch(paths: list[str], output_dir: str, workers: int) -> dict[str, float]:
+    """Обработать пакет; вернуть время от начала до результата каждого файла."""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    finished = {}
+    processor = BatchProcessor(lambda task, result: finished.setdefault(task.path, time.perf_counter()),
+                               workers, warm_up=True, dedup=False)
+    for index, path in enumerate(paths):
+        processor.add_task(index, path, os.path.join(output_dir, os.path.basename(path)))
+    processor.close()
+    start = time.perf_counter()
+    processor.run()
+    return {path: moment - start for path, moment in finished.items()}
+
+
+def measure_cancel(paths: list[str], output_dir: str, workers: int, delay: float) -> tuple[float, int, int]:
+    """Отменить весь пакет через delay секунд; вернуть время до последнего результата и число отменённых."""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    results = []
+    processor = BatchProcessor(lambda task, result: results.append((time.perf_counter(), result)),
+                               workers, warm_up=True, dedup=False)
+    for index, path in enumerate(paths):
+        processor.add_task(index, path, os.path.join(output_dir, os.path.basename(path)), group='drop')
+    processor.close()
+    moments = {}
+
+    def cancel_later() -> None:
+        time.sleep(delay)
+        moments['cancel'] = time.perf_counter()
+        processor.cancel('drop')
+
+    threading.Thread(target=cancel_later, daemon=True).start()
+    processor.run()
+    cancelled = sum(1 for _, result in results if result == ProcessResult.CANCELLED)
+    return results[-1][0] - moments['cancel'], cancelled, len(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--large', type=int, default=2, help='large PNGs at the head of the batch')
+    parser.add_argument('--small', type=int, default=100, help='small files behind them')
+    parser.add_argument('--cancel-after', type=float, default=1.5, metavar='SECONDS',
+                        help='when to cancel the batch in the cancellation run')
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='stripeoff_scheduling_')
+    try:
+        corpus = os.path.join(work, 'corpus')
+        build_corpus(corpus, [LARGE, *SMALL])
+        paths = prepare(corpus, os.path.join(work, 'batch'), args.large, args.small)
+        large, small = paths[:args.large], paths[args.large:]
+        print(f'workers: {args.workers}, {len(large)} large ({LARGE[1]} {LARGE[0]}) + {len(small)} small files')
+        print(f'{"order":<9} {"small p50":>10} {"small p95":>10} {"large max":>10} {"all done":>9}')
+        aging = batch.AGING_BYTES_PER_SECOND
+        for name, rate in (('fifo', float('inf')), ('size', aging)):
+            batch.AGING_BYTES_PER_SECOND = rate
+            times = run_batch(paths, os.path.join(work, f'out_{name}'), args.workers)
+            small_times = sorted(times[path] for path in small)
+            print(f'{name:<9} {percentile(small_times, 50):>9.2f}s {percentile(small_times, 95):>9.2f}s '
+                  f'{max(times[path] for path in large):>9.2f}s {max(times.values()):>8.2f}s', flush=True)
+        batch.AGING_BYTES_PER_SECOND = aging
+        # Крупные файлы вперёд: отмена застаёт крупный файл в пуле
+        batch.AGING_BYTES_PER_SECOND = float('inf')
+        latency, cancelled, total = measure_cancel(paths, os.path.join(work, 'out_cancel'), args.workers,
+                                                   args.cancel_after)
+        batch.AGING_BYTES_PER_SECOND = aging
+        print(f'cancel after {args.cancel_after:g} s: {cancelled} of {total} files cancelled, '
+              f'last result {latency * 1000:.0f} ms after cancel()')
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
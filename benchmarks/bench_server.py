@@ -0,0 +1,131 @@
+"""Нагрузочный тест HTTP-сервера: запросов в секунду и перцентили задержки.
+
+Запускает `python -m stripeoff --serve --port 0` и посылает POST /crop (или
+другой --endpoint) из --clients потоков, каждый через своё keep-alive
+соединение, в течение --duration секунд. Для сравнения замеряется запуск
+`python -m stripeoff` на одном файле — столько стоило бы изображение, если
+запускать консольный режим на каждый запрос.
+
+Запуск: python benchmarks/bench_server.py [--clients 4] [--duration 10] [--size 1mp]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_suite import build_corpus, case_path
+from stripeoff.profiling import percentile
+
+
+def start_server(workers: int) -> tuple[subprocess.Popen, int]:
+    command = [sys.executable, '-m', 'stripeoff', '--serve', '--port', '0', '--workers', str(workers)]
+    process = subprocess.Popen(command, cwd=ROOT, stderr=subprocess.PIPE, text=True)
+    line = process.stderr.readline()   # Печатается, когда процессы пула готовы
+    match = re.search(r':(\d+) ', line)
+    if match is None:
+        process.kill()
+        raise RuntimeError(f'server did not start: {line!r}')
+    return process, int(match.group(1))
+
+
+def load(port: int, path: str, body: bytes, clients: int, duration: float) -> tuple[list[float], Counter, float]:
+    """Слать запросы из clients потоков duration секунд; вернуть задержки, коды ответов и время."""
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client() -> None:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            connection.request('POST', path, body)
+            response = connection.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), statuses, time.perf_counter() - start
+
+
+def cold_start(source: str, repeat: int) -> float:
+    """Медианное время `python -m stripeoff` на одном файле, с."""
+    folder = tempfile.mkdtemp(prefix='stripeoff_server_cli_')
+    try:
+        path = os.path.join(folder, os.path.basename(source))
+        shutil.copyfile(source, path)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-m', 'stripeoff', path, '--no-cache', '--workers', '1'],
+                           cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        return sorted(times)[len(times) // 2]
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=4, help='concurrent keep-alive connections')
+    parser.add_argument('--duration', type=float, default=10, metavar='SECONDS', help='load time per run')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='server worker processes')
+    parser.add_argument('--endpoint', choices=('crop', 'detect'), default='crop', help='endpoint to load')
+    parser.add_argument('--format', choices=('jpg', 'png'), default='jpg', help='format of the request body')
+    parser.add_argument('--size', default='1mp', help='size of the request body image (see bench_suite.py)')
+    parser.add_argument('--cold-repeat', type=int, default=3, help='CLI runs for the cold start comparison')
+    args = parser.parse_args()
+
+    corpus = tempfile.mkdtemp(prefix='stripeoff_corpus_')
+    try:
+        build_corpus(corpus, [(args.format, args.size, 'wide')])
+        source = case_path(corpus, args.format, args.size, 'wide')
+        with open(source, 'rb') as file:
+            body = file.read()
+        start = time.perf_counter()
+        process, port = start_server(args.workers)
+        print(f'server ready in {time.perf_counter() - start:.2f} s ({args.workers} workers)')
+        try:
+            load(port, f'/{args.endpoint}', body, args.clients, 1)   # Прогрев
+            latencies, statuses, elapsed = load(port, f'/{args.endpoint}', body, args.clients, args.duration)
+            connection = http.client.HTTPConnection('127.0.0.1', port)
+            connection.request('GET', '/metrics')
+            metrics = json.loads(connection.getresponse().read())
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        print(f'/{args.endpoint}, {args.format} {args.size} ({len(body) / 2 ** 20:.1f} MB), {args.clients} clients: '
+              f'{len(latencies) / elapsed:.1f} req/s, '
+              + ', '.join(f'p{q} {percentile(latencies, q) * 1000:.1f} ms' for q in (50, 95, 99))
+              + f', statuses {dict(statuses)}')
+        print(f'server-side latency: {metrics["latency_ms"]}')
+        cold = cold_start(source, args.cold_repeat)
+        print(f'python -m stripeoff on one file: {cold * 1000:.0f} ms '
+              f'({cold / percentile(latencies, 50):.1f}x the server p50)')
+    finally:
+        shutil.rmtree(corpus, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
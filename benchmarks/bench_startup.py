@@ -0,0 +1,112 @@
+"""Холодный старт GUI: время до первой отрисовки окна и до первого результата.
+
+Каждый замер — новый процесс Python: импорт remove_borders_app, создание окна,
+первая отрисовка, затем перетаскивание одного JPEG через --drop-after секунд
+после неё (0 — сразу, пока пул ещё запускается) и ожидание его результата.
+Время отсчитывается от запуска процесса, то есть включает старт
+интерпретатора и импорты. С --cold пул не прогревается (WARM_UP_POOL = False)
+и запускается только при перетаскивании — для сравнения.
+
+По умолчанию Qt работает без экрана (QT_QPA_PLATFORM=offscreen); --platform
+задаёт другую платформу, например windows или xcb, для замера с настоящим окном.
+
+Запуск: python benchmarks/bench_startup.py [--repeat 5] [--drop-after 0,2] [--cold]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def child(start: float, image: str, drop_after: float, warm_up: bool) -> None:
+    """Запустить GUI, перетащить image и напечатать отметки времени в JSON."""
+    import remove_borders_app
+    from PyQt5.QtCore import QEvent, QObject, QTimer
+
+    moments = {'import': time.time() - start}
+    remove_borders_app.WARM_UP_POOL = warm_up
+    app = remove_borders_app.QApplication([])
+    window = remove_borders_app.RemoveBordersWindow()
+    window.use_result_cache = False   # Иначе повторные замеры берут результат из кэша
+
+    def check_result() -> None:
+        if window.done_count:
+            moments['first_result'] = time.time() - start
+            window.close()
+            app.quit()
+
+    class FirstPaint(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Paint and 'first_paint' not in moments:
+                moments['first_paint'] = time.time() - start
+                QTimer.singleShot(int(drop_after * 1000), lambda: window.discover_images([image]))
+            return False
+
+    paint_filter = FirstPaint()
+    window.installEventFilter(paint_filter)
+    poll = QTimer(interval=5, timeout=check_result)
+    poll.start()
+    window.show()
+    app.exec_()
+    print(json.dumps(moments))
+
+
+def measure(image: str, drop_after: float, warm_up: bool, platform: str) -> dict[str, float]:
+    """Один холодный запуск в отдельном процессе; вернуть отметки времени, с."""
+    output = image.replace('.jpg', '_cropped.jpg')
+    if os.path.exists(output):
+        os.remove(output)
+    environment = dict(os.environ, QT_QPA_PLATFORM=platform)
+    start = time.time()
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', str(start), image, str(drop_after),
+         '1' if warm_up else '0'],
+        cwd=ROOT, env=environment, stdout=subprocess.PIPE, text=True, timeout=120, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        start, image, drop_after, warm_up = sys.argv[2:6]
+        child(float(start), image, float(drop_after), warm_up == '1')
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='cold starts per variant')
+    parser.add_argument('--drop-after', default='0,2', metavar='SECONDS',
+                        help='comma-separated delays between the first paint and the drop')
+    parser.add_argument('--cold', action='store_true', help='also measure without warming up the pool')
+    parser.add_argument('--platform', default='offscreen', help='Qt platform plugin (default: offscreen)')
+    args = parser.parse_args()
+
+    from bench_suite import build_corpus, case_path
+
+    work = tempfile.mkdtemp(prefix='stripeoff_startup_')
+    try:
+        build_corpus(work, [('jpg', '1mp', 'wide')])
+        image = os.path.join(work, 'drop.jpg')
+        shutil.copyfile(case_path(work, 'jpg', '1mp', 'wide'), image)
+        print(f'{"pool":<6} {"drop after":>10} {"import":>8} {"first paint":>12} {"first result":>13}')
+        for warm_up in (True, False) if args.cold else (True,):
+            for drop_after in (float(value) for value in args.drop_after.split(',')):
+                runs = [measure(image, drop_after, warm_up, args.platform) for _ in range(args.repeat)]
+                median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+                print(f'{"warm" if warm_up else "cold":<6} {drop_after:>9g}s {median["import"]:>7.2f}s '
+                      f'{median["first_paint"]:>11.2f}s {median["first_result"]:>12.2f}s', flush=True)
+        print('(medians, seconds since process start)')
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""Воспроизводимый замер remove_borders на синтетическом наборе изображений.
+
+Набор детерминирован: форматы PNG (с альфа-каналом и без), JPEG, BMP, WebP,
+размеры от миниатюры до 100 Мп, рамки разной ширины, изображения без рамки
+и полностью пустые. Для каждого случая замеряются весь конвейер и его этапы
+(через FileProfile), пропускная способность и пиковое потребление памяти.
+Каждый случай выполняется в отдельном процессе, чтобы пик памяти не переходил
+из случая в случай.
+
+Запуск: python benchmarks/bench_suite.py [--sizes thumb,1mp,12mp] [--output run.json] [--baseline old.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cv2
+import numpy as np
+
+from stripeoff.constants import MIN_BORDER_WIDTH
+from stripeoff.core import remove_borders
+from stripeoff.profiling import FileProfile
+
+CORPUS_VERSION = 1   # Менять при изменении генератора, чтобы не использовать старый --corpus
+
+# Формат: (расширение, с альфа-каналом)
+FORMATS = {
+    'png': ('.png', False),
+    'png-alpha': ('.png', True),
+    'jpg': ('.jpg', False),
+    'bmp': ('.bmp', False),
+    'webp': ('.webp', False),
+}
+SIZES = {
+    'thumb': (160, 120),
+    '1mp': (1152, 864),
+    '12mp': (4000, 3000),
+    '24mp': (6000, 4000),
+    '100mp': (12000, 8400),
+}
+# Ширина рамки: None — изображение целиком пустое
+BORDERS = {
+    'none': lambda width, height: 0,
+    'thin': lambda width, height: MIN_BORDER_WIDTH - 2,   # Уже порога — файл пропускается
+    'wide': lambda width, height: max(MIN_BORDER_WIDTH * 2, min(width, height) // 20),
+    'empty': lambda width, height: None,
+}
+
+
+def make_image(fmt: str, size: str, border: str) -> np.ndarray:
+    """Сгенерировать изображение случая: «фотография», окружённая белыми или прозрачными полями."""
+    width, height = SIZES[size]
+    alpha = FORMATS[fmt][1]
+    channels = 4 if alpha else 3
+    # Пустые поля: прозрачные для формата с альфа-каналом, иначе белые
+    image = np.zeros((height, width, 4), np.uint8) if alpha else np.full((height, width, 3), 255, np.uint8)
+    margin = BORDERS[border](width, height)
+    if margin is None:
+        return image
+
+    rng = np.random.default_rng([CORPUS_VERSION, list(FORMATS).index(fmt), list(SIZES).index(size)])
+    inner_h, inner_w = height - 2 * margin, width - 2 * margin
+    # Шум малого разрешения, растянутый до нужного размера, похож на фотографию и быстро строится
+    small = rng.integers(0, 230, size=(max(2, inner_h // 16), max(2, inner_w // 16), 3), dtype=np.uint8)
+    content = cv2.resize(small, (inner_w, inner_h), interpolation=cv2.INTER_LINEAR)
+    # Содержимое касается всех четырёх сторон рамки
+    content[0, :] = content[-1, :] = content[:, 0] = content[:, -1] = 0
+    image[margin:height - margin, margin:width - margin, :3] = content
+    if channels == 4:
+        image[margin:height - margin, margin:width - margin, 3] = 255
+    return image
+
+
+def build_corpus(directory: str, cases: list[tuple[str, str, str]]) -> None:
+    """Создать недостающие файлы набора в directory."""
+    os.makedirs(directory, exist_ok=True)
+    for fmt, size, border in cases:
+        path = case_path(directory, fmt, size, border)
+        if not os.path.exists(path):
+            ok, buffer = cv2.imencode(FORMATS[fmt][0], make_image(fmt, size, border))
+            if not ok:
+                raise RuntimeError(f'cannot encode {path}')
+            buffer.tofile(path)
+
+
+def case_path(directory: str, fmt: str, size: str, border: str) -> str:
+    return os.path.join(directory, f'v{CORPUS_VERSION}_{fmt}_{size}_{border}{FORMATS[fmt][0]}')
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковый объём резидентной памяти текущего процесса, МБ."""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize / 2 ** 20
+
+    try:
+        # На Linux ru_maxrss наследуется через fork/exec, а VmHWM считается для самого процесса
+        with open('/proc/self/status', encoding='ascii') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss — в байтах на macOS и в килобайтах на Linux
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(path: str, repeat: int) -> dict:
+    """Замерить один файл (выполняется в отдельном процессе)."""
+    rss_before = peak_rss_mb()
+    output_dir = tempfile.mkdtemp(prefix='stripeoff_bench_out_')
+    try:
+        output_path = os.path.join(output_dir, 'out' + os.path.splitext(path)[1])
+        profiles = []
+        for _ in range(repeat):
+            profile = FileProfile(path)
+            remove_borders(path, output_path, profile=profile)
+            profiles.append(profile)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    file_bytes = os.path.getsize(path)
+    totals = [profile.total for profile in profiles]
+    median = statistics.median(totals)
+    return {
+        'result': profiles[-1].result,
+        'file_bytes': file_bytes,
+        'median_ms': median * 1000,
+        'best_ms': min(totals) * 1000,
+        'stages_ms': {
+            stage: statistics.median(profile.stages[stage] for profile in profiles) * 1000
+            for stage in profiles[-1].stages
+        },
+        'images_per_s': 1 / median,
+        'mb_per_s': file_bytes / 2 ** 20 / median,
+        'rss_before_mb': rss_before,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return completed.stdout.strip() or None
+
+
+def print_comparison(cases: list[dict], baseline_path: str) -> None:
+    """Сравнить медианы с прошлым запуском: отношение > 1 — стало быстрее."""
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = {case['id']: case for case in json.load(file)['cases']}
+    print(f'\n{"case":<26} {"before":>9} {"after":>9} {"speedup":>8} {"peak RSS":>17}')
+    for case in cases:
+        old = baseline.get(case['id'])
+        if old is None:
+            continue
+        print(f'{case["id"]:<26} {old["median_ms"]:>7.1f}ms {case["median_ms"]:>7.1f}ms '
+              f'{old["median_ms"] / case["median_ms"]:>7.2f}x '
+              f'{old["peak_rss_mb"] or 0:>6.0f} -> {case["peak_rss_mb"] or 0:>4.0f}MB')
+
+
+def parse_list(value: str, choices: dict) -> list[str]:
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = [item for item in items if item not in choices]
+    if unknown:
+        raise argparse.ArgumentTypeError(f'unknown: {", ".join(unknown)} (choose from {", ".join(choices)})')
+    return items
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--formats', type=lambda v: parse_list(v, FORMATS), default=list(FORMATS),
+                        help=f'comma-separated subset of: {",".join(FORMATS)}')
+    parser.add_argument('--sizes', type=lambda v: parse_list(v, SIZES), default=list(SIZES),
+                        help=f'comma-separated subset of: {",".join(SIZES)}')
+    parser.add_argument('--borders', type=lambda v: parse_list(v, BORDERS), default=list(BORDERS),
+                        help=f'comma-separated subset of: {",".join(BORDERS)}')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case (median is reported)')
+    parser.add_argument('--corpus', metavar='DIR', help='keep the generated images here and reuse them next time')
+    parser.add_argument('--output', default='bench_suite.json', help='JSON file for the results')
+    parser.add_argument('--baseline', metavar='FILE', help='previous results to compare against')
+    args = parser.parse_args()
+
+    cases = [(fmt, size, border) for size in args.sizes for fmt in args.formats for border in args.borders]
+    directory = args.corpus or tempfile.mkdtemp(prefix='stripeoff_corpus_')
+    results = []
+    try:
+        build_corpus(directory, cases)
+        print(f'{"case":<26} {"result":>8} {"file":>8} {"median":>9} {"img/s":>8} {"MB/s":>7} {"peak RSS":>9}  stages')
+        # Новый процесс на каждый случай: пик памяти считается отдельно
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(1, maxtasksperchild=1) as pool:
+            for fmt, size, border in cases:
+                path = case_path(directory, fmt, size, border)
+                case = pool.apply(run_case, (path, args.repeat))
+                width, height = SIZES[size]
+                case = {'id': f'{fmt}/{size}/{border}', 'format': fmt, 'size': size, 'width': width,
+                        'height': height, 'border': border, **case}
+                results.append(case)
+                stages = ' '.join(f'{stage}={ms:.1f}' for stage, ms in case['stages_ms'].items())
+                print(f'{case["id"]:<26} {case["result"]:>8} {case["file_bytes"] / 1024:>6.0f}KB '
+                      f'{case["median_ms"]:>7.1f}ms {case["images_per_s"]:>8.1f} {case["mb_per_s"]:>7.1f} '
+                      f'{case["peak_rss_mb"] or 0:>7.0f}MB  {stages}', flush=True)
+    finally:
+        if not args.corpus:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'revision': git_revision(),
+            'corpus_version': CORPUS_VERSION,
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+        },
+        'cases': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f'\nresults written to {args.output}')
+    if args.baseline:
+        print_comparison(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Задержка режима наблюдения: от появления файла в папке до готового результата.
+
+Запускает `python -m stripeoff --watch` на временной папке и кладёт в неё
+файлы по одному с интервалом --interval, записывая каждый порциями за
+--write-time секунд, как сканер. Задержка отсчитывается от записи последнего
+байта до строки о результате в выводе; первые --warmup файлов не учитываются.
+Затем замеряется стоимость одного опроса папки с --folder-files файлами:
+обычного (по времени изменения папок) и полного просмотра.
+
+Запуск: python benchmarks/bench_watch.py [--files 30] [--interval 0.5] [--write-time 0.2]
+"""
+
+import argparse
+import os
+import queue
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_suite import build_corpus, case_path
+from stripeoff.watch import FolderWatcher
+
+WRITE_CHUNKS = 8
+
+
+def drop_file(source: str, path: str, write_time: float) -> float:
+    """Записать копию source порциями за write_time секунд; вернуть момент записи последнего байта."""
+    with open(source, 'rb') as file:
+        data = file.read()
+    step = -(-len(data) // WRITE_CHUNKS)
+    with open(path, 'wb') as file:
+        for offset in range(0, len(data), step):
+            file.write(data[offset:offset + step])
+            file.flush()
+            time.sleep(write_time / WRITE_CHUNKS)
+    return time.perf_counter()
+
+
+def measure_latency(source: str, args: argparse.Namespace) -> list[float]:
+    folder = tempfile.mkdtemp(prefix='stripeoff_watch_')
+    command = [sys.executable, '-m', 'stripeoff', '--watch', folder, '--no-cache', '--workers', str(args.workers)]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    lines = queue.Queue()
+
+    def read_output() -> None:
+        for line in process.stdout:
+            lines.put((time.perf_counter(), line))
+
+    threading.Thread(target=read_output, daemon=True).start()
+    try:
+        process.stderr.readline()   # «Watching ...»: процессы пула запускаются
+        time.sleep(args.startup)
+        latencies = []
+        ext = os.path.splitext(source)[1]
+        for index in range(args.files):
+            path = os.path.join(folder, f'scan_{index}{ext}')
+            written = drop_file(source, path, args.write_time)
+            finished, line = lines.get(timeout=30)
+            if path not in line:
+                raise RuntimeError(f'unexpected output: {line!r}')
+            if index >= args.warmup:
+                latencies.append(finished - written)
+            time.sleep(max(0.0, args.interval - (time.perf_counter() - written)))
+        return latencies
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.wait(timeout=30)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def measure_poll(count: int) -> tuple[float, float]:
+    """Время обычного и полного опроса папки с count изображениями, с."""
+    folder = tempfile.mkdtemp(prefix='stripeoff_watch_poll_')
+    try:
+        for index in range(count):
+            open(os.path.join(folder, f'scan_{index}.png'), 'wb').close()
+        # Время изменения папки — в прошлом, чтобы она не считалась только что изменённой
+        os.utime(folder, (time.time() - 60, time.time() - 60))
+        watcher = FolderWatcher([folder], settle=0)
+        watcher.poll()
+        watcher.poll()
+        start = time.perf_counter()
+        for _ in range(100):
+            watcher.poll()
+        incremental = (time.perf_counter() - start) / 100
+        watcher.full_rescan = 0
+        start = time.perf_counter()
+        for _ in range(10):
+            watcher.poll()
+        return incremental, (time.perf_counter() - start) / 10
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=30, help='files to drop')
+    parser.add_argument('--warmup', type=int, default=3, help='first files excluded from the statistics')
+    parser.add_argument('--interval', type=float, default=0.5, metavar='SECONDS', help='time between drops')
+    parser.add_argument('--write-time', type=float, default=0.2, metavar='SECONDS', help='time to write one file')
+    parser.add_argument('--startup', type=float, default=3, metavar='SECONDS', help='wait before the first drop')
+    parser.add_argument('--format', choices=('jpg', 'png'), default='jpg', help='format of dropped files')
+    parser.add_argument('--size', default='1mp', help='size of dropped files (see bench_suite.py)')
+    parser.add_argument('--workers', type=int, default=2, help='worker processes')
+    parser.add_argument('--folder-files', type=int, default=10000, help='files in the folder for the poll cost')
+    args = parser.parse_args()
+
+    corpus = tempfile.mkdtemp(prefix='stripeoff_corpus_')
+    try:
+        build_corpus(corpus, [(args.format, args.size, 'wide')])
+        latencies = measure_latency(case_path(corpus, args.format, args.size, 'wide'), args)
+    finally:
+        shutil.rmtree(corpus, ignore_errors=True)
+    latencies.sort()
+    print(f'drop -> result, {len(latencies)} files ({args.format} {args.size}, written in {args.write_time:g} s): '
+          f'p50 {statistics.median(latencies) * 1000:.0f} ms, '
+          f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms')
+    incremental, full = measure_poll(args.folder_files)
+    print(f'poll of a folder with {args.folder_files} files: {incremental * 1000:.2f} ms, '
+          f'full rescan {full * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
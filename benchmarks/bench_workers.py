@@ -0,0 +1,77 @@
+"""Замер ускорения пакетной обработки пулом процессов.
+
+Запуск: python benchmarks/bench_workers.py [--count 200] [--workers 0]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from stripeoff.core import remove_borders
+
+
+def make_corpus(directory: str, count: int) -> list[str]:
+    """Сгенерировать детерминированный набор «сканов» с белыми полями."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        image = np.full((1600, 1200, 3), 255, dtype=np.uint8)
+        top, left = rng.integers(0, 120, size=2)
+        image[top:1500, left:1100] = rng.integers(0, 200, size=(1500 - top, 1100 - left, 3), dtype=np.uint8)
+        path = os.path.join(directory, f'scan_{i:05d}.png')
+        cv2.imwrite(path, image)
+        paths.append(path)
+    return paths
+
+
+def run_sequential(tasks: list[tuple[str, str]]) -> float:
+    start = time.perf_counter()
+    for path, output_path in tasks:
+        remove_borders(path, output_path)
+    return time.perf_counter() - start
+
+
+def run_pool(tasks: list[tuple[str, str]], workers: int) -> float:
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        # Прогрев: запуск процессов не входит в замер
+        list(executor.map(time.sleep, [0.2] * workers))
+        start = time.perf_counter()
+        list(executor.map(remove_borders, *zip(*tasks)))
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=200, help='number of images')
+    parser.add_argument('--workers', type=int, default=0, help='worker processes (0 = number of CPU cores)')
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+
+    directory = tempfile.mkdtemp(prefix='stripeoff_bench_')
+    try:
+        paths = make_corpus(directory, args.count)
+        tasks = [(path, path.replace('.png', '_cropped.png')) for path in paths]
+
+        sequential = run_sequential(tasks)
+        pooled = run_pool(tasks, workers)
+        print(f'images:     {args.count}, workers: {workers}')
+        print(f'sequential: {sequential:.2f} s ({args.count / sequential:.1f} img/s)')
+        print(f'pool:       {pooled:.2f} s ({args.count / pooled:.1f} img/s)')
+        print(f'speedup:    {sequential / pooled:.2f}x')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
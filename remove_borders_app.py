@@ -2,66 +2,134 @@
 
 import sys
 import os
+import multiprocessing
+import time
 
 # Подавление предупреждений Qt о несовместимых шрифтах
 os.environ['QT_LOGGING_RULES'] = 'qt.qpa.fonts=false'
 
-import cv2
-import numpy as np
 from PyQt5.QtWidgets import (
-    QApplication, QLabel, QMainWindow, QPushButton, QCheckBox,
-    QVBoxLayout, QHBoxLayout, QWidget, QScrollArea, QFrame
+    QApplication, QLabel, QMainWindow, QPushButton, QCheckBox, QComboBox,
+    QVBoxLayout, QHBoxLayout, QWidget, QListView, QAbstractItemView,
+    QStyledItemDelegate, QStyleOptionViewItem, QMenu, QShortcut
 )
-from PyQt5.QtCore import Qt, QObject, QEvent, QSettings, QTimer, QThread, pyqtSignal
-from PyQt5.QtGui import QFont, QIcon
+from PyQt5.QtCore import (
+    Qt, QObject, QEvent, QSettings, QTimer, QThread, pyqtSignal,
+    QAbstractListModel, QModelIndex, QRect, QSize
+)
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QIcon, QKeySequence, QPainter
 from enum import Enum
-from queue import Queue
-
+from typing import Callable, Optional
 
-class ProcessResult(Enum):
-    SUCCESS = "success"   # Обрезано и сохранено
-    SKIPPED = "skipped"   # Белых рамок нет
-    ERROR = "error"       # Ошибка обработки
+from stripeoff.batch import BatchProcessor, ProcessingOptions, Task, make_output_path
+from stripeoff.cache import default_cache_path
+from stripeoff.constants import DEFAULT_ENCODER_PRESET, ENCODER_PRESETS, ProcessResult
+from stripeoff.discovery import iter_images_from_paths
 
 
 class ImageProcessorWorker(QThread):
-    """Рабочий поток для обработки изображений."""
-    file_processed = pyqtSignal(int, object, str)  # widget_id, result, output_name
-
-    def __init__(self, parent=None):
+    """Рабочий поток: раздаёт задачи пулу процессов и возвращает результаты в GUI порциями."""
+    files_processed = pyqtSignal(list)  # [(item_id, result, output_name), ...]
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        options: ProcessingOptions = ProcessingOptions(),
+        memory_limit: Optional[int] = None,
+        warm_up: bool = False,
+        parent=None,
+    ):
         super().__init__(parent)
-        self.task_queue = Queue()
-        self._running = True
+        self.processor = BatchProcessor(
+            self._on_result, max_workers, options, on_tick=self._flush_if_due, memory_limit=memory_limit,
+            warm_up=warm_up,
+        )
+        self._results = []
+        self._last_flush = time.monotonic()
+
+    def add_task(self, item_id: int, path: str, output_path: str, drop_id: Optional[int] = None):
+        """Добавить задачу в очередь; drop_id — перетаскивание, с которым её можно отменить."""
+        self.processor.add_task(item_id, path, output_path, group=drop_id)
 
-    def add_task(self, widget_id: int, path: str, output_path: str, output_name: str):
-        """Добавить задачу в очередь."""
-        self.task_queue.put((widget_id, path, output_path, output_name))
+    def cancel(self, *drop_ids: int):
+        """Отменить задачи перечисленных перетаскиваний, без аргументов — все."""
+        self.processor.cancel(*drop_ids)
+
+    def set_options(self, options: ProcessingOptions):
+        """Сменить параметры обработки для задач, ещё не отданных пулу."""
+        self.processor.options = options
 
     def run(self):
         """Обработка задач из очереди."""
-        while self._running:
-            try:
-                task = self.task_queue.get(timeout=0.1)
-            except:
-                continue
+        self.processor.run()
+        self._flush()
+
+    def _on_result(self, task: Task, result: ProcessResult):
+        # Один сигнал на файл забивает очередь событий GUI, поэтому результаты копятся
+        self._results.append((task.task_id, result, os.path.basename(task.output_path)))
+        if len(self._results) >= RESULT_FLUSH_CHUNK:
+            self._flush()
 
-            widget_id, path, output_path, output_name = task
-            result = remove_borders(path, output_path)
-            self.file_processed.emit(widget_id, result, output_name)
+    def _flush_if_due(self):
+        if self._results and time.monotonic() - self._last_flush >= RESULT_FLUSH_INTERVAL:
+            self._flush()
+
+    def _flush(self):
+        if self._results:
+            self.files_processed.emit(self._results)
+            self._results = []
+        self._last_flush = time.monotonic()
 
     def stop(self):
-        """Остановить рабочий поток."""
-        self._running = False
+        """Остановить рабочий поток и пул процессов."""
+        self.processor.stop()
         self.wait()
 
 
+class DiscoveryWorker(QThread):
+    """Поток обхода папок: передаёт найденные изображения в GUI порциями, не дожидаясь конца обхода."""
+    images_found = pyqtSignal(list, bool, int)  # пути, режим перезаписи на момент перетаскивания, ID перетаскивания
+
+    def __init__(self, paths: list[str], overwrite: bool, drop_id: int, parent=None):
+        super().__init__(parent)
+        self.paths = paths
+        self.overwrite = overwrite
+        self.drop_id = drop_id
+        self._running = True
+
+    def run(self):
+        chunk = []
+        last_flush = time.monotonic()
+        for path in iter_images_from_paths(self.paths, lambda: not self._running):
+            chunk.append(path)
+            now = time.monotonic()
+            if len(chunk) >= DISCOVERY_CHUNK or now - last_flush >= DISCOVERY_FLUSH_INTERVAL:
+                self.images_found.emit(chunk, self.overwrite, self.drop_id)
+                chunk = []
+                last_flush = now
+        if chunk and self._running:
+            self.images_found.emit(chunk, self.overwrite, self.drop_id)
+
+    def stop(self):
+        """Прервать обход, не дожидаясь его конца: поток завершится на следующей записи папки."""
+        self._running = False
+
+
 # Константы
-WINDOW_WIDTH = 640
+WINDOW_WIDTH = 680
 WINDOW_HEIGHT = 480
-SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
-WHITE_THRESHOLD = 250  # Пиксель считается белым если все каналы >= 250
-ALPHA_THRESHOLD = 5    # Пиксель считается прозрачным если alpha <= 5
-MIN_BORDER_WIDTH = 5   # Минимальная ширина рамки для обрезки (в пикселях)
+DISCOVERY_CHUNK = 200            # Найденные пути передаются в GUI порциями до 200 штук
+DISCOVERY_FLUSH_INTERVAL = 0.1   # ...или не реже чем раз в 0.1 с
+RESULT_FLUSH_CHUNK = 500         # Результаты обработки передаются в GUI порциями до 500 штук
+RESULT_FLUSH_INTERVAL = 0.1      # ...или не реже чем раз в 0.1 с
+HISTORY_LIMIT = 50000            # Сколько последних файлов хранит история
+HISTORY_ITEM_HEIGHT = 44
+HISTORY_ITEM_SPACING = 4
+SPINNER_CHARS = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
+SPINNER_INTERVAL = 80            # мс между кадрами спиннера
+# Пул процессов поднимается сразу после первой отрисовки окна и загружает OpenCV,
+# пока пользователь выбирает файлы; False — только при первом перетаскивании
+WARM_UP_POOL = True
 
 # Локализация
 TRANSLATIONS = {
@@ -74,6 +142,14 @@ TRANSLATIONS = {
         'overwritten': 'overwritten',
         'overwrite_label': 'Overwrite originals',
         'overwrite_tooltip': 'Originals are replaced with cropped versions (cannot be undone). When off — copies are saved with the _cropped suffix.',
+        'progress': 'Found: {found} · Queued: {queued} · Done: {done}',
+        'preset_fastest': 'Fastest',
+        'preset_balanced': 'Balanced',
+        'preset_smallest': 'Smallest',
+        'preset_tooltip': 'Output compression: Fastest saves quickly, Smallest makes PNG and JPEG files smaller but saves several times slower.',
+        'cancelled': 'cancelled',
+        'cancel_drop': 'Cancel this drop',
+        'cancel_all': 'Cancel all (Esc)',
     },
     'ru': {
         'window_title': 'Удаление белых рамок',
@@ -84,6 +160,14 @@ TRANSLATIONS = {
         'overwritten': 'перезаписан',
         'overwrite_label': 'Перезаписывать оригиналы',
         'overwrite_tooltip': 'Оригиналы заменяются обрезанными версиями (нельзя отменить). Когда выключено — сохраняются копии с суффиксом _cropped.',
+        'progress': 'Найдено: {found} · В очереди: {queued} · Готово: {done}',
+        'preset_fastest': 'Быстро',
+        'preset_balanced': 'Баланс',
+        'preset_smallest': 'Меньше',
+        'preset_tooltip': 'Сжатие результата: «Быстро» сохраняет быстрее всего, «Меньше» уменьшает файлы PNG и JPEG, но сохраняет в несколько раз дольше.',
+        'cancelled': 'отменено',
+        'cancel_drop': 'Отменить это перетаскивание',
+        'cancel_all': 'Отменить всё (Esc)',
     }
 }
 
@@ -95,171 +179,174 @@ def resource_path(relative_path: str) -> str:
     return os.path.join(os.path.dirname(__file__), relative_path)
 
 
-def _build_empty_mask(image: np.ndarray) -> np.ndarray:
-    """Вернуть 2D-маску, где True — пиксель «пустой» (прозрачный или белый)."""
-    if image.ndim == 3 and image.shape[2] == 4:
-        alpha = image[:, :, 3]
-        bgr = image[:, :, :3]
-        return (alpha <= ALPHA_THRESHOLD) | np.all(bgr >= WHITE_THRESHOLD, axis=2)
-    if image.ndim == 3:
-        return np.all(image >= WHITE_THRESHOLD, axis=2)
-    return image >= WHITE_THRESHOLD
-
-
-def remove_borders(image_path: str, output_path: str) -> ProcessResult:
-    """Удаляет пустые (прозрачные или белые) границы с изображения."""
-    try:
-        image = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
-        if image is None:
-            return ProcessResult.ERROR
-
-        h, w = image.shape[:2]
-        empty_mask = _build_empty_mask(image)
-
-        rows_all_empty = np.all(empty_mask, axis=1)
-        non_empty_rows = np.where(~rows_all_empty)[0]
-        if non_empty_rows.size == 0:
-            return ProcessResult.SKIPPED
-
-        top = int(non_empty_rows[0])
-        bottom = int(non_empty_rows[-1]) + 1
-
-        cols_all_empty = np.all(empty_mask, axis=0)
-        non_empty_cols = np.where(~cols_all_empty)[0]
-        left = int(non_empty_cols[0])
-        right = int(non_empty_cols[-1]) + 1
-
-        has_significant_border = (
-            top >= MIN_BORDER_WIDTH or
-            (h - bottom) >= MIN_BORDER_WIDTH or
-            left >= MIN_BORDER_WIDTH or
-            (w - right) >= MIN_BORDER_WIDTH
-        )
+class ItemState(Enum):
+    PENDING = "pending"          # В очереди или обрабатывается
+    SUCCESS = "success"          # Сохранена обрезанная копия
+    OVERWRITTEN = "overwritten"  # Оригинал перезаписан
+    SKIPPED = "skipped"          # Белых рамок нет
+    ERROR = "error"              # Ошибка обработки
+    CANCELLED = "cancelled"      # Отменено пользователем
 
-        if not has_significant_border:
-            return ProcessResult.SKIPPED
 
-        cropped = image[top:bottom, left:right]
+class HistoryModel(QAbstractListModel):
+    """История обработки: по строке на файл. Хранит только состояние, рисует строки делегат."""
+    StateRole = Qt.UserRole + 1
+    OutputNameRole = Qt.UserRole + 2
+    IconRole = Qt.UserRole + 3
+    DropRole = Qt.UserRole + 4
 
-        ext = os.path.splitext(output_path)[1]
-        is_success, im_buf = cv2.imencode(ext, cropped)
-        if is_success:
-            im_buf.tofile(output_path)
-            return ProcessResult.SUCCESS
-        return ProcessResult.ERROR
-
-    except Exception:
-        return ProcessResult.ERROR
-
-
-def collect_images_from_paths(paths: list[str]) -> list[str]:
-    """Собрать все изображения из списка путей (файлы и папки)."""
-    images = []
-    for path in paths:
-        if os.path.isdir(path):
-            # Рекурсивно собираем изображения из папки
-            for root, _, files in os.walk(path):
-                for file in files:
-                    if file.lower().endswith(SUPPORTED_EXTENSIONS):
-                        images.append(os.path.join(root, file))
-        elif path.lower().endswith(SUPPORTED_EXTENSIONS):
-            images.append(path)
-    return images
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []      # [original_name, ItemState, output_name, drop_id]
+        self._first_id = 0   # ID первой хранимой строки: старые строки вытесняются
+        self._pending = 0
+
+        # Один таймер анимирует спиннеры всех ожидающих строк
+        self._spinner_index = 0
+        self._spinner_timer = QTimer(self)
+        self._spinner_timer.timeout.connect(self._advance_spinner)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        name, state, output_name, drop_id = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return name
+        if role == self.StateRole:
+            return state
+        if role == self.OutputNameRole:
+            return output_name
+        if role == self.DropRole:
+            return drop_id
+        if role == self.IconRole:
+            if state == ItemState.PENDING:
+                return SPINNER_CHARS[self._spinner_index]
+            return {ItemState.ERROR: '✗', ItemState.SKIPPED: '○', ItemState.CANCELLED: '⊘'}.get(state, '✓')
+        return None
+
+    def add_items(self, names: list[str], drop_id: Optional[int] = None) -> range:
+        """Добавить ожидающие строки одного перетаскивания; вернуть их ID."""
+        first_id = self._first_id + len(self._rows)
+        if not names:
+            return range(first_id, first_id)
+        row = len(self._rows)
+        self.beginInsertRows(QModelIndex(), row, row + len(names) - 1)
+        self._rows.extend([name, ItemState.PENDING, '', drop_id] for name in names)
+        self.endInsertRows()
+        self._pending += len(names)
+        if not self._spinner_timer.isActive():
+            self._spinner_timer.start(SPINNER_INTERVAL)
+        self._trim()
+        return range(first_id, first_id + len(names))
+
+    def set_states(self, updates: list[tuple[int, ItemState, str]]) -> None:
+        """Установить итоговые состояния строк: (item_id, состояние, имя результата)."""
+        first_row, last_row = len(self._rows), -1
+        for item_id, state, output_name in updates:
+            row = item_id - self._first_id
+            if not 0 <= row < len(self._rows):
+                continue  # Строка уже вытеснена из истории
+            entry = self._rows[row]
+            if entry[1] == ItemState.PENDING:
+                self._pending -= 1
+            entry[1] = state
+            entry[2] = output_name
+            first_row, last_row = min(first_row, row), max(last_row, row)
+        if not self._pending:
+            self._spinner_timer.stop()
+        if last_row < 0:
+            return
+        # Один сигнал на всю порцию: вид перерисует только видимые строки
+        self.dataChanged.emit(self.index(first_row), self.index(last_row))
+
+    def has_pending(self, drop_id: Optional[int] = None) -> bool:
+        """Есть ли ожидающие строки (у перетаскивания drop_id или вообще)."""
+        if drop_id is None:
+            return self._pending > 0
+        return any(row[1] == ItemState.PENDING and row[3] == drop_id for row in self._rows)
+
+    def _advance_spinner(self) -> None:
+        self._spinner_index = (self._spinner_index + 1) % len(SPINNER_CHARS)
+        # Вид перерисовывает только видимые строки, поэтому сигнал на весь список дёшев
+        self.dataChanged.emit(self.index(0), self.index(len(self._rows) - 1), [self.IconRole])
+
+    def _trim(self) -> None:
+        """Вытеснить самые старые строки, чтобы память не росла бесконечно."""
+        # Удаляем с запасом в 10%, чтобы не сдвигать список при каждом добавлении
+        excess = len(self._rows) - HISTORY_LIMIT
+        if excess <= 0:
+            return
+        count = excess + HISTORY_LIMIT // 10
+        self.beginRemoveRows(QModelIndex(), 0, count - 1)
+        self._pending -= sum(1 for row in self._rows[:count] if row[1] == ItemState.PENDING)
+        del self._rows[:count]
+        self._first_id += count
+        self.endRemoveRows()
+        # Вытеснены последние ожидающие строки: анимировать больше нечего
+        if not self._pending:
+            self._spinner_timer.stop()
 
 
-class FileItemWidget(QFrame):
-    """Виджет для отображения одного обработанного файла."""
-    _next_id = 0  # Статический счётчик для уникальных ID
+class HistoryItemDelegate(QStyledItemDelegate):
+    """Рисует строку истории: статус, имя файла и результат."""
 
-    def __init__(self, original_name: str, parent=None):
+    def __init__(self, tr: Callable[[str], str], parent=None):
         super().__init__(parent)
-        self.widget_id = FileItemWidget._next_id
-        FileItemWidget._next_id += 1
-        self.original_name = original_name
-        self.setStyleSheet('''
-            FileItemWidget {
-                background-color: #3a3a3a;
-                border-radius: 6px;
-            }
-        ''')
-        self.setFixedHeight(44)
-
-        layout = QHBoxLayout(self)
-        layout.setContentsMargins(14, 8, 14, 8)
-        layout.setSpacing(12)
-
-        # Иконка/спиннер
-        self.status_label = QLabel('⏳')
-        self.status_label.setStyleSheet('font-size: 18px;')
-        self.status_label.setFixedWidth(26)
-        layout.addWidget(self.status_label)
-
-        # Имя файла
-        self.name_label = QLabel(original_name)
-        self.name_label.setStyleSheet('color: #bbb; font-size: 16px;')
-        layout.addWidget(self.name_label)
-
-        # Стрелка (скрыта изначально)
-        self.arrow_label = QLabel('→')
-        self.arrow_label.setStyleSheet('color: #777; font-size: 16px;')
-        self.arrow_label.hide()
-        layout.addWidget(self.arrow_label)
-
-        # Новое имя (скрыто изначально)
-        self.new_name_label = QLabel('')
-        self.new_name_label.setStyleSheet('color: #7a7; font-size: 16px;')
-        self.new_name_label.hide()
-        layout.addWidget(self.new_name_label)
-
-        layout.addStretch()
-
-        # Анимация спиннера
-        self.spinner_chars = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
-        self.spinner_index = 0
-        self.spinner_timer = QTimer(self)
-        self.spinner_timer.timeout.connect(self._update_spinner)
-        self.spinner_timer.start(80)
-
-    def _update_spinner(self):
-        self.spinner_index = (self.spinner_index + 1) % len(self.spinner_chars)
-        self.status_label.setText(self.spinner_chars[self.spinner_index])
-
-    def set_success(self, new_name: str):
-        """Установить статус успешной обработки (копия с новым именем)."""
-        self.spinner_timer.stop()
-        self.status_label.setText('✓')
-        self.status_label.setStyleSheet('color: #7a7; font-size: 18px;')
-        self.arrow_label.show()
-        self.new_name_label.setText(new_name)
-        self.new_name_label.show()
-
-    def set_overwritten(self, label: str):
-        """Установить статус успешной перезаписи оригинала."""
-        self.spinner_timer.stop()
-        self.status_label.setText('✓')
-        self.status_label.setStyleSheet('color: #7a7; font-size: 18px;')
-        self.new_name_label.setText(f'({label})')
-        self.new_name_label.setStyleSheet('color: #7a7; font-size: 14px; font-style: italic;')
-        self.new_name_label.show()
-
-    def set_error(self):
-        """Установить статус ошибки."""
-        self.spinner_timer.stop()
-        self.status_label.setText('✗')
-        self.status_label.setStyleSheet('color: #a77; font-size: 18px;')
-        self.name_label.setStyleSheet('color: #a77; font-size: 16px;')
-
-    def set_skipped(self, message: str):
-        """Установить статус пропуска (нет белых рамок)."""
-        self.spinner_timer.stop()
-        self.status_label.setText('○')
-        self.status_label.setStyleSheet('color: #aa7; font-size: 18px;')
-        self.arrow_label.setText('—')
-        self.arrow_label.setStyleSheet('color: #777; font-size: 16px;')
-        self.arrow_label.show()
-        self.new_name_label.setText(message)
-        self.new_name_label.setStyleSheet('color: #aa7; font-size: 16px;')
-        self.new_name_label.show()
+        self.tr = tr
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        return QSize(option.rect.width(), HISTORY_ITEM_HEIGHT + HISTORY_ITEM_SPACING)
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex) -> None:
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        rect = option.rect.adjusted(0, 0, 0, -HISTORY_ITEM_SPACING)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor('#3a3a3a'))
+        painter.drawRoundedRect(rect, 6, 6)
+
+        state = index.data(HistoryModel.StateRole)
+        icon_color = {
+            ItemState.SUCCESS: '#7a7', ItemState.OVERWRITTEN: '#7a7',
+            ItemState.SKIPPED: '#aa7', ItemState.ERROR: '#a77', ItemState.CANCELLED: '#777',
+        }.get(state, option.palette.windowText().color().name())
+        name_color = {ItemState.ERROR: '#a77', ItemState.CANCELLED: '#888'}.get(state, '#bbb')
+
+        right = rect.right() - 14
+        x = self._draw_text(painter, rect, rect.left() + 14, right, index.data(HistoryModel.IconRole),
+                            icon_color, 18, width=26)
+        x = self._draw_text(painter, rect, x, right, index.data(Qt.DisplayRole), name_color, 16)
+        if state == ItemState.SUCCESS:
+            x = self._draw_text(painter, rect, x, right, '→', '#777', 16)
+            self._draw_text(painter, rect, x, right, index.data(HistoryModel.OutputNameRole), '#7a7', 16)
+        elif state == ItemState.OVERWRITTEN:
+            self._draw_text(painter, rect, x, right, f"({self.tr('overwritten')})", '#7a7', 14, italic=True)
+        elif state == ItemState.SKIPPED:
+            x = self._draw_text(painter, rect, x, right, '—', '#777', 16)
+            self._draw_text(painter, rect, x, right, self.tr('no_borders'), '#aa7', 16)
+        elif state == ItemState.CANCELLED:
+            self._draw_text(painter, rect, x, right, f"({self.tr('cancelled')})", '#777', 14, italic=True)
+        painter.restore()
+
+    @staticmethod
+    def _draw_text(painter: QPainter, rect: QRect, x: int, right: int, text: str, color: str,
+                   pixel_size: int, italic: bool = False, width: Optional[int] = None) -> int:
+        """Нарисовать текст, начиная с x (обрезая многоточием у правого края); вернуть x следующего."""
+        font = QFont(painter.font())
+        font.setPixelSize(pixel_size)
+        font.setItalic(italic)
+        metrics = QFontMetrics(font)
+        available = max(0, right - x)
+        text = metrics.elidedText(text, Qt.ElideMiddle, available)
+        text_width = width or metrics.horizontalAdvance(text)
+        painter.setFont(font)
+        painter.setPen(QColor(color))
+        painter.drawText(QRect(x, rect.top(), min(text_width, available), rect.height()),
+                         Qt.AlignVCenter | Qt.AlignLeft, text)
+        return x + text_width + 12
 
 
 class DropEventFilter(QObject):
@@ -281,9 +368,7 @@ class DropEventFilter(QObject):
         elif event.type() == QEvent.Drop:
             self.window.on_drag_leave()
             paths = [url.toLocalFile() for url in event.mimeData().urls()]
-            images = collect_images_from_paths(paths)
-            if images:
-                self.window.process_images(images)
+            self.window.discover_images(paths)
             return True
         return False
 
@@ -294,11 +379,31 @@ class RemoveBordersWindow(QMainWindow):
         self.settings = QSettings('StripeOff', 'StripeOff')
         self.current_lang = self.settings.value('language', 'ru')
         self.overwrite_originals = self.settings.value('overwrite_originals', False, type=bool)
-        self.file_widgets = []
-        self.widget_registry = {}  # widget_id -> FileItemWidget
-        self.overwrite_registry = {}  # widget_id -> bool (был ли файл перезаписан)
+        # 0 — по числу ядер процессора
+        self.worker_count = self.settings.value('worker_count', 0, type=int)
+        # Память на одновременно обрабатываемые изображения, МБ; 0 — половина ОЗУ
+        self.memory_limit_mb = self.settings.value('memory_limit_mb', 0, type=int)
+        # Не обрабатывать повторно файлы, не изменившиеся с прошлого запуска
+        self.use_result_cache = self.settings.value('use_result_cache', True, type=bool)
+        # Обрезать JPEG без перекодирования, если доступен jpegtran
+        self.lossless_jpeg = self.settings.value('lossless_jpeg', False, type=bool)
+        # Набор параметров кодера: скорость сохранения против размера файлов
+        self.encoder_preset = self.settings.value('encoder_preset', DEFAULT_ENCODER_PRESET)
+        if self.encoder_preset not in ENCODER_PRESETS:
+            self.encoder_preset = DEFAULT_ENCODER_PRESET
+        self.overwrite_registry = {}  # item_id -> bool (был ли файл перезаписан)
         self.worker = None
+        self.painted = False        # Окно уже отрисовано хотя бы раз
+        self.discovery_workers = []
+        self.drop_count = 0            # ID следующего перетаскивания
+        self.cancelled_drops = set()   # Отменённые перетаскивания: их поздние находки не ставятся в очередь
+        self.cancelled_before = 0      # ...а также все перетаскивания с меньшим ID (после «Отменить всё»)
         self.has_processed = False  # Флаг: были ли уже обработаны файлы
+        # Счётчики: найдено обходом / добавлено в очередь / обработано / отменено; ещё в очереди — остальные
+        self.found_count = 0
+        self.added_count = 0
+        self.done_count = 0
+        self.cancelled_count = 0
 
         self.setWindowIcon(QIcon(resource_path('eraser.ico')))
         self.setFixedSize(WINDOW_WIDTH, WINDOW_HEIGHT)
@@ -314,11 +419,48 @@ class RemoveBordersWindow(QMainWindow):
         main_layout.setContentsMargins(20, 15, 20, 20)
         main_layout.setSpacing(0)
 
-        # Верхняя панель: чекбокс режима перезаписи + кнопка языка
+        # Верхняя панель: сжатие результата + чекбокс режима перезаписи + кнопка языка
         top_bar = QHBoxLayout()
-        top_bar.setSpacing(12)
+        top_bar.setSpacing(10)
+
+        self.progress_label = QLabel()
+        self.progress_label.setStyleSheet('color: #888; font-size: 12px;')
+        self.progress_label.hide()
+        top_bar.addWidget(self.progress_label)
         top_bar.addStretch()
 
+        self.preset_combo = QComboBox()
+        for preset in ENCODER_PRESETS:
+            self.preset_combo.addItem('', preset)
+        self.preset_combo.setCurrentIndex(ENCODER_PRESETS.index(self.encoder_preset))
+        self.preset_combo.setCursor(Qt.PointingHandCursor)
+        self.preset_combo.setStyleSheet('''
+            QComboBox {
+                background-color: #444;
+                color: #999;
+                border: none;
+                border-radius: 3px;
+                font-size: 11px;
+                padding: 2px 6px;
+            }
+            QComboBox:hover {
+                background-color: #555;
+                color: #ccc;
+            }
+            QComboBox::drop-down {
+                border: none;
+                width: 0px;
+            }
+            QComboBox QAbstractItemView {
+                background-color: #444;
+                color: #ccc;
+                selection-background-color: #555;
+                border: none;
+            }
+        ''')
+        self.preset_combo.currentIndexChanged.connect(self.on_preset_changed)
+        top_bar.addWidget(self.preset_combo)
+
         self.overwrite_checkbox = QCheckBox()
         self.overwrite_checkbox.setChecked(self.overwrite_originals)
         self.overwrite_checkbox.setCursor(Qt.PointingHandCursor)
@@ -407,12 +549,19 @@ class RemoveBordersWindow(QMainWindow):
 
         main_layout.addWidget(self.welcome_widget, 1)
 
-        # Прокручиваемая область для списка файлов (скрыта изначально)
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.scroll_area.setStyleSheet('''
-            QScrollArea {
+        # Список обработанных файлов (скрыт изначально): рисуются только видимые строки
+        self.history_model = HistoryModel(self)
+        self.history_view = QListView()
+        self.history_view.setModel(self.history_model)
+        self.history_view.setItemDelegate(HistoryItemDelegate(self.tr, self.history_view))
+        self.history_view.setUniformItemSizes(True)
+        self.history_view.setSelectionMode(QAbstractItemView.NoSelection)
+        self.history_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.history_view.setFocusPolicy(Qt.NoFocus)
+        self.history_view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.history_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.history_view.setStyleSheet('''
+            QListView {
                 background-color: transparent;
                 border: none;
             }
@@ -430,17 +579,12 @@ class RemoveBordersWindow(QMainWindow):
                 height: 0px;
             }
         ''')
-        self.scroll_area.hide()
-
-        self.files_container = QWidget()
-        self.files_container.setStyleSheet('background-color: transparent;')
-        self.files_layout = QVBoxLayout(self.files_container)
-        self.files_layout.setContentsMargins(0, 0, 0, 0)
-        self.files_layout.setSpacing(4)
-        self.files_layout.addStretch()
-
-        self.scroll_area.setWidget(self.files_container)
-        main_layout.addWidget(self.scroll_area, 1)
+        # Отмена: перетаскивания — из меню строки, всей очереди — ещё и по Esc
+        self.history_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.history_view.customContextMenuRequested.connect(self.show_history_menu)
+        QShortcut(QKeySequence(Qt.Key_Escape), self, activated=self.cancel_all)
+        self.history_view.hide()
+        main_layout.addWidget(self.history_view, 1)
 
         # Event filter для drag-and-drop
         self.drop_filter = DropEventFilter(self)
@@ -464,6 +608,21 @@ class RemoveBordersWindow(QMainWindow):
         self.settings.setValue('overwrite_originals', checked)
         self.update_ui_texts()
 
+    def on_preset_changed(self, index: int) -> None:
+        """Сменить набор параметров кодера; действует на файлы, ещё не взятые в обработку."""
+        self.encoder_preset = ENCODER_PRESETS[index]
+        self.settings.setValue('encoder_preset', self.encoder_preset)
+        if self.worker is not None:
+            self.worker.set_options(self.processing_options())
+
+    def processing_options(self) -> ProcessingOptions:
+        """Параметры обработки по текущим настройкам."""
+        return ProcessingOptions(
+            cache_path=default_cache_path() if self.use_result_cache else None,
+            lossless_jpeg=self.lossless_jpeg,
+            encoder_preset=self.encoder_preset,
+        )
+
     def update_ui_texts(self) -> None:
         """Обновить все тексты интерфейса."""
         self.setWindowTitle(self.tr('window_title'))
@@ -473,6 +632,18 @@ class RemoveBordersWindow(QMainWindow):
         self.lang_button.setText(self.current_lang.upper())
         self.overwrite_checkbox.setText(self.tr('overwrite_label'))
         self.overwrite_checkbox.setToolTip(self.tr('overwrite_tooltip'))
+        for index, preset in enumerate(ENCODER_PRESETS):
+            self.preset_combo.setItemText(index, self.tr(f'preset_{preset}'))
+        self.preset_combo.setToolTip(self.tr('preset_tooltip'))
+        self.update_progress()
+        self.history_view.viewport().update()
+
+    def update_progress(self) -> None:
+        """Обновить счётчики найденных, ждущих обработки и обработанных файлов."""
+        queued = self.added_count - self.done_count - self.cancelled_count
+        self.progress_label.setText(self.tr('progress').format(
+            found=self.found_count, queued=queued, done=self.done_count
+        ))
 
     def on_drag_enter(self):
         """Подсветка при перетаскивании."""
@@ -482,71 +653,145 @@ class RemoveBordersWindow(QMainWindow):
         """Убрать подсветку."""
         self.central.setStyleSheet('background-color: #333;')
 
-    def process_images(self, file_paths: list[str]) -> None:
+    def discover_images(self, paths: list[str]) -> None:
+        """Запустить фоновый обход перетащенных путей; файлы попадают в очередь по мере нахождения."""
+        worker = DiscoveryWorker(paths, self.overwrite_originals, self.drop_count, self)
+        self.drop_count += 1
+        worker.images_found.connect(self._on_images_found)
+        worker.finished.connect(lambda: self._on_discovery_finished(worker))
+        self.discovery_workers.append(worker)
+        worker.start()
+
+    def _on_images_found(self, images: list[str], overwrite: bool, drop_id: int) -> None:
+        # Найденные файлы считаются, даже если их перетаскивание уже отменено
+        self.found_count += len(images)
+        if drop_id < self.cancelled_before or drop_id in self.cancelled_drops:
+            self.update_progress()
+            return
+        self.process_images(images, overwrite, drop_id)
+
+    def _on_discovery_finished(self, worker: DiscoveryWorker) -> None:
+        if worker in self.discovery_workers:
+            self.discovery_workers.remove(worker)
+            worker.deleteLater()
+
+    def start_worker(self) -> None:
+        """Запустить worker и пул процессов, если они ещё не запущены."""
+        if self.worker is not None:
+            return
+        self.worker = ImageProcessorWorker(
+            self.worker_count or None, self.processing_options(), self.memory_limit_mb * 1024 * 1024 or None,
+            WARM_UP_POOL, self
+        )
+        self.worker.files_processed.connect(self._on_files_processed)
+        self.worker.start()
+
+    def process_images(
+        self, file_paths: list[str], overwrite: Optional[bool] = None, drop_id: Optional[int] = None
+    ) -> None:
         """Добавить изображения в очередь обработки."""
         # Скрыть приветствие, показать список
         if not self.has_processed:
             self.has_processed = True
             self.welcome_widget.hide()
-            self.scroll_area.show()
-
-        # Создать worker при первом вызове
-        if self.worker is None:
-            self.worker = ImageProcessorWorker(self)
-            self.worker.file_processed.connect(self._on_file_processed)
-            self.worker.start()
-
-        overwrite = self.overwrite_originals
-        for path in file_paths:
-            original_name = os.path.basename(path)
-            widget = FileItemWidget(original_name)
-            self.files_layout.insertWidget(self.files_layout.count() - 1, widget)
-            self.file_widgets.append(widget)
-
-            # Регистрация и добавление задачи
-            self.widget_registry[widget.widget_id] = widget
-            self.overwrite_registry[widget.widget_id] = overwrite
-            if overwrite:
-                output_path = path
-                output_name = original_name
-            else:
-                base, ext = os.path.splitext(path)
-                output_path = f"{base}_cropped{ext}"
-                output_name = os.path.basename(output_path)
-            self.worker.add_task(widget.widget_id, path, output_path, output_name)
+            self.history_view.show()
+            self.progress_label.show()
+
+        # Если пул ещё не запущен или не прогрет, задачи ждут в очереди worker
+        self.start_worker()
+
+        if overwrite is None:
+            overwrite = self.overwrite_originals
+        if drop_id is None:
+            drop_id = self.drop_count
+            self.drop_count += 1
+        item_ids = self.history_model.add_items([os.path.basename(path) for path in file_paths], drop_id)
+        for item_id, path in zip(item_ids, file_paths):
+            self.overwrite_registry[item_id] = overwrite
+            self.worker.add_task(item_id, path, make_output_path(path, overwrite), drop_id)
+        self.added_count += len(file_paths)
+        self.update_progress()
 
         # Прокрутка вниз
-        QTimer.singleShot(50, self._scroll_to_bottom)
-
-    def _scroll_to_bottom(self):
-        scrollbar = self.scroll_area.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
+        QTimer.singleShot(50, self.history_view.scrollToBottom)
+
+    def _on_files_processed(self, results: list[tuple[int, ProcessResult, str]]):
+        """Применить порцию результатов от worker'а одним обновлением."""
+        updates = []
+        for item_id, result, output_name in results:
+            was_overwrite = self.overwrite_registry.pop(item_id, False)
+            if result == ProcessResult.SUCCESS:
+                if was_overwrite:
+                    updates.append((item_id, ItemState.OVERWRITTEN, ''))
+                else:
+                    updates.append((item_id, ItemState.SUCCESS, output_name))
+            elif result == ProcessResult.SKIPPED:
+                updates.append((item_id, ItemState.SKIPPED, ''))
+            elif result == ProcessResult.CANCELLED:
+                updates.append((item_id, ItemState.CANCELLED, ''))
+            else:
+                updates.append((item_id, ItemState.ERROR, ''))
+        self.history_model.set_states(updates)
+
+        cancelled = sum(1 for _, result, _ in results if result == ProcessResult.CANCELLED)
+        self.cancelled_count += cancelled
+        self.done_count += len(results) - cancelled
+        self.update_progress()
+
+    def show_history_menu(self, position) -> None:
+        """Меню строки истории: отменить её перетаскивание или всю очередь."""
+        drop_id = self.history_view.indexAt(position).data(HistoryModel.DropRole)
+        menu = QMenu(self)
+        cancel_drop = menu.addAction(self.tr('cancel_drop'))
+        cancel_drop.setEnabled(drop_id is not None and self.history_model.has_pending(drop_id))
+        cancel_drop.triggered.connect(lambda: self.cancel_drops(drop_id))
+        cancel_all = menu.addAction(self.tr('cancel_all'))
+        cancel_all.setEnabled(self.history_model.has_pending())
+        cancel_all.triggered.connect(self.cancel_all)
+        menu.exec_(self.history_view.viewport().mapToGlobal(position))
+
+    def cancel_drops(self, *drop_ids: int) -> None:
+        """Отменить перетаскивания: обход их папок останавливается, файлы в очереди и в работе отменяются."""
+        self.cancelled_drops.update(drop_ids)
+        for worker in list(self.discovery_workers):
+            if worker.drop_id in drop_ids:
+                worker.stop()
+        if self.worker is not None:
+            self.worker.cancel(*drop_ids)
 
-    def _on_file_processed(self, widget_id: int, result: ProcessResult, output_name: str):
-        """Обработать результат от worker'а."""
-        widget = self.widget_registry.get(widget_id)
-        if widget is None:
+    def cancel_all(self) -> None:
+        """Отменить всё, что ещё не обработано."""
+        if not self.history_model.has_pending() and not self.discovery_workers:
             return
+        self.cancelled_before = self.drop_count
+        self.cancelled_drops.clear()
+        for worker in list(self.discovery_workers):
+            worker.stop()
+        if self.worker is not None:
+            self.worker.cancel()
 
-        was_overwrite = self.overwrite_registry.pop(widget_id, False)
-        if result == ProcessResult.SUCCESS:
-            if was_overwrite:
-                widget.set_overwritten(self.tr('overwritten'))
-            else:
-                widget.set_success(output_name)
-        elif result == ProcessResult.SKIPPED:
-            widget.set_skipped(self.tr('no_borders'))
-        else:
-            widget.set_error()
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            # Окно уже на экране: процессы пула запускаются и грузят OpenCV в фоне
+            if WARM_UP_POOL:
+                QTimer.singleShot(0, self.start_worker)
 
     def closeEvent(self, event):
-        """Корректно останавливаем worker при закрытии."""
+        """Корректно останавливаем обход папок и worker при закрытии."""
+        for worker in list(self.discovery_workers):
+            worker.stop()
+        for worker in list(self.discovery_workers):
+            worker.wait()
         if self.worker is not None:
             self.worker.stop()
         event.accept()
 
 
 if __name__ == '__main__':
+    # Нужно для пула процессов в сборке PyInstaller
+    multiprocessing.freeze_support()
     app = QApplication([])
     app.setFont(QFont('Segoe UI', 9))
     window = RemoveBordersWindow()
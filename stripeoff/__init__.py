@@ -0,0 +1,43 @@
+"""StripeOff — удаление пустых (белых или прозрачных) полей с изображений.
+
+Импорт пакета не загружает ни Qt, ни OpenCV: модуль обработки
+подгружается при первом обращении к remove_borders, crop_bytes, crop_array,
+detect_borders или crop_to_box,
+HTTP-сервер — при обращении к CropServer.
+"""
+
+import importlib
+
+from .constants import (
+    ALPHA_THRESHOLD, CROPPED_SUFFIX, ENCODER_PRESETS, MIN_BORDER_WIDTH, SUPPORTED_EXTENSIONS,
+    WHITE_THRESHOLD, ProcessResult
+)
+from .discovery import collect_images_from_paths
+from .manifest import ManifestEntry, ManifestWriter, read_manifest
+from .profiling import FileProfile, Profiler
+from .watch import FolderWatcher
+
+# Имя -> модуль, загружаемый при первом обращении
+_LAZY_ATTRIBUTES = {
+    'CropResult': 'core',
+    'CropServer': 'server',
+    'crop_array': 'core',
+    'crop_bytes': 'core',
+    'crop_to_box': 'core',
+    'detect_borders': 'core',
+    'remove_borders': 'core',
+}
+
+__all__ = [
+    'ALPHA_THRESHOLD', 'CROPPED_SUFFIX', 'ENCODER_PRESETS', 'MIN_BORDER_WIDTH', 'SUPPORTED_EXTENSIONS',
+    'WHITE_THRESHOLD', 'CropResult', 'CropServer', 'FileProfile', 'FolderWatcher', 'ManifestEntry', 'ManifestWriter',
+    'ProcessResult', 'Profiler', 'collect_images_from_paths', 'crop_array', 'crop_bytes', 'crop_to_box',
+    'detect_borders', 'read_manifest', 'remove_borders',
+]
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f'.{module_name}', __name__), name)
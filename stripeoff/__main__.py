@@ -0,0 +1,9 @@
+import multiprocessing
+import sys
+
+from stripeoff.cli import main
+
+if __name__ == '__main__':
+    # Нужно для пула процессов в собранном исполняемом файле
+    multiprocessing.freeze_support()
+    sys.exit(main())
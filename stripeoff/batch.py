@@ -0,0 +1,768 @@
+"""Пакетная обработка изображений пулом процессов. Модуль не зависит от Qt."""
+
+import hashlib
+import heapq
+import itertools
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from queue import Empty, Queue
+from typing import TYPE_CHECKING, Callable, NamedTuple, Optional
+
+from .cache import encoding_key
+from .constants import CROPPED_SUFFIX, DEFAULT_ENCODER_PRESET, Box, ProcessResult
+from .headers import estimate_memory, is_stripwise, read_image_header
+from .profiling import FileProfile, Profiler, stage_timer
+
+if TYPE_CHECKING:
+    from .cache import ResultCache
+    from .manifest import ManifestWriter
+
+# Кэши результатов, открытые в текущем потоке: соединение SQLite нельзя делить между потоками
+_thread_state = threading.local()
+# В процессе пула: флаги отмены по ячейкам, общие с BatchProcessor (см. _init_worker)
+_cancel_flags = None
+
+MEMORY_LIMIT_FRACTION = 0.5                 # По умолчанию изображениям отдаётся половина ОЗУ
+FALLBACK_MEMORY_LIMIT = 4 * 1024 ** 3       # Если объём ОЗУ узнать не удалось
+IO_THREADS = 4                              # Потоков чтения и столько же потоков записи
+READ_CHUNK = 1024 * 1024                    # Порция чтения файла наперёд
+# Результат больше этого процесс пула записывает сам: передача крупных буферов
+# через канал дробит кучу процесса, и его память после этого не возвращается
+TRANSFER_MAX_BYTES = 16 * 1024 * 1024
+DEDUP_MAX_ENTRIES = 10000                   # Сколько обработанных содержимых помнить для поиска дубликатов
+# Очередь упорядочена по сроку: время постановки плюс оценка памяти файла (размер
+# декодированного изображения), делённая на эту скорость. Мелкие файлы идут первыми,
+# но крупный файл пропускает вперёд только файлы, поставленные не позже его срока:
+# 200-мегабайтный — те, что добавлены в ближайшие ~6 с
+AGING_BYTES_PER_SECOND = 32 * 1024 * 1024
+INTAKE_CHUNK = 256                          # Сколько новых задач оценивать одновременно
+PROBE_THREADS = 8                           # Потоков чтения заголовков: на сетевой папке каждый ждёт ответа
+
+
+class ProcessingOptions(NamedTuple):
+    cache_path: Optional[str] = None   # Индекс результатов прошлых запусков (None — без кэша)
+    cache_hash: bool = False           # Сверять с индексом ещё и хэш содержимого
+    lossless_jpeg: bool = False        # Обрезать JPEG без перекодирования (через jpegtran)
+    encoder_preset: str = DEFAULT_ENCODER_PRESET   # Набор параметров кодера (ENCODER_PRESETS)
+    detect_only: bool = False          # Только найти рамки: ничего не кодировать и не записывать
+
+
+class Task(NamedTuple):
+    task_id: object    # Идентификатор задачи у вызывающей стороны (например, ID виджета)
+    path: str
+    output_path: str
+    box: Optional[Box] = None   # Готовая рамка (из манифеста): обрезать по ней без поиска
+    group: object = None        # Группа для отмены (например, одно перетаскивание)
+
+
+def make_output_path(path: str, overwrite: bool = False, suffix: str = CROPPED_SUFFIX) -> str:
+    """Путь для сохранения результата: сам оригинал или копия с суффиксом."""
+    if overwrite:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}{suffix}{ext}"
+
+
+def physical_memory() -> Optional[int]:
+    """Объём физической памяти, байт; None — узнать не удалось."""
+    if sys.platform == 'win32':
+        import ctypes
+
+        class MemoryStatusEx(ctypes.Structure):
+            _fields_ = [
+                ('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+            ]
+
+        status = MemoryStatusEx()
+        status.dwLength = ctypes.sizeof(status)
+        if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return None
+        return status.ullTotalPhys
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_memory_limit() -> int:
+    """Предел памяти на одновременно обрабатываемые изображения по умолчанию."""
+    total = physical_memory()
+    return int(total * MEMORY_LIMIT_FRACTION) if total else FALLBACK_MEMORY_LIMIT
+
+
+def _thread_cache(options: ProcessingOptions) -> Optional['ResultCache']:
+    """Кэш результатов для текущего потока; None — кэш выключен."""
+    # Без записи результата сохранять в индексе нечего
+    if not options.cache_path or options.detect_only:
+        return None
+    caches = getattr(_thread_state, 'caches', None)
+    if caches is None:
+        caches = _thread_state.caches = {}
+    cache = caches.get(options.cache_path)
+    if cache is None:
+        from .cache import ResultCache
+        cache = caches[options.cache_path] = ResultCache(options.cache_path, options.cache_hash)
+    return cache
+
+
+def _warm_up() -> None:
+    """Загрузить модуль обработки (и OpenCV) в процессе пула заранее."""
+    from . import core  # noqa: F401
+
+
+def _init_worker(cancel_flags, warm_up: bool) -> None:
+    """Инициализация процесса пула: флаги отмены и, если нужно, загрузка OpenCV."""
+    global _cancel_flags
+    _cancel_flags = cancel_flags
+    if warm_up:
+        _warm_up()
+
+
+def _cancel_check(slot: Optional[int]) -> Optional[Callable[[], bool]]:
+    """Проверка отмены задачи в ячейке slot; None — задачу нельзя отменить."""
+    if slot is None or _cancel_flags is None:
+        return None
+    return lambda: _cancel_flags[slot] != 0
+
+
+def _process(
+    path: str, output_path: str, options: ProcessingOptions, profiling: bool = False, box: Optional[Box] = None,
+    slot: Optional[int] = None,
+) -> tuple[ProcessResult, Optional[Box], Optional[FileProfile]]:
+    """Обработать файл в процессе пула целиком, вместе с чтением и записью.
+
+    Отмена проверяется только перед началом: дальше файл обрабатывается до конца.
+    """
+    from .core import crop_to_box, detect_borders, remove_borders
+
+    profile = FileProfile(path) if profiling else None
+    cancelled = _cancel_check(slot)
+    if cancelled is not None and cancelled():
+        return ProcessResult.CANCELLED, None, profile
+    if options.detect_only:
+        result, box = detect_borders(path, profile=profile)[:2]
+    elif box is not None:
+        result = crop_to_box(path, output_path, box, options.lossless_jpeg, profile, options.encoder_preset)
+    else:
+        result = remove_borders(
+            path, output_path, cache=_thread_cache(options), lossless_jpeg=options.lossless_jpeg, profile=profile,
+            encoder_preset=options.encoder_preset,
+        )
+    return result, box, profile
+
+
+def _compute(
+    path: str, output_path: str, options: ProcessingOptions, profile: Optional[FileProfile],
+    box: Optional[Box] = None, slot: Optional[int] = None, data: Optional[bytes] = None,
+) -> tuple[ProcessResult, Optional[Box], object, Optional[FileProfile]]:
+    """Обработать файл в процессе пула. OpenCV загружается только здесь.
+
+    Закодированный результат возвращается для этапа записи; результат больше
+    TRANSFER_MAX_BYTES процесс записывает сам. Если box задан, рамка не ищется.
+    data — содержимое файла, уже прочитанное этапом чтения; без него файл читается здесь.
+    Отмена (флаг в ячейке slot) проверяется между этапами; начатая запись не прерывается.
+    """
+    from .core import _crop_box_to_buffer, _crop_to_buffer, _write_result
+
+    cancelled = _cancel_check(slot)
+    if box is not None and not options.detect_only:
+        result, box, encoded = _crop_box_to_buffer(
+            path, output_path, box, options.lossless_jpeg, options.encoder_preset, profile, cancelled, data
+        )
+    else:
+        result, box, encoded = _crop_to_buffer(
+            path, output_path, True, options.lossless_jpeg, options.encoder_preset, profile,
+            encode=not options.detect_only, cancelled=cancelled, content=data,
+        )
+    if encoded is not None and cancelled is not None and cancelled():
+        return ProcessResult.CANCELLED, box, None, profile
+    if encoded is not None and memoryview(encoded).nbytes > TRANSFER_MAX_BYTES:
+        result, box = _write_result(output_path, encoded, result, box, profile)
+        encoded = None
+    return result, box, encoded, profile
+
+
+class _Job:
+    """Файл на пути через этапы чтения, обработки и записи."""
+    __slots__ = ('task', 'memory', 'profile', 'key', 'result', 'box', 'encoded', 'size', 'content',
+                 'followers', 'duplicate_of', 'source', 'signature', 'stale', 'cancelled', 'slot', 'stripwise',
+                 'queued', 'retried', 'data')
+
+    def __init__(self, task: Task, memory: int, profile: Optional[FileProfile]):
+        self.task = task
+        self.memory = memory        # Оценка памяти, занятая файлом до конца записи
+        self.stripwise = False      # Процесс пула будет читать файл полосами
+        self.queued = 0.0           # Когда задача взята из очереди (time.monotonic())
+        self.retried = False        # Файл уже отдавался пулу, упавшему при его обработке
+        self.profile = profile
+        self.key = None             # Ключ файла в кэше результатов
+        self.result = None
+        self.box = None
+        self.encoded = None         # Закодированный результат для записи
+        self.size = 0               # Прочитано байт
+        self.data = None            # Прочитанное содержимое файла, которое процесс пула не читает снова
+        self.content = None         # Хэш содержимого с параметрами обработки, если ищутся дубликаты
+        self.followers = []         # Дубликаты, ждущие результата этого файла
+        self.duplicate_of = None    # У дубликата: файл с тем же содержимым, чей результат взят
+        self.source = None          # У дубликата: готовый результат, который нужно скопировать
+        # Размер и время изменения результата (см. _output_signature): у файла с дубликатами —
+        # записанного им, у дубликата — ожидаемые у source
+        self.signature = None
+        self.stale = False          # У дубликата: source с тех пор перезаписан или удалён
+        self.cancelled = False      # Задачу отменили, пока она была на одном из этапов
+        self.slot = None            # Ячейка флага отмены, пока файл в пуле
+
+def _output_signature(path: str) -> Optional[tuple[int, int]]:
+    """Размер и время изменения файла результата; None — файла нет."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _probe_stage(job: _Job) -> None:
+    """Этап оценки (поток ввода-вывода): оценить память файла по заголовку."""
+    header = read_image_header(job.task.path)
+    job.memory = estimate_memory(job.task.path, header)
+    job.stripwise = is_stripwise(job.task.path, header)
+
+
+def _read_stage(job: _Job, options: ProcessingOptions, dedup: bool = False) -> None:
+    """Этап чтения (поток ввода-вывода): сверить файл с кэшем и прочитать его заранее.
+
+    Файл не больше TRANSFER_MAX_BYTES читается целиком в job.data и передаётся
+    процессу пула, так что с диска он читается один раз. Файл крупнее процесс
+    пула читает сам: передача больших буферов дробит его кучу. Такой файл здесь
+    читается, только если при dedup=True нужен хэш содержимого; тогда процесс
+    пула читает его уже из файлового кэша ОС.
+    """
+    stage = stage_timer(job.profile)
+    # Обрезка по готовой рамке не сверяется с индексом: рамка уже известна
+    cache = _thread_cache(options) if job.task.box is None else None
+    if cache is not None:
+        with stage('cache'):
+            job.key = cache.file_key(job.task.path)
+            encoding = encoding_key(options.encoder_preset, options.lossless_jpeg)
+            cached = cache.lookup(job.key, job.task.output_path, encoding) if job.key is not None else None
+        if cached is not None:
+            job.result, job.box = cached.result, cached.box
+            if job.profile is not None:
+                job.profile.cached, job.profile.box = True, cached.box
+            return
+    # Огромные файлы процесс пула читает полосами, заранее их не прочитать
+    if job.stripwise:
+        return
+    # SHA-1 с аппаратным ускорением вдвое быстрее BLAKE2 и не отстаёт от чтения
+    hasher = hashlib.sha1(usedforsecurity=False) if dedup else None
+    with stage('read'):
+        with open(job.task.path, 'rb', buffering=0) as file:
+            if os.fstat(file.fileno()).st_size <= TRANSFER_MAX_BYTES:
+                job.data = file.readall()
+                job.size = len(job.data)
+                if hasher is not None:
+                    hasher.update(job.data)
+            elif hasher is not None:
+                buffer = getattr(_thread_state, 'buffer', None)
+                if buffer is None:
+                    buffer = _thread_state.buffer = bytearray(READ_CHUNK)
+                view = memoryview(buffer)
+                while True:
+                    count = file.readinto(buffer)
+                    if not count:
+                        break
+                    job.size += count
+                    hasher.update(view[:count])
+    if hasher is not None:
+        job.content = (
+            hasher.digest(), os.path.splitext(job.task.output_path)[1].lower(), options, job.task.box
+        )
+
+
+def _write_stage(job: _Job, options: ProcessingOptions) -> None:
+    """Этап записи (поток ввода-вывода): записать результат и запомнить его в кэше.
+
+    Дубликат копирует результат файла с тем же содержимым, только если тот
+    не изменился с записи; иначе задача помечается stale и ничего не пишет.
+    """
+    if job.source is not None:
+        if _output_signature(job.source) != job.signature:
+            job.stale = True
+            return
+        try:
+            # Дубликат того же файла (например, жёсткая ссылка) уже перезаписан
+            same = os.path.samefile(job.source, job.task.output_path)
+        except OSError:
+            same = False
+        try:
+            if not same:
+                with stage_timer(job.profile)('write'):
+                    shutil.copyfile(job.source, job.task.output_path)
+        except OSError as error:
+            job.result = ProcessResult.ERROR
+            if job.profile is not None:
+                job.profile.set_error(error)
+    if job.encoded is not None:
+        try:
+            with stage_timer(job.profile)('write'):
+                with open(job.task.output_path, 'wb') as file:
+                    file.write(job.encoded)
+        except OSError as error:
+            job.result = ProcessResult.ERROR
+            if job.profile is not None:
+                job.profile.set_error(error)
+        job.encoded = None
+    cache = _thread_cache(options)
+    if cache is not None and job.key is not None:
+        cache.store(job.key, job.task.output_path, job.result, job.box,
+                    encoding_key(options.encoder_preset, options.lossless_jpeg))
+    if job.content is not None and job.duplicate_of is None and job.result == ProcessResult.SUCCESS:
+        job.signature = _output_signature(job.task.output_path)
+
+
+class BatchProcessor:
+    """Раздаёт задачи из очереди пулу процессов и сообщает о результатах через on_result.
+
+    Обработка файла разбита на этапы: потоки чтения заранее читают следующие
+    файлы и передают их содержимое пулу (см. _read_stage), процессы пула
+    декодируют, ищут рамку и кодируют, потоки записи сохраняют результаты.
+    Так процессы не простаивают на вводе-выводе (сетевые папки, медленные
+    диски). Очереди между этапами ограничены: читается не больше
+    2 x max_workers файлов наперёд, а при отстающей записи новые файлы
+    не отдаются в пул. При io_threads=0 процессы пула сами читают
+    и записывают файлы.
+
+    Задачи берутся не в порядке добавления, а по сроку: время постановки плюс
+    оценка памяти файла, делённая на AGING_BYTES_PER_SECOND. Мелкие файлы
+    обгоняют крупные, но крупный файл не ждёт бесконечно.
+
+    Файлы отдаются в пул, пока сумма оценок их памяти (по размерам из
+    заголовка) не превышает memory_limit; остальные ждут в порядке очереди.
+    Заголовки читают потоки оценки, а не цикл раздачи задач.
+    Файл, который один больше предела, обрабатывается, когда других нет,
+    и пока он в работе, другие файлы не запускаются.
+
+    cancel() отменяет задачи группы (Task.group) или все: ждущие — сразу, а
+    файлы в пуле — на границе этапов обработки; начатая запись не прерывается.
+    Отменённые задачи приходят в on_result с ProcessResult.CANCELLED.
+
+    Если задан profiler, этапы обработки замеряются, а записи собираются
+    в profiler в процессе, вызвавшем run(). Если задан manifest, в него так же
+    записываются результат и рамка каждого файла (для options.detect_only).
+
+    При dedup=True этап чтения считает хэш содержимого, и из файлов с одинаковым
+    содержимым (и форматом результата) обрабатывается только первый, а
+    остальным копируется его результат; их число и объём — в duplicates
+    и duplicate_bytes. Результат копируется, только если его размер и время
+    изменения те же, что после записи: иначе дубликат обрабатывается сам.
+
+    При warm_up=True все процессы пула запускаются и загружают OpenCV сразу
+    в run(), а не при первой задаче: первый файл не ждёт запуска процесса.
+    """
+
+    def __init__(
+        self,
+        on_result: Callable[[Task, ProcessResult], None],
+        max_workers: Optional[int] = None,
+        options: ProcessingOptions = ProcessingOptions(),
+        on_tick: Optional[Callable[[], None]] = None,
+        profiler: Optional[Profiler] = None,
+        memory_limit: Optional[int] = None,
+        io_threads: int = IO_THREADS,
+        warm_up: bool = False,
+        dedup: bool = True,
+        manifest: Optional['ManifestWriter'] = None,
+    ):
+        self.on_result = on_result
+        self.on_tick = on_tick    # Вызывается на каждом круге цикла, не реже чем раз в 0.1 с
+        self.profiler = profiler
+        self.manifest = manifest
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.memory_limit = memory_limit or default_memory_limit()   # Байт на файлы в работе
+        self.io_threads = io_threads
+        self.warm_up = warm_up
+        self.dedup = dedup
+        self.duplicates = 0         # Файлов, получивших результат дубликата
+        self.duplicate_bytes = 0    # Их объём: столько не пришлось декодировать
+        self.options = options
+        self.task_queue = Queue()
+        self._cancel_requests = Queue()   # Кортежи отменяемых групп; None — все задачи
+        self._running = True
+        self._closed = False
+        # run() ждёт завершения этапов вместе с этим Future: новые задачи и отмена будят его сразу
+        self._wake = Future()
+        self._wake_lock = threading.Lock()
+
+    def add_task(
+        self, task_id: object, path: str, output_path: str, box: Optional[Box] = None, group: object = None
+    ) -> None:
+        """Добавить задачу в очередь; с box файл обрезается по этой рамке без поиска.
+
+        group — к какой группе относится задача, чтобы её можно было отменить cancel(group).
+        """
+        self.task_queue.put(Task(task_id, path, output_path, box, group))
+        self._wake_up()
+
+    def cancel(self, *groups: object) -> None:
+        """Отменить задачи перечисленных групп, а без аргументов — все задачи."""
+        self._cancel_requests.put(groups or None)
+        self._wake_up()
+
+    def close(self) -> None:
+        """Сообщить, что новых задач не будет: run() завершится, обработав очередь."""
+        self._closed = True
+        self._wake_up()
+
+    def _wake_up(self) -> None:
+        with self._wake_lock:
+            if not self._wake.done():
+                self._wake.set_result(None)
+
+    def _reset_wake(self) -> Future:
+        with self._wake_lock:
+            if self._wake.done():
+                self._wake = Future()
+            return self._wake
+
+    def _finish(self, job: _Job) -> None:
+        profile = job.profile
+        if profile is not None:
+            profile.result = job.result.value
+            if not profile.total:
+                profile.total = sum(profile.stages.values())
+            self.profiler.add(profile)
+        if self.manifest is not None:
+            self.manifest.add(job.task.path, job.result, job.box)
+        self.on_result(job.task, job.result)
+
+    def _new_job(self, task: Task, memory: int) -> _Job:
+        return _Job(task, memory, FileProfile(task.path) if self.profiler is not None else None)
+
+    def run(self) -> None:
+        """Обрабатывать задачи до stop() или, после close(), пока очередь не опустеет."""
+        # spawn вместо fork: дочерние процессы не наследуют состояние Qt и потоков
+        context = multiprocessing.get_context('spawn')
+        # По ячейке флага отмены на файл в пуле: их там не больше 2 x max_workers
+        cancel_flags = context.RawArray('b', self.max_workers * 2)
+        free_slots = list(range(len(cancel_flags)))
+
+        def start_pool() -> ProcessPoolExecutor:
+            pool = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=context, initializer=_init_worker,
+                initargs=(cancel_flags, self.warm_up),
+            )
+            if self.warm_up:
+                # Процессы пула создаются по одному на задачу, пока их меньше max_workers
+                for _ in range(self.max_workers):
+                    pool.submit(_warm_up)
+            return pool
+
+        def restart_pool(broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+            # Процесс пула упал (нехватка памяти, сбой декодера): пул больше не принимает задачи
+            if broken is not executor:
+                return executor
+            broken.shutdown(wait=False, cancel_futures=True)
+            return start_pool()
+
+        executor = start_pool()
+        pipelined = self.io_threads > 0
+        probes = ThreadPoolExecutor(PROBE_THREADS, 'stripeoff-probe')
+        readers = ThreadPoolExecutor(self.io_threads, 'stripeoff-read') if pipelined else None
+        writers = ThreadPoolExecutor(self.io_threads, 'stripeoff-write') if pipelined else None
+        futures = {}        # future -> (этап, _Job)
+        busy = Counter()    # Этап -> файлов на нём
+        staged = deque()    # Задачи из task_queue, ещё не отданные на оценку памяти
+        queued = []         # Куча (срок, номер, _Job): задачи, ждущие чтения
+        sequence = itertools.count()
+        ready = deque()     # Прочитанные наперёд файлы, ждущие процесса пула
+        held = 0            # Файлов в пуле или в записи: на них приходится память
+        held_bytes = 0
+        leaders = {}            # Содержимое -> файл, который его обрабатывает
+        # Содержимое -> (результат, границы, исходный файл, путь результата, его размер и время изменения)
+        finished = OrderedDict()
+        owners = {}             # Путь результата -> содержимое в finished, чей это результат
+
+        def follow(
+            job: _Job, result: ProcessResult, box: Optional[Box], leader_path: str, output_path: str,
+            signature: Optional[tuple[int, int]],
+        ) -> None:
+            # Дубликат получает результат файла с тем же содержимым; его обрезанную копию остаётся скопировать
+            job.result, job.box, job.duplicate_of, job.signature = result, box, leader_path, signature
+            job.data = None
+            self.duplicates += 1
+            self.duplicate_bytes += job.size
+            if job.profile is not None:
+                job.profile.duplicate_of, job.profile.input_bytes, job.profile.box = leader_path, job.size, box
+            if result == ProcessResult.SUCCESS and output_path != job.task.output_path and not self.options.detect_only:
+                job.source = output_path
+            if job.source is not None or job.key is not None:
+                futures[writers.submit(_write_stage, job, self.options)] = 'write', job
+                busy['write'] += 1
+            else:
+                self._finish(job)
+
+        def unfollow(job: _Job) -> None:
+            # Копия, которую взял бы дубликат, изменилась: запись о ней забывается, а файл обрабатывается сам
+            entry = finished.get(job.content)
+            if entry is not None and entry[3] == job.source:
+                forget(job.content)
+            self.duplicates -= 1
+            self.duplicate_bytes -= job.size
+            job.result = job.box = job.duplicate_of = job.source = job.signature = job.content = None
+            job.stale = False
+            if job.profile is not None:
+                job.profile.duplicate_of = job.profile.box = None
+            ready.append(job)
+
+        def forget(content: tuple) -> None:
+            entry = finished.pop(content)
+            if owners.get(entry[3]) == content:
+                del owners[entry[3]]
+
+        def overwritten(job: _Job) -> None:
+            # Результат записан поверх копии другого содержимого: брать её для дубликатов больше нельзя
+            content = owners.get(job.task.output_path)
+            if content is not None and content != job.content:
+                forget(content)
+
+        def release_followers(job: _Job) -> None:
+            # Файл с дубликатами готов: они получают его результат, а если результата нет — обрабатываются сами
+            if job.content is None or leaders.get(job.content) is not job:
+                return
+            del leaders[job.content]
+            if job.result in (ProcessResult.ERROR, ProcessResult.CANCELLED):
+                # Ошибка могла быть в самом файле или пути результата, а отменить могли только этот файл
+                for follower in job.followers:
+                    follower.content = None
+                    ready.append(follower)
+            else:
+                entry = job.result, job.box, job.task.path, job.task.output_path, job.signature
+                # Записанный результат, который не удалось найти, для дубликатов из следующих задач не годится
+                if job.signature is not None or job.result != ProcessResult.SUCCESS or self.options.detect_only:
+                    if job.content in finished:
+                        forget(job.content)
+                    finished[job.content] = entry
+                    if job.result == ProcessResult.SUCCESS and not self.options.detect_only:
+                        owners[job.task.output_path] = job.content
+                    if len(finished) > DEDUP_MAX_ENTRIES:
+                        forget(next(iter(finished)))
+                for follower in job.followers:
+                    follow(follower, *entry)
+            job.followers = []
+
+        def finish_cancelled(job: _Job) -> None:
+            job.result = ProcessResult.CANCELLED
+            self._finish(job)
+
+        def cancel(groups: Optional[tuple]) -> None:
+            nonlocal queued
+            matches = (lambda task: True) if groups is None else (lambda task: task.group in groups)
+            while True:
+                try:
+                    staged.append(self.task_queue.get_nowait())
+                except Empty:
+                    break
+            kept = [task for task in staged if not matches(task)]
+            for task in staged:
+                if matches(task):
+                    finish_cancelled(self._new_job(task, 0))
+            staged.clear()
+            staged.extend(kept)
+
+            cancelled = [entry[2] for entry in queued if matches(entry[2].task)]
+            if cancelled:
+                queued = [entry for entry in queued if not matches(entry[2].task)]
+                heapq.heapify(queued)
+                for job in cancelled:
+                    finish_cancelled(job)
+
+            for leader in leaders.values():
+                for follower in [follower for follower in leader.followers if matches(follower.task)]:
+                    leader.followers.remove(follower)
+                    finish_cancelled(follower)
+
+            cancelled = [job for job in ready if matches(job.task)]
+            if cancelled:
+                kept = [job for job in ready if not matches(job.task)]
+                ready.clear()
+                ready.extend(kept)
+                for job in cancelled:
+                    finish_cancelled(job)
+                    release_followers(job)
+
+            # Файлы на этапах чтения и обработки отменяются, когда этап закончится или дойдёт до проверки
+            for stage, job in futures.values():
+                if stage != 'write' and matches(job.task):
+                    job.cancelled = True
+                    if job.slot is not None:
+                        cancel_flags[job.slot] = 1
+
+        try:
+            while self._running:
+                if self.on_tick is not None:
+                    self.on_tick()
+                wake = self._reset_wake()
+                while True:
+                    try:
+                        groups = self._cancel_requests.get_nowait()
+                    except Empty:
+                        break
+                    cancel(groups)
+
+                # Память новых задач оценивается по заголовкам в потоках оценки: на медленном диске
+                # чтение заголовков не задерживает ни результаты, ни раздачу файлов пулу
+                while busy['probe'] < INTAKE_CHUNK:
+                    if staged:
+                        task = staged.popleft()
+                    else:
+                        try:
+                            task = self.task_queue.get_nowait()
+                        except Empty:
+                            break
+                    job = self._new_job(task, 0)
+                    job.queued = time.monotonic()
+                    futures[probes.submit(_probe_stage, job)] = 'probe', job
+                    busy['probe'] += 1
+
+                # Держим небольшой запас прочитанных задач, чтобы процессы не простаивали
+                while queued and busy['read'] + len(ready) < self.max_workers * 2:
+                    job = heapq.heappop(queued)[2]
+                    if pipelined:
+                        futures[readers.submit(_read_stage, job, self.options, self.dedup)] = 'read', job
+                        busy['read'] += 1
+                    else:
+                        ready.append(job)
+
+                # Пока запись отстаёт, новые файлы в пул не отдаются
+                while ready and busy['compute'] < self.max_workers * 2 and (
+                        not pipelined or busy['write'] < self.io_threads * 2):
+                    job = ready[0]
+                    # Слишком большой файл всё равно запускается, но только когда других нет
+                    if held and held_bytes + job.memory > self.memory_limit:
+                        break
+                    ready.popleft()
+                    held += 1
+                    held_bytes += job.memory
+                    job.slot = free_slots.pop()
+                    cancel_flags[job.slot] = 0
+                    if pipelined:
+                        call = (_compute, job.task.path, job.task.output_path, self.options, job.profile,
+                                job.task.box, job.slot, job.data)
+                        job.data = None
+                    else:
+                        call = (_process, job.task.path, job.task.output_path, self.options,
+                                self.profiler is not None, job.task.box, job.slot)
+                    try:
+                        future = executor.submit(*call)
+                    except BrokenProcessPool:
+                        executor = restart_pool(executor)
+                        future = executor.submit(*call)
+                    future.executor = executor
+                    futures[future] = 'compute', job
+                    busy['compute'] += 1
+
+                intake = (bool(staged) or not self.task_queue.empty()) and busy['probe'] < INTAKE_CHUNK
+                if not futures and not intake:
+                    if self._closed and not queued and not ready:
+                        break
+                done, _ = wait([*futures, wake], timeout=0 if intake else 0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future is wake:
+                        continue
+                    stage, job = futures.pop(future)
+                    busy[stage] -= 1
+                    if job.slot is not None:
+                        free_slots.append(job.slot)
+                        job.slot = None
+                    try:
+                        outcome = future.result()
+                    except Exception as error:
+                        if stage == 'compute' and isinstance(error, BrokenProcessPool):
+                            executor = restart_pool(future.executor)
+                            # Какой из файлов в пуле его уронил, неизвестно: каждый получает вторую попытку
+                            # в новом пуле, а файл, уронивший пул и на ней, — ERROR
+                            if not job.retried and not job.cancelled:
+                                job.retried = True
+                                held -= 1
+                                held_bytes -= job.memory
+                                ready.appendleft(job)
+                                continue
+                        # Например, ошибка чтения или повторное падение процесса пула на этом файле
+                        job.result = ProcessResult.CANCELLED if job.cancelled else ProcessResult.ERROR
+                        if job.profile is not None:
+                            job.profile.set_error(error)
+                    else:
+                        if stage == 'probe':
+                            if job.cancelled:
+                                finish_cancelled(job)
+                            else:
+                                deadline = job.queued + job.memory / AGING_BYTES_PER_SECOND
+                                heapq.heappush(queued, (deadline, next(sequence), job))
+                            continue
+                        if stage == 'read' and job.cancelled and job.result is None:
+                            job.result = ProcessResult.CANCELLED
+                        if stage == 'read' and job.result is None:
+                            if job.content is not None:
+                                leader = leaders.get(job.content)
+                                if leader is not None:
+                                    leader.followers.append(job)
+                                    continue
+                                entry = finished.get(job.content)
+                                # Что обрезанную копию с тех пор не перезаписали и не удалили, проверит этап записи
+                                if entry is not None:
+                                    finished.move_to_end(job.content)
+                                    follow(job, *entry)
+                                    continue
+                                leaders[job.content] = job
+                            ready.append(job)
+                            continue
+                        if stage == 'compute':
+                            if not pipelined:
+                                job.result, job.box, job.profile = outcome
+                            else:
+                                job.result, job.box, job.encoded, job.profile = outcome
+                                if job.cancelled and job.encoded is not None:
+                                    # Отменили, пока файл кодировался: результат не записывается
+                                    job.result, job.encoded = ProcessResult.CANCELLED, None
+                                # Размер и время изменения результата для дубликатов тоже узнаёт этап записи
+                                if job.result != ProcessResult.CANCELLED and (
+                                        job.encoded is not None or job.key is not None or (
+                                            job.content is not None and job.result == ProcessResult.SUCCESS
+                                            and not self.options.detect_only)):
+                                    futures[writers.submit(_write_stage, job, self.options)] = 'write', job
+                                    busy['write'] += 1
+                                    continue
+                        if stage == 'write' and job.stale:
+                            unfollow(job)
+                            continue
+                    if job.result == ProcessResult.SUCCESS and not self.options.detect_only:
+                        overwritten(job)
+                    if stage not in ('probe', 'read') and job.duplicate_of is None:
+                        held -= 1
+                        held_bytes -= job.memory
+                    self._finish(job)
+                    release_followers(job)
+        finally:
+            # Файлы в пуле прерываются на ближайшей проверке, ожидающие задачи отменяются
+            cancel_flags[:] = [1] * len(cancel_flags)
+            executor.shutdown(wait=True, cancel_futures=True)
+            probes.shutdown(wait=True, cancel_futures=True)
+            if pipelined:
+                readers.shutdown(wait=True, cancel_futures=True)
+                writers.shutdown(wait=True, cancel_futures=True)
+
+    def stop(self) -> None:
+        """Попросить run() завершиться; файлы в пуле прерываются на границе этапов."""
+        self._running = False
+        self._wake_up()
@@ -0,0 +1,216 @@
+"""Постоянный индекс результатов обработки в SQLite.
+
+При повторном запуске по тем же папкам неизменённые файлы не декодируются:
+результат берётся из индекса, если исходник не менялся, а обрезанная копия
+на месте и записана с теми же параметрами кодера. Индекс сбрасывается
+при смене порогов обнаружения рамок.
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+
+from .constants import ALPHA_THRESHOLD, MIN_BORDER_WIDTH, WHITE_THRESHOLD, Box, ProcessResult
+
+SCHEMA_VERSION = 2
+CACHE_MAX_BYTES = 64 * 1024 * 1024   # Предел размера индекса, после которого вытесняются старые записи
+EVICTION_CHECK_INTERVAL = 1000       # Размер индекса проверяется раз в столько сохранений
+EVICTION_FRACTION = 0.1              # Доля давно не использованных записей, удаляемых за раз
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def default_cache_path() -> str:
+    """Путь к индексу в пользовательском каталоге кэша."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'StripeOff', 'cache.sqlite3')
+
+
+def settings_fingerprint() -> str:
+    """Параметры, от которых зависит результат обработки."""
+    return f'{SCHEMA_VERSION}:{WHITE_THRESHOLD}:{ALPHA_THRESHOLD}:{MIN_BORDER_WIDTH}'
+
+
+def encoding_key(encoder_preset: str, lossless_jpeg: bool) -> str:
+    """Параметры записи результата, от которых зависит содержимое обрезанной копии."""
+    return f'{encoder_preset}:{int(lossless_jpeg)}'
+
+
+class FileKey(NamedTuple):
+    path: str                # Абсолютный путь исходника
+    size: int
+    mtime_ns: int
+    digest: Optional[str]    # Хэш содержимого, если кэш проверяет содержимое
+
+
+class CacheEntry(NamedTuple):
+    result: ProcessResult
+    box: Optional[Box]
+
+
+class ResultCache:
+    """Индекс «исходный файл -> результат». Одну базу могут использовать несколько процессов."""
+
+    def __init__(self, db_path: Optional[str] = None, use_hash: bool = False, max_bytes: int = CACHE_MAX_BYTES):
+        self.db_path = db_path or default_cache_path()
+        self.use_hash = use_hash
+        self.max_bytes = max_bytes
+        self._stores = 0
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+
+        with self._transaction():
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            if row is None or row[0] != settings_fingerprint():
+                # Пороги или формат индекса изменились — прежние результаты недействительны
+                self._conn.execute('DROP TABLE IF EXISTS results')
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)",
+                    (settings_fingerprint(),)
+                )
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS results (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    digest TEXT,
+                    result TEXT NOT NULL,
+                    box_top INTEGER,
+                    box_bottom INTEGER,
+                    box_left INTEGER,
+                    box_right INTEGER,
+                    output_path TEXT,
+                    output_mtime_ns INTEGER,
+                    encoding TEXT NOT NULL,
+                    used_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)')
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def file_key(self, path: str) -> Optional[FileKey]:
+        """Снять «отпечаток» исходного файла; None — файл недоступен."""
+        try:
+            stat = os.stat(path)
+            digest = None
+            if self.use_hash:
+                hasher = hashlib.blake2b(digest_size=16)
+                with open(path, 'rb') as file:
+                    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+                        hasher.update(chunk)
+                digest = hasher.hexdigest()
+        except OSError:
+            return None
+        return FileKey(os.path.abspath(path), stat.st_size, stat.st_mtime_ns, digest)
+
+    def lookup(self, key: FileKey, output_path: str, encoding: str) -> Optional[CacheEntry]:
+        """Прошлый результат, если исходник не менялся, а копия на месте и записана с теми же параметрами."""
+        row = self._conn.execute(
+            'SELECT size, mtime_ns, digest, result, box_top, box_bottom, box_left, box_right, '
+            'output_path, output_mtime_ns, encoding FROM results WHERE path = ?',
+            (key.path,)
+        ).fetchone()
+        if row is None:
+            return None
+        size, mtime_ns, digest, result, top, bottom, left, right, cached_output, output_mtime_ns, cached_encoding = row
+        if (size, mtime_ns) != (key.size, key.mtime_ns):
+            return None
+        if key.digest is not None and digest != key.digest:
+            return None
+
+        result = ProcessResult(result)
+        if result == ProcessResult.SKIPPED:
+            # Пропущенный файл не записывается, и набор параметров кодера на него не влияет.
+            # Режим JPEG без потерь влияет: подгонка к блокам может заменить обрезку пропуском
+            if cached_encoding.rpartition(':')[2] != encoding.rpartition(':')[2]:
+                return None
+        elif cached_encoding != encoding:
+            return None
+        if result == ProcessResult.SUCCESS:
+            if os.path.abspath(output_path) != cached_output:
+                return None
+            try:
+                if os.stat(output_path).st_mtime_ns != output_mtime_ns:
+                    return None
+            except OSError:
+                # Обрезанную копию удалили — файл нужно обработать заново
+                return None
+
+        self._conn.execute('UPDATE results SET used_at = ? WHERE path = ?', (time.time(), key.path))
+        box = None if top is None else (top, bottom, left, right)
+        return CacheEntry(result, box)
+
+    def store(
+        self, key: FileKey, output_path: str, result: ProcessResult, box: Optional[Box], encoding: str
+    ) -> None:
+        """Запомнить результат обработки файла с параметрами записи encoding. Ошибки и отмены не запоминаются."""
+        if result in (ProcessResult.ERROR, ProcessResult.CANCELLED):
+            return
+        output_path = os.path.abspath(output_path)
+        output_mtime_ns = None
+        if result == ProcessResult.SUCCESS:
+            # Перезаписанный оригинал — уже другой файл; его проверит следующий запуск
+            if output_path == key.path:
+                return
+            try:
+                output_mtime_ns = os.stat(output_path).st_mtime_ns
+            except OSError:
+                return
+
+        top, bottom, left, right = box if box is not None else (None, None, None, None)
+        self._conn.execute(
+            'INSERT OR REPLACE INTO results (path, size, mtime_ns, digest, result, box_top, box_bottom, '
+            'box_left, box_right, output_path, output_mtime_ns, encoding, used_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (key.path, key.size, key.mtime_ns, key.digest, result.value, top, bottom, left, right,
+             output_path if result == ProcessResult.SUCCESS else None, output_mtime_ns, encoding, time.time())
+        )
+        self._stores += 1
+        if self._stores % EVICTION_CHECK_INTERVAL == 0:
+            self.evict()
+
+    def size_bytes(self) -> int:
+        """Занятый записями объём базы (без свободных страниц)."""
+        page_size = self._conn.execute('PRAGMA page_size').fetchone()[0]
+        page_count = self._conn.execute('PRAGMA page_count').fetchone()[0]
+        free_pages = self._conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return page_size * (page_count - free_pages)
+
+    def evict(self) -> None:
+        """Удалять давно не использованные записи, пока индекс больше max_bytes."""
+        while self.size_bytes() > self.max_bytes:
+            count = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            if count == 0:
+                return
+            self._conn.execute(
+                'DELETE FROM results WHERE path IN (SELECT path FROM results ORDER BY used_at LIMIT ?)',
+                (max(1, int(count * EVICTION_FRACTION)),)
+            )
+
+    def clear(self) -> None:
+        """Удалить все записи."""
+        self._conn.execute('DELETE FROM results')
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,263 @@
+"""Консольный пакетный режим StripeOff. Не импортирует Qt.
+
+Запуск: python -m stripeoff PATH [PATH ...] [--overwrite | --suffix SUFFIX] [--workers N]
+Наблюдение за папками: python -m stripeoff --watch FOLDER [FOLDER ...]
+HTTP-сервер: python -m stripeoff --serve [--host HOST] [--port PORT]
+Поиск рамок без обрезки и обрезка позже: python -m stripeoff PATH --detect-only boxes.jsonl,
+затем python -m stripeoff --apply boxes.jsonl
+"""
+
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from .batch import IO_THREADS, BatchProcessor, ProcessingOptions, Task, make_output_path
+from .cache import default_cache_path
+from .constants import CROPPED_SUFFIX, DEFAULT_ENCODER_PRESET, ENCODER_PRESETS, ProcessResult
+from .discovery import iter_images_from_paths
+from .manifest import ManifestWriter, current_thresholds, read_manifest
+from .profiling import Profiler
+from .server import DEFAULT_PORT, QUEUE_TIMEOUT, CropServer
+from .watch import POLL_INTERVAL, SETTLE_TIME, FolderWatcher
+
+RESULT_LABELS = {
+    ProcessResult.SUCCESS: 'cropped',
+    ProcessResult.SKIPPED: 'skipped',
+    ProcessResult.ERROR: 'error',
+    ProcessResult.CANCELLED: 'cancelled',
+}
+DETECT_LABELS = {
+    ProcessResult.SUCCESS: 'border',
+    ProcessResult.SKIPPED: 'none',
+    ProcessResult.ERROR: 'error',
+    ProcessResult.CANCELLED: 'cancelled',
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='stripeoff',
+        description='Remove white or transparent borders from images.',
+    )
+    parser.add_argument('paths', nargs='*', help='image files or folders (searched recursively)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--overwrite', action='store_true', help='replace originals with cropped versions')
+    mode.add_argument('--suffix', default=CROPPED_SUFFIX,
+                      help=f'suffix for cropped copies (default: {CROPPED_SUFFIX})')
+    parser.add_argument('-j', '--workers', type=int, default=0,
+                        help='number of worker processes (default: number of CPU cores)')
+    parser.add_argument('--memory-limit', type=int, default=0, metavar='MB',
+                        help='memory for images being processed at once; files wait until it is '
+                             'available (default: half of physical memory)')
+    parser.add_argument('--io-threads', type=int, default=IO_THREADS, metavar='N',
+                        help='threads that read upcoming files ahead and write results while worker '
+                             f'processes compute; 0 reads and writes in the workers (default: {IO_THREADS})')
+    parser.add_argument('--lossless-jpeg', action='store_true',
+                        help='crop JPEGs without re-encoding using jpegtran; the top-left corner '
+                             'is moved out to the 8/16-pixel block grid')
+    parser.add_argument('--no-dedup', action='store_true',
+                        help='process byte-identical files separately instead of cropping one copy '
+                             'and copying its result to the others')
+    parser.add_argument('--encoder-preset', choices=ENCODER_PRESETS, default=DEFAULT_ENCODER_PRESET,
+                        help='trade encoding time for output size: fastest, balanced (PNG level 3, '
+                             'optimized JPEG) or smallest (PNG level 9, progressive JPEG); '
+                             f'default: {DEFAULT_ENCODER_PRESET}')
+    cache = parser.add_argument_group('result cache')
+    cache.add_argument('--no-cache', action='store_true',
+                       help='always process files, ignoring results of previous runs')
+    cache.add_argument('--cache-file', default=None,
+                       help=f'result cache location (default: {default_cache_path()})')
+    cache.add_argument('--cache-hash', action='store_true',
+                       help='also compare file content hashes, not only size and mtime')
+    watch = parser.add_argument_group('watch mode')
+    watch.add_argument('--watch', action='store_true',
+                       help='keep running and process images as they appear in the given folders '
+                            '(existing images are processed first); stop with Ctrl+C')
+    watch.add_argument('--settle', type=float, default=SETTLE_TIME, metavar='SECONDS',
+                       help='a new file is processed once its size and modification time have not '
+                            f'changed for this long (default: {SETTLE_TIME})')
+    serve = parser.add_argument_group('HTTP server')
+    serve.add_argument('--serve', action='store_true',
+                       help='run a local HTTP server that crops images sent in request bodies '
+                            '(POST /crop, /detect, /batch; GET /metrics) instead of processing paths')
+    serve.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT,
+                       help=f'port to listen on, 0 picks a free one (default: {DEFAULT_PORT})')
+    serve.add_argument('--max-concurrency', type=int, default=0, metavar='N',
+                       help='images in the worker pool at once; further requests wait and get 503 '
+                            f'after {QUEUE_TIMEOUT:g} s (default: twice the number of workers)')
+    manifest = parser.add_argument_group('detect now, crop later')
+    manifest.add_argument('--detect-only', metavar='MANIFEST', default=None,
+                          help='only find borders and write path, box, result and thresholds of every file '
+                               'to MANIFEST (CSV if it ends with .csv, JSON Lines otherwise); nothing is '
+                               'encoded or written')
+    manifest.add_argument('--apply', metavar='MANIFEST', default=None,
+                          help='crop the files listed in a --detect-only MANIFEST to the recorded boxes, '
+                               'without searching again; files changed since detection are reported and '
+                               'left alone')
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                        help='record per-stage timings of every file to FILE (JSON Lines) '
+                             'and print a p50/p95 summary')
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.serve:
+        return serve(args)
+    if args.apply:
+        if args.paths or args.watch or args.detect_only:
+            parser.error('--apply takes the files from the manifest and cannot be combined with PATH, '
+                         '--watch or --detect-only')
+        try:
+            entries = list(read_manifest(args.apply))
+        except (OSError, ValueError) as error:
+            print(f'Cannot read the manifest: {error}', file=sys.stderr)
+            return 2
+    elif not args.paths:
+        parser.error('the following arguments are required: paths')
+    if args.watch:
+        missing = [path for path in args.paths if not os.path.isdir(path)]
+        if missing:
+            parser.error(f'--watch expects folders: {", ".join(missing)}')
+    counts = Counter()
+    # В режиме перезаписи результат ложится на место оригинала, а копии с суффиксом пропускаются
+    watcher = FolderWatcher(args.paths, args.settle, None if args.overwrite else args.suffix) if args.watch else None
+
+    def on_result(task: Task, result: ProcessResult) -> None:
+        counts[result] += 1
+        if args.detect_only:
+            print(f'{DETECT_LABELS[result]:<8} {task.path}', flush=True)
+            return
+        if watcher is not None and task.output_path == task.path:
+            watcher.mark_processed(task.path)
+        line = f'{RESULT_LABELS[result]:<8} {task.path}'
+        if result == ProcessResult.SUCCESS and task.output_path != task.path:
+            line += f' -> {task.output_path}'
+        print(line, flush=True)
+
+    options = ProcessingOptions(
+        cache_path=None if args.no_cache else (args.cache_file or default_cache_path()),
+        cache_hash=args.cache_hash,
+        lossless_jpeg=args.lossless_jpeg,
+        encoder_preset=args.encoder_preset,
+        detect_only=bool(args.detect_only),
+    )
+    profiler = Profiler(args.profile) if args.profile else None
+    manifest = ManifestWriter(args.detect_only) if args.detect_only else None
+    processor = BatchProcessor(
+        on_result, args.workers or None, options,
+        profiler=profiler, memory_limit=args.memory_limit * 1024 * 1024 or None, io_threads=args.io_threads,
+        warm_up=args.watch, dedup=not args.no_dedup, manifest=manifest,
+    )
+
+    def discover() -> None:
+        # Обход папок идёт параллельно с обработкой уже найденных файлов
+        try:
+            for index, path in enumerate(iter_images_from_paths(args.paths)):
+                processor.add_task(index, path, make_output_path(path, args.overwrite, args.suffix))
+        finally:
+            processor.close()
+
+    def apply() -> None:
+        # Обрезаются только файлы с найденной рамкой; изменённые после поиска не трогаются
+        try:
+            if any(entry.thresholds != current_thresholds() for entry in entries):
+                print('Warning: the manifest was made with other detection thresholds, '
+                      'its boxes are applied as recorded', file=sys.stderr, flush=True)
+            for index, entry in enumerate(entries):
+                if entry.result != ProcessResult.SUCCESS or entry.box is None:
+                    continue
+                if not entry.is_unchanged():
+                    counts['changed'] += 1
+                    print(f'{"changed":<8} {entry.path}', flush=True)
+                    continue
+                processor.add_task(
+                    index, entry.path, make_output_path(entry.path, args.overwrite, args.suffix), entry.box
+                )
+        finally:
+            processor.close()
+
+    def watch() -> None:
+        index = 0
+        while True:
+            for path in watcher.poll():
+                processor.add_task(index, path, make_output_path(path, args.overwrite, args.suffix))
+                index += 1
+            time.sleep(POLL_INTERVAL)
+
+    start = time.perf_counter()
+    if watcher is not None:
+        # Служба останавливается по SIGTERM так же, как по Ctrl+C
+        signal.signal(signal.SIGTERM, lambda signum, frame: processor.stop())
+        print(f'Watching {len(args.paths)} folder(s), press Ctrl+C to stop', file=sys.stderr, flush=True)
+    feed = watch if watcher is not None else apply if args.apply else discover
+    threading.Thread(target=feed, daemon=True).start()
+    try:
+        processor.run()
+    except KeyboardInterrupt:
+        # Наблюдение останавливается только так: итоги всё равно нужны
+        if watcher is None:
+            print('Interrupted', file=sys.stderr)
+            return 130
+    finally:
+        if profiler is not None:
+            profiler.close()
+        if manifest is not None:
+            manifest.close()
+    elapsed = time.perf_counter() - start
+
+    total = sum(counts.values())
+    if not total and args.apply:
+        print('No boxes to apply in the manifest', file=sys.stderr)
+        return 0
+    if not total and watcher is None:
+        print('No images found', file=sys.stderr)
+        return 1
+    if args.detect_only:
+        print(
+            f'{total} files in {elapsed:.1f} s: '
+            f'{counts[ProcessResult.SUCCESS]} with borders, '
+            f'{counts[ProcessResult.SKIPPED]} without, '
+            f'{counts[ProcessResult.ERROR]} errors; manifest: {args.detect_only}'
+        )
+    else:
+        print(
+            f'{total} files in {elapsed:.1f} s: '
+            f'{counts[ProcessResult.SUCCESS]} cropped, '
+            f'{counts[ProcessResult.SKIPPED]} skipped, '
+            f'{counts[ProcessResult.ERROR]} errors'
+            + (f', {counts["changed"]} changed since detection' if counts['changed'] else '')
+        )
+    if processor.duplicates:
+        print(f'{processor.duplicates} duplicates reused the result of an identical file '
+              f'({processor.duplicate_bytes / 2 ** 20:.1f} MB not decoded)')
+    if profiler is not None:
+        print(profiler.format_summary())
+    return 1 if counts[ProcessResult.ERROR] or counts['changed'] else 0
+
+
+def serve(args: argparse.Namespace) -> int:
+    """Обслуживать HTTP-запросы до Ctrl+C или SIGTERM."""
+    server = CropServer(
+        (args.host, args.port), args.workers or None, args.max_concurrency or None,
+        lossless_jpeg=args.lossless_jpeg, encoder_preset=args.encoder_preset,
+    )
+    # serve_forever() ждёт в основном потоке, поэтому останавливается из другого
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    host, port = server.server_address[:2]
+    print(f'Serving on http://{host}:{port} with {server.workers} worker(s), press Ctrl+C to stop',
+          file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
@@ -0,0 +1,30 @@
+"""Общие константы и типы StripeOff. Модуль не зависит ни от OpenCV, ни от Qt."""
+
+from enum import Enum
+
+
+class ProcessResult(Enum):
+    SUCCESS = "success"   # Обрезано и сохранено
+    SKIPPED = "skipped"   # Белых рамок нет
+    ERROR = "error"       # Ошибка обработки
+    CANCELLED = "cancelled"   # Отменено до или во время обработки; файл не записан
+
+
+# Границы содержимого: (top, bottom, left, right), bottom и right — не включительно
+Box = tuple[int, int, int, int]
+
+
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+CROPPED_SUFFIX = '_cropped'  # Суффикс копий, когда оригиналы не перезаписываются
+WHITE_THRESHOLD = 250  # Пиксель считается белым если все каналы >= 250
+ALPHA_THRESHOLD = 5    # Пиксель считается прозрачным если alpha <= 5
+MIN_BORDER_WIDTH = 5   # Минимальная ширина рамки для обрезки (в пикселях)
+SCAN_BLOCK = 8         # Начальная толщина полосы при сканировании от края
+SCAN_BLOCK_MAX = 256   # Толщина полосы растёт вдвое до этого предела
+PREVIEW_MARGIN = 16    # Запас яркости, с которым пиксель превью JPEG считается непустым
+STRIPWISE_MIN_BYTES = 1024 ** 3   # BMP и PNG от 1 ГБ в декодированном виде обрабатываются полосами
+STRIPWISE_EXTENSIONS = ('.png', '.bmp')
+
+# Наборы параметров кодера: от быстрой записи до наименьших файлов (см. core.ENCODE_PARAMS)
+ENCODER_PRESETS = ('fastest', 'balanced', 'smallest')
+DEFAULT_ENCODER_PRESET = 'fastest'   # Параметры OpenCV по умолчанию
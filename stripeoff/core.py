@@ -0,0 +1,647 @@
+"""Поиск и обрезка пустых (белых или прозрачных) полей изображения."""
+
+import os
+import time
+from typing import TYPE_CHECKING, Callable, NamedTuple, Optional, Union
+
+import cv2
+import numpy as np
+
+from .cache import encoding_key
+from .constants import (
+    ALPHA_THRESHOLD, DEFAULT_ENCODER_PRESET, ENCODER_PRESETS, MIN_BORDER_WIDTH, PREVIEW_MARGIN,
+    SCAN_BLOCK, SCAN_BLOCK_MAX, STRIPWISE_MIN_BYTES, SUPPORTED_EXTENSIONS, WHITE_THRESHOLD, Box, ProcessResult
+)
+from .headers import guess_extension
+from .jpeg import JPEG_EXTENSIONS, crop_jpeg_lossless, find_jpegtran, read_jpeg_info, snap_box_to_mcu
+from .profiling import FileProfile, stage_timer
+from .strips import StripReader, open_strip_reader
+
+if TYPE_CHECKING:
+    from .cache import ResultCache
+
+# Режимы уменьшенного декодирования JPEG: (масштаб, флаги cv2.imdecode)
+PREVIEW_MODES = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8 | cv2.IMREAD_IGNORE_ORIENTATION),
+    (4, cv2.IMREAD_REDUCED_COLOR_4 | cv2.IMREAD_IGNORE_ORIENTATION),
+    (2, cv2.IMREAD_REDUCED_COLOR_2 | cv2.IMREAD_IGNORE_ORIENTATION),
+)
+
+class CropResult(NamedTuple):
+    """Результат обработки изображения в памяти."""
+    result: ProcessResult
+    box: Optional[Box]                     # Границы содержимого; None — не искались или изображение пустое
+    image: Optional[np.ndarray] = None     # Обрезанное изображение: срез исходного массива, без копирования
+    encoded: Optional[memoryview] = None   # Закодированный результат (при SUCCESS)
+
+
+# Параметры cv2.imencode для наборов ENCODER_PRESETS; формата нет в наборе — параметры по умолчанию.
+# PNG по умолчанию сжимается быстрее всего (уровень 1 с RLE), JPEG — с качеством 95 без оптимизации.
+# WebP в OpenCV всегда без потерь, а усилие сжатия без потерь не настраивается, поэтому его нет.
+ENCODE_PARAMS = {
+    'fastest': {},
+    'balanced': {
+        '.png': [cv2.IMWRITE_PNG_COMPRESSION, 3],
+        '.jpg': [cv2.IMWRITE_JPEG_OPTIMIZE, 1],
+    },
+    'smallest': {
+        '.png': [cv2.IMWRITE_PNG_COMPRESSION, 9],
+        '.jpg': [cv2.IMWRITE_JPEG_OPTIMIZE, 1, cv2.IMWRITE_JPEG_PROGRESSIVE, 1],
+    },
+}
+
+
+def _build_empty_mask(image: np.ndarray) -> np.ndarray:
+    """Вернуть 2D-маску, где True — пиксель «пустой» (прозрачный или белый)."""
+    if image.ndim == 3 and image.shape[2] == 4:
+        alpha = image[:, :, 3]
+        bgr = image[:, :, :3]
+        return (alpha <= ALPHA_THRESHOLD) | np.all(bgr >= WHITE_THRESHOLD, axis=2)
+    if image.ndim == 3:
+        return np.all(image >= WHITE_THRESHOLD, axis=2)
+    return image >= WHITE_THRESHOLD
+
+
+def _find_edge(image: np.ndarray, from_end: bool = False) -> int:
+    """Индекс первой непустой строки, считая от начала (или конца) оси 0; -1 — все строки пустые.
+
+    Строки проверяются полосами растущей толщины, поэтому стоимость
+    пропорциональна ширине рамки, а не площади изображения.
+    """
+    n = image.shape[0]
+    scanned = 0
+    block = SCAN_BLOCK
+    while scanned < n:
+        size = min(block, n - scanned)
+        start = n - scanned - size if from_end else scanned
+        rows_empty = np.all(_build_empty_mask(image[start:start + size]), axis=1)
+        non_empty = np.flatnonzero(~rows_empty)
+        if non_empty.size:
+            return start + int(non_empty[-1] if from_end else non_empty[0])
+        scanned += size
+        block = min(block * 2, SCAN_BLOCK_MAX)
+    return -1
+
+
+def _find_content_box(image: np.ndarray) -> Optional[Box]:
+    """Найти границы содержимого (top, bottom, left, right); None — изображение пустое."""
+    top = _find_edge(image)
+    if top < 0:
+        return None
+    bottom = _find_edge(image[top:], from_end=True) + top + 1
+
+    # Строки вне [top, bottom) пустые, поэтому столбцы достаточно искать внутри них
+    columns = image[top:bottom].swapaxes(0, 1)
+    left = _find_edge(columns)
+    right = _find_edge(columns[left:], from_end=True) + left + 1
+    return top, bottom, left, right
+
+
+def _find_content_box_in_strips(reader: StripReader) -> Optional[Box]:
+    """То же, что _find_content_box, но по полосам: рамка каждой полосы ищется от её краёв.
+
+    Верх берётся у первой полосы с содержимым, низ — у последней, левая
+    и правая границы — крайние среди полос.
+    """
+    top = bottom = left = right = -1
+    for start, strip in reader.iter_strips():
+        box = _find_content_box(strip)
+        if box is None:
+            continue
+        strip_top, strip_bottom, strip_left, strip_right = box
+        if top < 0:
+            top, left, right = start + strip_top, strip_left, strip_right
+        bottom = start + strip_bottom
+        left, right = min(left, strip_left), max(right, strip_right)
+    if top < 0:
+        return None
+    return top, bottom, left, right
+
+
+def _read_box_from_strips(reader: StripReader, box: Box) -> np.ndarray:
+    """Собрать из полос только область рамки: память пропорциональна результату."""
+    top, bottom, left, right = box
+    shape = (bottom - top, right - left) + ((reader.channels,) if reader.channels > 1 else ())
+    cropped = np.empty(shape, dtype=reader.dtype)
+    for start, strip in reader.iter_strips(stop_row=bottom):
+        first, last = max(start, top), min(start + len(strip), bottom)
+        if first < last:
+            cropped[first - top:last - top] = strip[first - start:last - start, left:right]
+    return cropped
+
+
+def _has_significant_border(box: Box, height: int, width: int) -> bool:
+    top, bottom, left, right = box
+    return (
+        top >= MIN_BORDER_WIDTH or
+        (height - bottom) >= MIN_BORDER_WIDTH or
+        left >= MIN_BORDER_WIDTH or
+        (width - right) >= MIN_BORDER_WIDTH
+    )
+
+
+def _preview_rules_out_border(data: np.ndarray) -> bool:
+    """По уменьшенному превью JPEG проверить, что рамки шириной от MIN_BORDER_WIDTH нет.
+
+    Пиксель превью в масштабе 1:scale — среднее блока scale×scale оригинала.
+    Если он темнее порога с запасом PREVIEW_MARGIN, в блоке есть непустой
+    пиксель. Содержимое в крайних строках и столбцах превью ограничивает
+    рамку scale - 1 пикселями, поэтому масштаб не крупнее MIN_BORDER_WIDTH.
+    При малейшем сомнении возвращается False и выполняется полное декодирование.
+    """
+    if data[:2].tobytes() != b'\xff\xd8':
+        return False
+    mode = next((mode for scale, mode in PREVIEW_MODES if scale <= MIN_BORDER_WIDTH), None)
+    if mode is None:
+        return False
+    preview = cv2.imdecode(data, mode)
+    if preview is None:
+        return False
+    content = np.any(preview < WHITE_THRESHOLD - PREVIEW_MARGIN, axis=2)
+    return bool(
+        content[0].any() and content[-1].any() and
+        content[:, 0].any() and content[:, -1].any()
+    )
+
+
+def _crop_jpeg_lossless(
+    data: np.ndarray, box: Box, shape: tuple[int, ...]
+) -> Optional[tuple[Optional[bytes], Box]]:
+    """Обрезать JPEG без перекодирования; вернуть байты файла и фактическую рамку.
+
+    Байты None — после выравнивания по MCU обрезать нечего. None — так обрезать
+    нельзя: заголовок не поддерживается, jpegtran недоступен или не справился.
+    """
+    raw = data.tobytes()
+    info = read_jpeg_info(raw)
+    if info is None or (info.height, info.width) != shape[:2] or find_jpegtran() is None:
+        return None
+    snapped = snap_box_to_mcu(box, info)
+    if snapped == (0, info.height, 0, info.width):
+        return None, snapped
+    encoded = crop_jpeg_lossless(raw, snapped)
+    if encoded is None:
+        return None
+    return encoded, snapped
+
+
+def _encode_params(ext: str, preset: str) -> list[int]:
+    ext = ext.lower()
+    return ENCODE_PARAMS[preset].get('.jpg' if ext in JPEG_EXTENSIONS else ext, [])
+
+
+def _check_preset(preset: str) -> None:
+    if preset not in ENCODER_PRESETS:
+        raise ValueError(f'unknown encoder preset {preset!r}, expected one of {ENCODER_PRESETS}')
+
+
+def _encode_cropped(
+    cropped: np.ndarray, ext: str, preset: str, profile: Optional[FileProfile]
+) -> Optional[np.ndarray]:
+    """Закодировать обрезанное изображение в формат ext; None — кодер не справился."""
+    with stage_timer(profile)('encode'):
+        is_success, im_buf = cv2.imencode(ext, cropped, _encode_params(ext, preset))
+    if not is_success:
+        if profile is not None:
+            profile.error = 'EncodeFailed'
+        return None
+    if profile is not None:
+        profile.output_bytes = im_buf.size
+    return im_buf
+
+
+def _detect(image: np.ndarray, profile: Optional[FileProfile]) -> tuple[ProcessResult, Optional[Box]]:
+    """Найти рамку; SUCCESS — есть что обрезать, SKIPPED — рамки нет или изображение пустое."""
+    with stage_timer(profile)('detect'):
+        box = _find_content_box(image)
+    if profile is not None:
+        profile.box = box
+    if box is None or not _has_significant_border(box, image.shape[0], image.shape[1]):
+        return ProcessResult.SKIPPED, box
+    return ProcessResult.SUCCESS, box
+
+
+def _is_cancelled(cancelled: Optional[Callable[[], bool]]) -> bool:
+    return cancelled is not None and cancelled()
+
+
+def _encode_box(
+    data: np.ndarray, image: np.ndarray, ext: str, box: Box, lossless_jpeg: bool, preset: str,
+    profile: Optional[FileProfile],
+) -> tuple[ProcessResult, Box, Optional[Union[np.ndarray, bytes]]]:
+    """Закодировать область box декодированного изображения (JPEG — по возможности без перекодирования)."""
+    if lossless_jpeg and ext.lower() in JPEG_EXTENSIONS:
+        with stage_timer(profile)('encode'):
+            lossless = _crop_jpeg_lossless(data, box, image.shape)
+        if lossless is not None:
+            if lossless[0] is None:
+                # Остаток рамки уже меньше блока MCU (например, файл обрезан прошлым запуском):
+                # перекодирование ради него только ухудшило бы качество
+                return ProcessResult.SKIPPED, box, None
+            encoded, box = lossless
+            if profile is not None:
+                profile.box, profile.output_bytes = box, len(encoded)
+            return ProcessResult.SUCCESS, box, encoded
+
+    top, bottom, left, right = box
+    encoded = _encode_cropped(image[top:bottom, left:right], ext, preset, profile)
+    return (ProcessResult.SUCCESS if encoded is not None else ProcessResult.ERROR), box, encoded
+
+
+def _encode_box_from_strips(
+    reader: StripReader, ext: str, box: Box, preset: str, profile: Optional[FileProfile]
+) -> tuple[ProcessResult, Box, Optional[np.ndarray]]:
+    """Собрать из полос область box и закодировать её."""
+    with stage_timer(profile)('decode'):
+        cropped = _read_box_from_strips(reader, box)
+    encoded = _encode_cropped(cropped, ext, preset, profile)
+    return (ProcessResult.SUCCESS if encoded is not None else ProcessResult.ERROR), box, encoded
+
+
+def _crop_stripwise(
+    reader: StripReader, image_path: str, ext: str, preset: str, profile: Optional[FileProfile],
+    encode: bool = True, cancelled: Optional[Callable[[], bool]] = None,
+) -> tuple[ProcessResult, Optional[Box], Optional[np.ndarray]]:
+    """Обработать большое изображение полосами, не декодируя его целиком.
+
+    Первый проход ищет рамку (этап detect), второй собирает строки внутри
+    рамки (этап decode). В памяти одновременно только полоса и результат.
+    """
+    if profile is not None:
+        profile.input_bytes = os.path.getsize(image_path)
+        profile.height, profile.width, profile.channels = reader.height, reader.width, reader.channels
+    with stage_timer(profile)('detect'):
+        box = _find_content_box_in_strips(reader)
+    if profile is not None:
+        profile.box = box
+    if box is None:
+        return ProcessResult.SKIPPED, None, None
+    if not _has_significant_border(box, reader.height, reader.width):
+        return ProcessResult.SKIPPED, box, None
+    if not encode:
+        return ProcessResult.SUCCESS, box, None
+    if _is_cancelled(cancelled):
+        return ProcessResult.CANCELLED, box, None
+    return _encode_box_from_strips(reader, ext, box, preset, profile)
+
+
+def _crop_data(
+    data: np.ndarray, ext: str, fast_preview: bool, lossless_jpeg: bool, preset: str,
+    profile: Optional[FileProfile], encode: bool = True, cancelled: Optional[Callable[[], bool]] = None,
+) -> tuple[ProcessResult, Optional[Box], Optional[Union[np.ndarray, bytes]]]:
+    """Обработать содержимое файла в памяти; вернуть результат, границы и закодированный результат.
+
+    encode=False — только найти рамку, не кодируя результат. cancelled проверяется
+    между этапами: если она вернула True, обработка прекращается с CANCELLED.
+    """
+    stage = stage_timer(profile)
+    if profile is not None:
+        profile.input_bytes = data.size
+    if fast_preview and data[:2].tobytes() == b'\xff\xd8':
+        with stage('preview'):
+            ruled_out = _preview_rules_out_border(data)
+        if ruled_out:
+            return ProcessResult.SKIPPED, None, None
+    if _is_cancelled(cancelled):
+        return ProcessResult.CANCELLED, None, None
+
+    with stage('decode'):
+        # На пустых данных imdecode не возвращает None, а бросает cv2.error
+        image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED) if data.size else None
+    if image is None:
+        if profile is not None:
+            profile.error = 'DecodeFailed'
+        return ProcessResult.ERROR, None, None
+
+    if profile is not None:
+        profile.height, profile.width = image.shape[:2]
+        profile.channels = image.shape[2] if image.ndim == 3 else 1
+    if _is_cancelled(cancelled):
+        return ProcessResult.CANCELLED, None, None
+    result, box = _detect(image, profile)
+    if result == ProcessResult.SKIPPED or not encode:
+        return result, box, None
+    if _is_cancelled(cancelled):
+        return ProcessResult.CANCELLED, box, None
+    return _encode_box(data, image, ext, box, lossless_jpeg, preset, profile)
+
+
+def _as_encoded(data: Union[bytes, bytearray, memoryview, np.ndarray]) -> np.ndarray:
+    """Закодированные данные как одномерный массив uint8 поверх того же буфера."""
+    if isinstance(data, np.ndarray):
+        if data.ndim != 1 or data.dtype != np.uint8:
+            raise ValueError('encoded data must be a one-dimensional uint8 array')
+        return data
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+def _check_ext(ext: str) -> str:
+    """Привести формат результата к виду '.png'; ValueError — формат не поддерживается."""
+    normalized = ext.lower() if ext.startswith('.') else f'.{ext.lower()}'
+    if normalized not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f'unsupported output format {ext!r}, expected one of {SUPPORTED_EXTENSIONS}')
+    return normalized
+
+
+def _guess_ext(data: np.ndarray) -> str:
+    ext = guess_extension(data[:12].tobytes())
+    if ext is None:
+        raise ValueError('cannot tell the image format from the data, pass ext')
+    return ext
+
+
+def crop_bytes(
+    data: Union[bytes, bytearray, memoryview, np.ndarray],
+    ext: Optional[str] = None,
+    fast_preview: bool = True,
+    lossless_jpeg: bool = False,
+    encoder_preset: str = DEFAULT_ENCODER_PRESET,
+    encode: bool = True,
+    profile: Optional[FileProfile] = None,
+) -> CropResult:
+    """Обрезать закодированное изображение в памяти, без временных файлов.
+
+    data — содержимое файла: bytes, bytearray, memoryview или одномерный массив
+    uint8 (как у cv2.imencode); данные не копируются. ext — формат результата
+    из SUPPORTED_EXTENSIONS ('.png', 'jpg', ...), по умолчанию — формат исходных
+    данных; неподдерживаемый формат — ValueError. encode=False — только найти
+    рамку. Остальные параметры — как у remove_borders.
+    При SUCCESS в encoded — закодированный результат; ERROR — данные не декодируются.
+    """
+    _check_preset(encoder_preset)
+    data = _as_encoded(data)
+    ext = _check_ext(ext) if ext else _guess_ext(data)
+    start = time.perf_counter()
+    result, box, encoded = _crop_data(data, ext, fast_preview, lossless_jpeg, encoder_preset, profile, encode)
+    if profile is not None:
+        profile.result = result.value
+        profile.total = time.perf_counter() - start
+    return CropResult(result, box, encoded=memoryview(encoded) if encoded is not None else None)
+
+
+def crop_array(
+    image: np.ndarray,
+    ext: Optional[str] = None,
+    encoder_preset: str = DEFAULT_ENCODER_PRESET,
+    profile: Optional[FileProfile] = None,
+) -> CropResult:
+    """Обрезать декодированное изображение (как из cv2.imdecode): BGR, BGRA или серое.
+
+    При SUCCESS в image — срез исходного массива без копирования, а если задан
+    ext, в encoded — результат, закодированный в этот формат.
+    """
+    if image.ndim not in (2, 3):
+        raise ValueError('image must be a two- or three-dimensional array')
+    _check_preset(encoder_preset)
+    if ext:
+        ext = _check_ext(ext)
+    start = time.perf_counter()
+    if profile is not None:
+        profile.height, profile.width = image.shape[:2]
+        profile.channels = image.shape[2] if image.ndim == 3 else 1
+    result, box = _detect(image, profile)
+    cropped = encoded = None
+    if result == ProcessResult.SUCCESS:
+        top, bottom, left, right = box
+        cropped = image[top:bottom, left:right]
+        if ext:
+            encoded = _encode_cropped(cropped, ext, encoder_preset, profile)
+            if encoded is None:
+                result = ProcessResult.ERROR
+            else:
+                encoded = memoryview(encoded)
+    if profile is not None:
+        profile.result = result.value
+        profile.total = time.perf_counter() - start
+    return CropResult(result, box, cropped, encoded)
+
+
+def _read_file(
+    image_path: str, content: Optional[bytes], profile: Optional[FileProfile]
+) -> Union[StripReader, np.ndarray]:
+    """Содержимое файла как массив байт или читатель полос для огромных BMP и PNG.
+
+    content — уже прочитанное содержимое файла: тогда файл не читается снова.
+    """
+    if content is not None:
+        return np.frombuffer(content, dtype=np.uint8)
+    # Огромные BMP и PNG читаются полосами: целиком они могут не поместиться в память
+    reader = open_strip_reader(image_path, STRIPWISE_MIN_BYTES)
+    if reader is not None:
+        return reader
+    with stage_timer(profile)('read'):
+        return np.fromfile(image_path, dtype=np.uint8)
+
+
+def _crop_to_buffer(
+    image_path: str, output_path: str, fast_preview: bool, lossless_jpeg: bool,
+    preset: str = DEFAULT_ENCODER_PRESET, profile: Optional[FileProfile] = None, encode: bool = True,
+    cancelled: Optional[Callable[[], bool]] = None, content: Optional[bytes] = None,
+) -> tuple[ProcessResult, Optional[Box], Optional[Union[np.ndarray, bytes]]]:
+    """Обработать файл, не записывая результат; закодированный результат возвращается.
+
+    encode=False — только найти рамку. cancelled — как у _crop_data.
+    content — уже прочитанное содержимое файла (не больше STRIPWISE_MIN_BYTES в декодированном виде).
+    """
+    if _is_cancelled(cancelled):
+        return ProcessResult.CANCELLED, None, None
+    try:
+        ext = os.path.splitext(output_path)[1]
+        data = _read_file(image_path, content, profile)
+        if isinstance(data, StripReader):
+            return _crop_stripwise(data, image_path, ext, preset, profile, encode, cancelled)
+        return _crop_data(data, ext, fast_preview, lossless_jpeg, preset, profile, encode, cancelled)
+    except Exception as error:
+        if profile is not None:
+            profile.set_error(error)
+        return ProcessResult.ERROR, None, None
+
+
+def _box_error(box: Box, height: int, width: int, profile: Optional[FileProfile]) -> Optional[ProcessResult]:
+    """Проверить заданную рамку: ERROR — она выходит за изображение, SKIPPED — обрезать нечего."""
+    top, bottom, left, right = box
+    if not (0 <= top < bottom <= height and 0 <= left < right <= width):
+        if profile is not None:
+            profile.error = 'BoxOutOfBounds'
+        return ProcessResult.ERROR
+    if box == (0, height, 0, width):
+        return ProcessResult.SKIPPED
+    return None
+
+
+def _crop_box_to_buffer(
+    image_path: str, output_path: str, box: Box, lossless_jpeg: bool,
+    preset: str = DEFAULT_ENCODER_PRESET, profile: Optional[FileProfile] = None,
+    cancelled: Optional[Callable[[], bool]] = None, content: Optional[bytes] = None,
+) -> tuple[ProcessResult, Optional[Box], Optional[Union[np.ndarray, bytes]]]:
+    """Обрезать файл по заданной рамке без поиска; закодированный результат возвращается.
+
+    content — как у _crop_to_buffer.
+    """
+    box = tuple(box)
+    if profile is not None:
+        profile.box = box
+    if _is_cancelled(cancelled):
+        return ProcessResult.CANCELLED, box, None
+    try:
+        ext = os.path.splitext(output_path)[1]
+        data = _read_file(image_path, content, profile)
+        if isinstance(data, StripReader):
+            reader = data
+            if profile is not None:
+                profile.input_bytes = os.path.getsize(image_path)
+                profile.height, profile.width, profile.channels = reader.height, reader.width, reader.channels
+            rejected = _box_error(box, reader.height, reader.width, profile)
+            if rejected is not None:
+                return rejected, box, None
+            if _is_cancelled(cancelled):
+                return ProcessResult.CANCELLED, box, None
+            return _encode_box_from_strips(reader, ext, box, preset, profile)
+
+        stage = stage_timer(profile)
+        if profile is not None:
+            profile.input_bytes = data.size
+        if _is_cancelled(cancelled):
+            return ProcessResult.CANCELLED, box, None
+        with stage('decode'):
+            image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            if profile is not None:
+                profile.error = 'DecodeFailed'
+            return ProcessResult.ERROR, box, None
+        if profile is not None:
+            profile.height, profile.width = image.shape[:2]
+            profile.channels = image.shape[2] if image.ndim == 3 else 1
+        rejected = _box_error(box, image.shape[0], image.shape[1], profile)
+        if rejected is not None:
+            return rejected, box, None
+        if _is_cancelled(cancelled):
+            return ProcessResult.CANCELLED, box, None
+        return _encode_box(data, image, ext, box, lossless_jpeg, preset, profile)
+    except Exception as error:
+        if profile is not None:
+            profile.set_error(error)
+        return ProcessResult.ERROR, box, None
+
+
+def _crop_file(
+    image_path: str, output_path: str, fast_preview: bool, lossless_jpeg: bool,
+    preset: str = DEFAULT_ENCODER_PRESET, profile: Optional[FileProfile] = None,
+) -> tuple[ProcessResult, Optional[Box]]:
+    """Обработать файл; вернуть результат и найденные границы содержимого (если искались)."""
+    result, box, encoded = _crop_to_buffer(image_path, output_path, fast_preview, lossless_jpeg, preset, profile)
+    if encoded is None:
+        return result, box
+    return _write_result(output_path, encoded, result, box, profile)
+
+
+def _write_result(
+    output_path: str, encoded: Union[np.ndarray, bytes], result: ProcessResult, box: Optional[Box],
+    profile: Optional[FileProfile] = None,
+) -> tuple[ProcessResult, Optional[Box]]:
+    """Записать закодированный результат; при ошибке записи результат — ERROR."""
+    try:
+        with stage_timer(profile)('write'):
+            with open(output_path, 'wb') as file:
+                file.write(encoded)
+    except OSError as error:
+        if profile is not None:
+            profile.set_error(error)
+        return ProcessResult.ERROR, box
+    return result, box
+
+
+def remove_borders(
+    image_path: str,
+    output_path: str,
+    fast_preview: bool = True,
+    cache: Optional['ResultCache'] = None,
+    lossless_jpeg: bool = False,
+    profile: Optional[FileProfile] = None,
+    encoder_preset: str = DEFAULT_ENCODER_PRESET,
+) -> ProcessResult:
+    """Удаляет пустые (прозрачные или белые) границы с изображения.
+
+    fast_preview — для JPEG сначала проверить уменьшенное превью и не
+    декодировать файл целиком, если рамки заведомо нет. Результат не меняется.
+    cache — индекс прошлых запусков: неизменённый файл не декодируется повторно.
+    lossless_jpeg — JPEG обрезать без перекодирования (нужен jpegtran), выравнивая
+    левую и верхнюю границы по MCU; иначе обычное перекодирование.
+    profile — заполнить замерами этапов, размерами и причиной ошибки.
+    encoder_preset — набор параметров кодера из ENCODER_PRESETS: 'fastest' пишет
+    быстрее всего, 'smallest' даёт наименьшие файлы PNG и JPEG ценой времени.
+    """
+    _check_preset(encoder_preset)
+    start = time.perf_counter()
+    result = _remove_borders(image_path, output_path, fast_preview, cache, lossless_jpeg, encoder_preset, profile)
+    if profile is not None:
+        profile.result = result.value
+        profile.total = time.perf_counter() - start
+    return result
+
+
+def detect_borders(
+    image_path: str, fast_preview: bool = True, profile: Optional[FileProfile] = None
+) -> CropResult:
+    """Найти рамку изображения, ничего не кодируя и не записывая.
+
+    SUCCESS — есть что обрезать, в box границы содержимого; SKIPPED — рамки нет
+    (box — None, если её исключило превью JPEG или изображение пустое);
+    ERROR — файл не читается или не декодируется.
+    """
+    start = time.perf_counter()
+    result, box, _ = _crop_to_buffer(image_path, image_path, fast_preview, False, profile=profile, encode=False)
+    if profile is not None:
+        profile.result = result.value
+        profile.total = time.perf_counter() - start
+    return CropResult(result, box)
+
+
+def crop_to_box(
+    image_path: str,
+    output_path: str,
+    box: Box,
+    lossless_jpeg: bool = False,
+    profile: Optional[FileProfile] = None,
+    encoder_preset: str = DEFAULT_ENCODER_PRESET,
+) -> ProcessResult:
+    """Обрезать изображение по заранее найденной рамке (например, из detect_borders).
+
+    box — (top, bottom, left, right). ERROR — рамка выходит за изображение или
+    файл не обработан; SKIPPED — рамка совпадает с изображением, файл не записывается.
+    """
+    _check_preset(encoder_preset)
+    start = time.perf_counter()
+    result, box, encoded = _crop_box_to_buffer(image_path, output_path, box, lossless_jpeg, encoder_preset, profile)
+    if encoded is not None:
+        result, box = _write_result(output_path, encoded, result, box, profile)
+    if profile is not None:
+        profile.result = result.value
+        profile.total = time.perf_counter() - start
+    return result
+
+
+def _remove_borders(
+    image_path: str,
+    output_path: str,
+    fast_preview: bool,
+    cache: Optional['ResultCache'],
+    lossless_jpeg: bool,
+    encoder_preset: str,
+    profile: Optional[FileProfile],
+) -> ProcessResult:
+    if cache is None:
+        return _crop_file(image_path, output_path, fast_preview, lossless_jpeg, encoder_preset, profile)[0]
+
+    encoding = encoding_key(encoder_preset, lossless_jpeg)
+    with stage_timer(profile)('cache'):
+        key = cache.file_key(image_path)
+        cached = cache.lookup(key, output_path, encoding) if key is not None else None
+    if cached is not None:
+        if profile is not None:
+            profile.cached, profile.box = True, cached.box
+        return cached.result
+    result, box = _crop_file(image_path, output_path, fast_preview, lossless_jpeg, encoder_preset, profile)
+    if key is not None:
+        cache.store(key, output_path, result, box, encoding)
+    return result
@@ -0,0 +1,55 @@
+"""Поиск изображений среди перетащенных или переданных путей."""
+
+import os
+from typing import Callable, Iterable, Iterator, Optional
+
+from .constants import SUPPORTED_EXTENSIONS
+
+
+def _iter_directory(root: str, stopped: Optional[Callable[[], bool]] = None) -> Iterator[str]:
+    """Рекурсивно перечислить изображения папки через os.scandir, не строя список целиком."""
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    # В больших деревьях с редкими изображениями обход долго ничего не выдаёт
+                    if stopped is not None and stopped():
+                        return
+                    try:
+                        # Как os.walk: по ссылкам на папки не спускаемся
+                        if entry.is_dir():
+                            if not entry.is_symlink():
+                                subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(SUPPORTED_EXTENSIONS):
+                            yield entry.path
+                    except OSError:
+                        continue
+        except OSError:
+            # Недоступная папка пропускается, как в os.walk
+            continue
+        # Обратный порядок в стеке сохраняет порядок обхода os.walk
+        pending.extend(reversed(subdirs))
+
+
+def iter_images_from_paths(
+    paths: Iterable[str], stopped: Optional[Callable[[], bool]] = None
+) -> Iterator[str]:
+    """Перечислять изображения из списка путей (файлы и папки) по мере обнаружения.
+
+    stopped — проверяется на каждой записи папки: как только вернёт True, обход прекращается.
+    """
+    for path in paths:
+        if stopped is not None and stopped():
+            return
+        if os.path.isdir(path):
+            yield from _iter_directory(path, stopped)
+        elif path.lower().endswith(SUPPORTED_EXTENSIONS):
+            yield path
+
+
+def collect_images_from_paths(paths: list[str]) -> list[str]:
+    """Собрать все изображения из списка путей (файлы и папки)."""
+    return list(iter_images_from_paths(paths))
@@ -0,0 +1,146 @@
+"""Размеры изображения по заголовку файла, без декодирования.
+
+Нужны, чтобы заранее оценить память на обработку файла. Поддерживаются
+PNG, JPEG, BMP и WebP; модуль не зависит ни от OpenCV, ни от Qt.
+"""
+
+import os
+import struct
+from typing import BinaryIO, NamedTuple, Optional
+
+from .constants import STRIPWISE_EXTENSIONS, STRIPWISE_MIN_BYTES
+
+HEADER_SIZE = 64   # Байт, которых хватает для заголовков PNG, BMP и WebP
+
+# Пик памяти на обработку в долях декодированного изображения (замерено на OpenCV 5,
+# с запасом ~5%): декодер держит временную копию, а кодер WebP без потерь — ещё несколько
+MEMORY_FACTORS = {'.png': 2.1, '.jpg': 2.2, '.jpeg': 2.2, '.bmp': 2.9, '.webp': 9.0}
+DEFAULT_MEMORY_FACTOR = 3.0
+
+# Цветовой тип PNG -> каналы после cv2.imdecode(IMREAD_UNCHANGED)
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 4, 4: 4, 6: 4}   # Палитру считаем с альфой: так оценка не занижена
+
+
+class ImageHeader(NamedTuple):
+    width: int
+    height: int
+    channels: int          # Каналов в декодированном изображении
+    bytes_per_sample: int  # 2 для 16-битных PNG
+
+    @property
+    def decoded_bytes(self) -> int:
+        return self.width * self.height * self.channels * self.bytes_per_sample
+
+
+def _read_png(head: bytes) -> Optional[ImageHeader]:
+    if head[12:16] != b'IHDR':
+        return None
+    width, height, depth, color_type = struct.unpack('>IIBB', head[16:26])
+    return ImageHeader(width, height, _PNG_CHANNELS.get(color_type, 4), 2 if depth == 16 else 1)
+
+
+def _read_bmp(head: bytes) -> Optional[ImageHeader]:
+    width, height = struct.unpack('<ii', head[18:26])
+    bits = struct.unpack('<H', head[28:30])[0]
+    return ImageHeader(abs(width), abs(height), 4 if bits == 32 else 3, 1)
+
+
+def _read_webp(head: bytes) -> Optional[ImageHeader]:
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', head[26:30])
+        return ImageHeader(width & 0x3FFF, height & 0x3FFF, 3, 1)
+    if chunk == b'VP8L':
+        bits = int.from_bytes(head[21:25], 'little')
+        alpha = bits >> 28 & 1
+        return ImageHeader((bits & 0x3FFF) + 1, (bits >> 14 & 0x3FFF) + 1, 4 if alpha else 3, 1)
+    if chunk == b'VP8X':
+        alpha = head[20] & 0x10
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return ImageHeader(width, height, 4 if alpha else 3, 1)
+    return None
+
+
+def _read_jpeg(file: BinaryIO) -> Optional[ImageHeader]:
+    """Найти кадр SOF, перешагивая сегменты (EXIF может занимать десятки килобайт)."""
+    file.seek(2)
+    while True:
+        marker = file.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        if code == 0xFF:  # Заполняющий байт перед маркером
+            file.seek(-1, os.SEEK_CUR)
+            continue
+        if code == 0x01 or 0xD0 <= code <= 0xD7:  # Маркеры без длины
+            continue
+        if code in (0xD9, 0xDA):  # Конец файла или начало данных раньше SOF
+            return None
+        length = file.read(2)
+        if len(length) < 2:
+            return None
+        length = int.from_bytes(length, 'big')
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            segment = file.read(6)
+            if len(segment) < 6:
+                return None
+            precision, height, width, components = struct.unpack('>BHHB', segment)
+            # CMYK декодируется в BGR; 12-битные JPEG — в 8 бит
+            return ImageHeader(width, height, 1 if components == 1 else 3, 1)
+        file.seek(length - 2, os.SEEK_CUR)
+
+
+def guess_extension(head: bytes) -> Optional[str]:
+    """Расширение формата по первым 12 байтам файла; None — формат не распознан."""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return '.png'
+    if head.startswith(b'\xff\xd8'):
+        return '.jpg'
+    if head.startswith(b'BM'):
+        return '.bmp'
+    if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+
+def read_image_header(path: str) -> Optional[ImageHeader]:
+    """Размеры и число каналов по заголовку; None — формат не распознан или файл недоступен."""
+    try:
+        with open(path, 'rb') as file:
+            head = file.read(HEADER_SIZE)
+            if head.startswith(b'\x89PNG\r\n\x1a\n'):
+                return _read_png(head)
+            if head.startswith(b'\xff\xd8'):
+                return _read_jpeg(file)
+            if head.startswith(b'BM') and len(head) >= 30:
+                return _read_bmp(head)
+            if head.startswith(b'RIFF') and head[8:12] == b'WEBP' and len(head) >= 30:
+                return _read_webp(head)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def is_stripwise(path: str, header: Optional[ImageHeader], min_bytes: int = STRIPWISE_MIN_BYTES) -> bool:
+    """Обрабатывается ли файл полосами, а не целиком (см. strips.open_strip_reader)."""
+    return (header is not None and header.decoded_bytes >= min_bytes
+            and os.path.splitext(path)[1].lower() in STRIPWISE_EXTENSIONS)
+
+
+def estimate_memory(path: str, header: Optional[ImageHeader] = None) -> int:
+    """Оценка пика памяти на обработку файла, байт: сам файл плюс декодированное изображение с запасом.
+
+    header — заголовок, если он уже прочитан.
+    """
+    try:
+        file_size = os.path.getsize(path)
+    except OSError:
+        return 0
+    if header is None:
+        header = read_image_header(path)
+    if header is None:
+        # Заголовок не распознан — декодер, скорее всего, тоже не справится
+        return file_size
+    factor = MEMORY_FACTORS.get(os.path.splitext(path)[1].lower(), DEFAULT_MEMORY_FACTOR)
+    return file_size + int(header.decoded_bytes * factor)
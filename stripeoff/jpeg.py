@@ -0,0 +1,114 @@
+"""Обрезка JPEG без перекодирования.
+
+Коэффициенты DCT внутри рамки копируются в новый файл утилитой jpegtran
+из libjpeg-turbo, ничего не переквантуется. Левая и верхняя границы
+сдвигаются наружу до границы MCU, правая и нижняя остаются точными.
+"""
+
+import functools
+import os
+import shutil
+import subprocess
+import sys
+from typing import NamedTuple, Optional
+
+from .constants import Box
+
+JPEGTRAN_ENV = 'STRIPEOFF_JPEGTRAN'  # Переменная окружения с путём к jpegtran, если его нет в PATH
+JPEGTRAN_TIMEOUT = 120               # Секунды на один файл
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+
+# Поддерживаемые SOF с кодированием Хаффмана: маркер -> прогрессивный ли
+_SOF_MARKERS = {0xC0: False, 0xC1: False, 0xC2: True}
+
+
+class JpegInfo(NamedTuple):
+    width: int
+    height: int
+    progressive: bool
+    mcu_width: int
+    mcu_height: int
+
+
+def read_jpeg_info(data: bytes) -> Optional[JpegInfo]:
+    """Разобрать заголовок JPEG до кадра SOF; None — не JPEG или вариант, который не обрезается без потерь."""
+    if data[:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # Заполняющий байт перед маркером
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # Маркеры без длины
+            pos += 2
+            continue
+        length = int.from_bytes(data[pos + 2:pos + 4], 'big')
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            # Арифметическое кодирование, lossless JPEG и т.п. не поддерживаются
+            if marker not in _SOF_MARKERS:
+                return None
+            segment = data[pos + 4:pos + 2 + length]
+            if len(segment) < 6:
+                return None
+            precision = segment[0]
+            height = int.from_bytes(segment[1:3], 'big')
+            width = int.from_bytes(segment[3:5], 'big')
+            components = segment[5]
+            if precision != 8 or components not in (1, 3) or not height or not width:
+                return None
+            if len(segment) < 6 + 3 * components:
+                return None
+            factors = [segment[7 + 3 * i] for i in range(components)]
+            h_factors = [f >> 4 for f in factors]
+            v_factors = [f & 0x0F for f in factors]
+            # Необычная дискретизация (например, 4:1:1) — обработка обычным путём
+            if any(f not in (1, 2) for f in h_factors + v_factors):
+                return None
+            if components == 1:
+                mcu_width = mcu_height = 8
+            else:
+                mcu_width, mcu_height = 8 * max(h_factors), 8 * max(v_factors)
+            return JpegInfo(width, height, _SOF_MARKERS[marker], mcu_width, mcu_height)
+        if marker == 0xDA:  # Начало данных раньше SOF
+            return None
+        pos += 2 + length
+    return None
+
+
+def snap_box_to_mcu(box: Box, info: JpegInfo) -> Box:
+    """Расширить рамку наружу так, чтобы левый верхний угол лёг на границу MCU."""
+    top, bottom, left, right = box
+    return top - top % info.mcu_height, bottom, left - left % info.mcu_width, right
+
+
+@functools.lru_cache(maxsize=None)
+def find_jpegtran() -> Optional[str]:
+    """Путь к jpegtran: из STRIPEOFF_JPEGTRAN или из PATH."""
+    path = os.environ.get(JPEGTRAN_ENV)
+    if path and os.path.isfile(path):
+        return path
+    return shutil.which('jpegtran')
+
+
+def crop_jpeg_lossless(data: bytes, box: Box) -> Optional[bytes]:
+    """Вырезать из JPEG рамку, выровненную по MCU; None — jpegtran недоступен или не справился."""
+    jpegtran = find_jpegtran()
+    if jpegtran is None:
+        return None
+    top, bottom, left, right = box
+    crop = f'{right - left}x{bottom - top}+{left}+{top}'
+    # В сборке без консоли не показываем окно дочернего процесса
+    flags = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+    try:
+        completed = subprocess.run(
+            [jpegtran, '-copy', 'all', '-crop', crop],
+            input=data, capture_output=True, timeout=JPEGTRAN_TIMEOUT, creationflags=flags
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if completed.returncode != 0 or not completed.stdout:
+        return None
+    return completed.stdout
@@ -0,0 +1,113 @@
+"""Манифест найденных рамок: обнаружение отдельно от обрезки.
+
+Запуск только с поиском рамок (ProcessingOptions.detect_only) ничего не
+кодирует и не записывает, а ManifestWriter сохраняет для каждого файла
+результат, границы, размер и время изменения исходника и пороги, с которыми
+рамка искалась. Формат — по расширению: .csv или JSON Lines. Позже манифест
+читается read_manifest() и выполняется пакетно (Task.box): файлы обрезаются
+по записанным границам без повторного поиска. Модуль не зависит ни от OpenCV, ни от Qt.
+"""
+
+import csv
+import json
+import os
+from typing import Iterator, NamedTuple, Optional, TextIO
+
+from .constants import ALPHA_THRESHOLD, MIN_BORDER_WIDTH, WHITE_THRESHOLD, Box, ProcessResult
+
+FIELDS = (
+    'path', 'result', 'top', 'bottom', 'left', 'right', 'size', 'mtime_ns',
+    'white_threshold', 'alpha_threshold', 'min_border_width',
+)
+
+
+def current_thresholds() -> dict[str, int]:
+    """Пороги обнаружения рамок, с которыми работает эта версия."""
+    return {
+        'white_threshold': WHITE_THRESHOLD,
+        'alpha_threshold': ALPHA_THRESHOLD,
+        'min_border_width': MIN_BORDER_WIDTH,
+    }
+
+
+class ManifestEntry(NamedTuple):
+    path: str
+    result: ProcessResult
+    box: Optional[Box]            # None — рамку исключило превью JPEG, изображение пустое или ошибка
+    size: Optional[int]           # Размер и время изменения исходника на момент поиска
+    mtime_ns: Optional[int]
+    thresholds: dict[str, int]
+
+    def is_unchanged(self) -> bool:
+        """Исходник не менялся с момента поиска рамки."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == (self.size, self.mtime_ns)
+
+
+def _is_csv(path: str) -> bool:
+    return path.lower().endswith('.csv')
+
+
+class ManifestWriter:
+    """Дописывает записи в манифест по мере готовности, чтобы прерванный запуск не терялся."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._thresholds = current_thresholds()
+        self._file: Optional[TextIO] = open(path, 'w', encoding='utf-8', newline='')
+        self._csv = csv.writer(self._file) if _is_csv(path) else None
+        if self._csv is not None:
+            self._csv.writerow(FIELDS)
+
+    def add(self, path: str, result: ProcessResult, box: Optional[Box]) -> None:
+        try:
+            stat = os.stat(path)
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        except OSError:
+            size = mtime_ns = None
+        if self._csv is not None:
+            self._csv.writerow(
+                [path, result.value, *(box or ('',) * 4), size if size is not None else '',
+                 mtime_ns if mtime_ns is not None else '', *self._thresholds.values()]
+            )
+        else:
+            record = {'path': path, 'result': result.value, 'box': list(box) if box else None,
+                      'size': size, 'mtime_ns': mtime_ns, **self._thresholds}
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.count += 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _optional_int(value) -> Optional[int]:
+    return int(value) if value not in (None, '') else None
+
+
+def read_manifest(path: str) -> Iterator[ManifestEntry]:
+    """Прочитать манифест, записанный ManifestWriter; ValueError — строка повреждена."""
+    with open(path, encoding='utf-8', newline='') as file:
+        rows = csv.DictReader(file) if _is_csv(path) else (line for line in file if line.strip())
+        for number, row in enumerate(rows, 1):
+            try:
+                if isinstance(row, str):
+                    row = json.loads(row)
+                if 'box' in row:
+                    box = tuple(map(int, row['box'])) if row['box'] else None
+                else:
+                    sides = [_optional_int(row[name]) for name in ('top', 'bottom', 'left', 'right')]
+                    box = tuple(sides) if None not in sides else None
+                yield ManifestEntry(
+                    row['path'], ProcessResult(row['result']), box,
+                    _optional_int(row.get('size')), _optional_int(row.get('mtime_ns')),
+                    {name: int(row[name]) for name in current_thresholds() if row.get(name) not in (None, '')},
+                )
+            except (KeyError, TypeError, ValueError) as error:
+                raise ValueError(f'{path}: malformed entry {number}: {error}') from None
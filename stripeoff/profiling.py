@@ -0,0 +1,137 @@
+"""Замеры этапов обработки по файлам: время, объёмы, размеры и ошибки.
+
+FileProfile заполняется функцией remove_borders, если его передать.
+Profiler собирает записи, пишет их в JSON Lines и строит сводку
+по этапам (p50/p95). Модуль не зависит ни от OpenCV, ни от Qt.
+"""
+
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from typing import Optional, TextIO
+
+from .constants import Box
+
+# Этапы в порядке выполнения; лишние этапы для файла просто не записываются
+STAGES = ('cache', 'read', 'preview', 'decode', 'detect', 'encode', 'write')
+
+
+@dataclass
+class FileProfile:
+    path: str
+    result: Optional[str] = None          # Значение ProcessResult
+    cached: bool = False                  # Результат взят из индекса прошлых запусков
+    duplicate_of: Optional[str] = None    # Результат взят у файла с тем же содержимым
+    input_bytes: Optional[int] = None
+    output_bytes: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    channels: Optional[int] = None
+    box: Optional[Box] = None             # Найденные (или выровненные по MCU) границы содержимого
+    error: Optional[str] = None           # Тип исключения или причина ошибки
+    error_message: Optional[str] = None
+    total: float = 0.0                    # Секунды на весь файл
+    stages: dict[str, float] = field(default_factory=dict)  # Этап -> секунды
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замерить этап; повторные замеры одного этапа складываются."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def set_error(self, error: BaseException) -> None:
+        self.error = type(error).__name__
+        self.error_message = str(error)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def stage_timer(profile: Optional[FileProfile]):
+    """Функция замера этапов: profile.stage или пустой контекст, если замеры не нужны."""
+    if profile is None:
+        return lambda name: nullcontext()
+    return profile.stage
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Перцентиль q (0..100) по отсортированным значениям с линейной интерполяцией."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class Profiler:
+    """Собирает FileProfile всех файлов; при заданном файле сразу дописывает их в JSON Lines."""
+
+    def __init__(self, jsonl_path: Optional[str] = None):
+        self.records: list[FileProfile] = []
+        self._file: Optional[TextIO] = open(jsonl_path, 'w', encoding='utf-8') if jsonl_path else None
+
+    def add(self, profile: FileProfile) -> None:
+        self.records.append(profile)
+        if self._file is not None:
+            self._file.write(json.dumps(profile.to_dict(), ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def write_jsonl(self, path: str) -> None:
+        """Выгрузить все записи в JSON Lines."""
+        with open(path, 'w', encoding='utf-8') as file:
+            for profile in self.records:
+                file.write(json.dumps(profile.to_dict(), ensure_ascii=False) + '\n')
+
+    def summary(self) -> dict:
+        """Сводка: по этапам и для файла целиком — число, сумма, p50, p95 и максимум (секунды)."""
+        durations = {stage: [] for stage in STAGES}
+        durations['total'] = []
+        for profile in self.records:
+            for stage, seconds in profile.stages.items():
+                durations.setdefault(stage, []).append(seconds)
+            durations['total'].append(profile.total)
+
+        stages = {}
+        for stage, values in durations.items():
+            if not values:
+                continue
+            values.sort()
+            stages[stage] = {
+                'count': len(values),
+                'sum': sum(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'max': values[-1],
+            }
+        return {
+            'files': len(self.records),
+            'input_bytes': sum(profile.input_bytes or 0 for profile in self.records),
+            'output_bytes': sum(profile.output_bytes or 0 for profile in self.records),
+            'results': dict(Counter(profile.result for profile in self.records)),
+            'errors': dict(Counter(profile.error for profile in self.records if profile.error)),
+            'stages': stages,
+        }
+
+    def format_summary(self) -> str:
+        """Сводка в виде текстовой таблицы."""
+        summary = self.summary()
+        lines = [f'{"stage":<8} {"count":>7} {"total s":>9} {"p50 ms":>9} {"p95 ms":>9} {"max ms":>9}']
+        for stage, row in summary['stages'].items():
+            lines.append(
+                f'{stage:<8} {row["count"]:>7} {row["sum"]:>9.2f} {row["p50"] * 1000:>9.1f} '
+                f'{row["p95"] * 1000:>9.1f} {row["max"] * 1000:>9.1f}'
+            )
+        if summary['errors']:
+            lines.append('errors: ' + ', '.join(f'{name} x{count}' for name, count in summary['errors'].items()))
+        return '\n'.join(lines)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,389 @@
+"""Локальный HTTP-сервер обрезки: изображение в теле запроса, результат в ответе.
+
+Процессы пула запускаются и загружают OpenCV при старте сервера и работают,
+пока работает он, поэтому запрос не платит за запуск интерпретатора.
+Соединения keep-alive (HTTP/1.1). В пуле одновременно не больше
+max_concurrency изображений; остальные ждут места до queue_timeout секунд,
+потом получают 503. Модуль не зависит ни от OpenCV, ни от Qt: их загружают
+только процессы пула.
+
+POST /crop     тело — файл изображения; ответ — обрезанный файл (исходный, если рамки нет)
+POST /detect   тело — файл изображения; ответ — JSON с результатом и границами
+POST /batch    multipart/form-data с несколькими файлами; ответ — multipart/mixed
+               с результатами или, с ?detect=1, JSON-массив
+GET  /metrics  JSON: запросы, ответы, результаты, задержки, занятость пула
+
+Параметры запроса: format (png, jpg, jpeg, bmp, webp — формат результата,
+по умолчанию формат исходного файла), preset (ENCODER_PRESETS), lossless_jpeg=1.
+Результат и границы передаются в заголовках X-StripeOff-Result и X-StripeOff-Box.
+Тело не изображение поддерживаемого формата — 415; изображение не декодируется —
+422 и для /crop, и для /detect, а в /batch — результат error у этой части.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from email import policy
+from email.parser import BytesParser
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, quote, urlsplit
+
+from .batch import _warm_up
+from .constants import DEFAULT_ENCODER_PRESET, ENCODER_PRESETS, SUPPORTED_EXTENSIONS, Box
+from .headers import guess_extension
+from .profiling import percentile
+
+DEFAULT_PORT = 8765
+QUEUE_TIMEOUT = 30.0                 # Секунд ожидания места в пуле до ответа 503
+MAX_BODY_BYTES = 256 * 1024 * 1024   # Больше — ответ 413
+LATENCY_WINDOW = 4096                # По скольким последним запросам считаются перцентили
+
+CONTENT_TYPES = {
+    '.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.bmp': 'image/bmp', '.webp': 'image/webp',
+}
+
+
+class _HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _crop_in_worker(
+    data: bytes, ext: str, lossless_jpeg: bool, preset: str, encode: bool
+) -> tuple[str, Optional[Box], object]:
+    """Обработать изображение в процессе пула; закодированный результат — буфер без лишней копии."""
+    from .core import crop_bytes
+
+    result = crop_bytes(data, ext, lossless_jpeg=lossless_jpeg, encoder_preset=preset, encode=encode)
+    encoded = result.encoded.obj if result.encoded is not None else None
+    return result.result.value, result.box, encoded
+
+
+class ServerMetrics:
+    """Счётчики сервера для /metrics. Обновляются из потоков обработчиков."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = Counter()    # Путь -> запросов
+        self.responses = Counter()   # Код ответа -> ответов
+        self.results = Counter()     # Значение ProcessResult -> изображений
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.rejected = 0            # Ответов 503: в пуле не нашлось места
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, path: str, status: int, elapsed: float, bytes_in: int, bytes_out: int) -> None:
+        with self._lock:
+            self.requests[path] += 1
+            self.responses[status] += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                self.rejected += 1
+            self._latencies.append(elapsed)
+
+    def count_result(self, result: str) -> None:
+        with self._lock:
+            self.results[result] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                'uptime_s': round(time.monotonic() - self.started, 1),
+                'requests': dict(self.requests),
+                'responses': {str(status): count for status, count in self.responses.items()},
+                'results': dict(self.results),
+                'rejected': self.rejected,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'latency_ms': {
+                    'window': len(latencies),
+                    **{f'p{q}': round(percentile(latencies, q) * 1000, 2) for q in (50, 95, 99)},
+                },
+            }
+
+
+class CropServer(ThreadingHTTPServer):
+    """HTTP-сервер с постоянным пулом процессов обработки."""
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int] = ('127.0.0.1', DEFAULT_PORT),
+        workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        queue_timeout: float = QUEUE_TIMEOUT,
+        max_body: int = MAX_BODY_BYTES,
+        lossless_jpeg: bool = False,
+        encoder_preset: str = DEFAULT_ENCODER_PRESET,
+    ):
+        super().__init__(address, _Handler)
+        self.workers = workers or os.cpu_count() or 1
+        # Вдвое больше процессов: пока один файл передаётся в процесс, другой уже обрабатывается
+        self.max_concurrency = max_concurrency or self.workers * 2
+        self.queue_timeout = queue_timeout
+        self.max_body = max_body
+        self.lossless_jpeg = lossless_jpeg
+        self.encoder_preset = encoder_preset
+        self.metrics = ServerMetrics()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._inflight = 0
+        self._pool_lock = threading.Lock()
+        try:
+            self._executor = self._start_pool()
+        except BaseException:
+            # Сокет уже слушает; server_close() здесь не годится — ему нужен пул
+            super().server_close()
+            raise
+
+    def _start_pool(self) -> ProcessPoolExecutor:
+        """Запустить все процессы пула и дождаться, пока они загрузят OpenCV."""
+        executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=_warm_up
+        )
+        try:
+            for future in [executor.submit(_warm_up) for _ in range(self.workers)]:
+                future.result()
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return executor
+
+    def _restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        # Процесс пула упал (например, не хватило памяти): пул больше не принимает задачи
+        with self._pool_lock:
+            if self._executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._start_pool()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def submit(self, data: bytes, ext: str, lossless_jpeg: bool, preset: str, encode: bool) -> Future:
+        """Отдать изображение пулу, дождавшись места не дольше queue_timeout; иначе _HttpError 503."""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise _HttpError(HTTPStatus.SERVICE_UNAVAILABLE, 'server is busy, retry later')
+        with self._pool_lock:
+            self._inflight += 1
+        executor = self._executor
+        try:
+            try:
+                future = executor.submit(_crop_in_worker, data, ext, lossless_jpeg, preset, encode)
+            except BrokenProcessPool:
+                self._restart_pool(executor)
+                executor = self._executor
+                future = executor.submit(_crop_in_worker, data, ext, lossless_jpeg, preset, encode)
+        except BaseException as error:
+            self._release()
+            if isinstance(error, BrokenProcessPool):
+                raise _HttpError(HTTPStatus.INTERNAL_SERVER_ERROR, 'worker pool cannot be started')
+            raise
+        future.executor = executor
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self) -> None:
+        with self._pool_lock:
+            self._inflight -= 1
+        self._slots.release()
+
+    def result(self, future: Future) -> tuple[str, Optional[Box], object]:
+        """Результат обработки; падение процесса пула — _HttpError 500 и перезапуск пула."""
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            self._restart_pool(future.executor)
+            raise _HttpError(HTTPStatus.INTERNAL_SERVER_ERROR, 'worker process crashed')
+        except ValueError as error:
+            raise _HttpError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, str(error))
+        except Exception as error:
+            raise _HttpError(HTTPStatus.INTERNAL_SERVER_ERROR, f'{type(error).__name__}: {error}')
+        self.metrics.count_result(result[0])
+        return result
+
+    def server_close(self) -> None:
+        super().server_close()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # Соединения keep-alive
+    # Заголовки и тело ответа уходят разными записями; с алгоритмом Нейгла тело ждало бы
+    # подтверждения заголовков, а клиент откладывает его до 40 мс
+    disable_nagle_algorithm = True
+    server: CropServer
+
+    def log_request(self, code='-', size='-') -> None:
+        # Запросов много, а сводка есть в /metrics; ошибки по-прежнему пишутся через log_error
+        pass
+
+    def do_GET(self) -> None:
+        start = time.perf_counter()
+        path = urlsplit(self.path).path
+        if path == '/metrics':
+            snapshot = self.server.metrics.snapshot()
+            snapshot.update(workers=self.server.workers, max_concurrency=self.server.max_concurrency,
+                            inflight=self.server.inflight)
+            status, sent = self._send_json(HTTPStatus.OK, snapshot)
+        else:
+            status, sent = self._send_json(HTTPStatus.NOT_FOUND, {'error': f'unknown path {path}'})
+        self.server.metrics.record(path, status, time.perf_counter() - start, 0, sent)
+
+    def do_POST(self) -> None:
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        received = 0
+        try:
+            # Тело читается до проверки пути: иначе его остаток испортит следующий запрос соединения
+            body = self._read_body()
+            received = len(body)
+            if url.path not in ('/crop', '/detect', '/batch'):
+                raise _HttpError(HTTPStatus.NOT_FOUND, f'unknown path {url.path}')
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            if url.path == '/batch':
+                status, sent = self._batch(body, query)
+            else:
+                status, sent = self._single(body, query, detect=url.path == '/detect')
+        except _HttpError as error:
+            status, sent = self._send_json(error.status, {'error': str(error)})
+        self.server.metrics.record(url.path, status, time.perf_counter() - start, received, sent)
+
+    def _read_body(self) -> bytes:
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            self.close_connection = True
+            raise _HttpError(HTTPStatus.LENGTH_REQUIRED, 'Content-Length is required')
+        length = int(length)
+        if length > self.server.max_body:
+            # Тело не дочитывается, поэтому соединение дальше не годится
+            self.close_connection = True
+            raise _HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f'body is larger than {self.server.max_body} bytes')
+        return self.rfile.read(length)
+
+    def _options(self, query: dict) -> tuple[Optional[str], bool, str]:
+        ext = query.get('format')
+        if ext is not None:
+            ext = '.' + ext.lower().lstrip('.')
+            if ext not in SUPPORTED_EXTENSIONS:
+                raise _HttpError(HTTPStatus.BAD_REQUEST, f'unsupported format {query["format"]!r}')
+        preset = query.get('preset', self.server.encoder_preset)
+        if preset not in ENCODER_PRESETS:
+            raise _HttpError(HTTPStatus.BAD_REQUEST, f'unknown preset {preset!r}')
+        lossless_jpeg = query.get('lossless_jpeg', '1' if self.server.lossless_jpeg else '0') in ('1', 'true')
+        return ext, lossless_jpeg, preset
+
+    def _submit(self, data: bytes, query: dict, detect: bool) -> tuple[Future, str]:
+        ext, lossless_jpeg, preset = self._options(query)
+        source_ext = guess_extension(data[:12])
+        if source_ext is None:
+            raise _HttpError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, 'body is not a PNG, JPEG, BMP or WebP image')
+        ext = ext or source_ext
+        return self.server.submit(data, ext, lossless_jpeg, preset, not detect), ext
+
+    def _single(self, body: bytes, query: dict, detect: bool) -> tuple[int, int]:
+        future, ext = self._submit(body, query, detect)
+        result, box, encoded = self.server.result(future)
+        if result == 'error':
+            # Одинаково для /crop и /detect; в /batch ошибка части передаётся в самой части
+            raise _HttpError(HTTPStatus.UNPROCESSABLE_ENTITY,
+                             'image cannot be decoded' if detect else 'image cannot be decoded or encoded')
+        if detect:
+            return self._send_json(HTTPStatus.OK, {'result': result, 'box': box})
+        # Рамки нет — возвращается исходный файл, чтобы ответ всегда был изображением
+        data = encoded if encoded is not None else body
+        headers = {'Content-Type': CONTENT_TYPES[ext if encoded is not None else guess_extension(body[:12])]}
+        headers.update(_result_headers(result, box))
+        return self._send(HTTPStatus.OK, headers, [data])
+
+    def _batch(self, body: bytes, query: dict) -> tuple[int, int]:
+        content_type = self.headers.get('Content-Type', '')
+        message = BytesParser(policy=policy.HTTP).parsebytes(
+            b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body
+        )
+        if not message.is_multipart():
+            raise _HttpError(HTTPStatus.BAD_REQUEST, 'expected a multipart/form-data body')
+        parts = []
+        for index, part in enumerate(message.iter_parts()):
+            name = part.get_filename() or part.get_param('name', header='content-disposition') or f'image{index}'
+            parts.append((name, part.get_payload(decode=True) or b''))
+        detect = query.get('detect') in ('1', 'true')
+        # Все части отдаются пулу сразу (по мере мест), а ответы собираются по порядку
+        jobs = []
+        for name, data in parts:
+            try:
+                jobs.append((name, data, *self._submit(data, query, detect)))
+            except _HttpError as error:
+                if error.status == HTTPStatus.SERVICE_UNAVAILABLE:
+                    raise
+                jobs.append((name, data, error, None))
+
+        items = []
+        for name, data, future, ext in jobs:
+            try:
+                if isinstance(future, _HttpError):
+                    raise future
+                result, box, encoded = self.server.result(future)
+            except _HttpError as error:
+                items.append((name, {'result': 'error', 'box': None, 'error': str(error)}, None, None))
+                continue
+            items.append((name, {'result': result, 'box': box}, encoded, ext))
+
+        if detect:
+            return self._send_json(HTTPStatus.OK, [{'name': name, **info} for name, info, _, _ in items])
+        boundary = uuid.uuid4().hex
+        chunks = []
+        for (name, info, encoded, ext), (_, data) in zip(items, parts):
+            headers = {'Content-Disposition': _content_disposition(name)}
+            if info['result'] == 'error':
+                headers['Content-Type'] = 'application/json'
+                payload = json.dumps(info).encode()
+            else:
+                source_ext = guess_extension(data[:12])
+                headers['Content-Type'] = CONTENT_TYPES[ext if encoded is not None else source_ext]
+                payload = encoded if encoded is not None else data
+            headers.update(_result_headers(info['result'], info['box']))
+            head = ''.join(f'{key}: {value}\r\n' for key, value in headers.items())
+            chunks += [f'--{boundary}\r\n{head}\r\n'.encode('latin-1'), payload, b'\r\n']
+        chunks.append(f'--{boundary}--\r\n'.encode())
+        return self._send(HTTPStatus.OK, {'Content-Type': f'multipart/mixed; boundary={boundary}'}, chunks)
+
+    def _send_json(self, status: int, payload) -> tuple[int, int]:
+        return self._send(status, {'Content-Type': 'application/json'}, [json.dumps(payload).encode()])
+
+    def _send(self, status: int, headers: dict, chunks: list) -> tuple[int, int]:
+        """Отправить ответ с Content-Length (нужен для keep-alive); вернуть код и объём тела."""
+        length = sum(memoryview(chunk).nbytes for chunk in chunks)
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(chunk)
+        return status, length
+
+
+def _content_disposition(name: str) -> str:
+    """Content-Disposition с именем файла: ASCII-вариант и полное имя в UTF-8 (RFC 5987)."""
+    name = ''.join(char for char in name if char not in '"\\\r\n')
+    fallback = ''.join(char if ' ' <= char <= '~' else '_' for char in name)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(name, safe='')}"
+
+
+def _result_headers(result: str, box: Optional[Box]) -> dict:
+    headers = {'X-StripeOff-Result': result}
+    if box is not None:
+        headers['X-StripeOff-Box'] = ','.join(map(str, box))
+    return headers
@@ -0,0 +1,219 @@
+"""Чтение очень больших BMP и PNG полосами строк, без декодирования всего изображения.
+
+BMP без сжатия (24 бита) читается через отображение в память по полосе за раз.
+PNG распаковывается потоком: отфильтрованные строки полосы вместе с последней
+восстановленной строкой предыдущей полосы (с фильтром None) собираются в
+маленький PNG, который декодирует OpenCV. Так поддерживаются все фильтры PNG,
+а в памяти одновременно находится только одна полоса.
+"""
+
+import os
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+
+import cv2
+import numpy as np
+
+from .headers import is_stripwise, read_image_header
+
+STRIP_BYTES = 16 * 1024 * 1024   # Примерный объём одной полосы в декодированном виде
+READ_CHUNK = 1024 * 1024         # Порция чтения сжатых данных PNG
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_SAMPLES = {0: 1, 2: 3, 4: 2, 6: 4}   # Цветовой тип -> отсчётов на пиксель (без палитры)
+
+
+class StripReader(ABC):
+    """Источник полос изображения в раскладке cv2.imdecode(IMREAD_UNCHANGED)."""
+    width: int
+    height: int
+    channels: int
+    dtype: np.dtype
+
+    def strip_rows(self) -> int:
+        row_bytes = self.width * self.channels * self.dtype.itemsize
+        return max(1, STRIP_BYTES // row_bytes)
+
+    @abstractmethod
+    def iter_strips(self, stop_row: Optional[int] = None) -> Iterator[tuple[int, np.ndarray]]:
+        """Полосы (номер первой строки, массив) сверху вниз до stop_row."""
+
+
+class BmpStripReader(StripReader):
+    def __init__(self, path: str, offset: int, width: int, height: int):
+        self.path = path
+        self.offset = offset
+        self.width = width
+        self.height = abs(height)
+        self.bottom_up = height > 0   # Обычный BMP хранит строки снизу вверх
+        self.channels = 3
+        self.dtype = np.dtype(np.uint8)
+        self.stride = (width * 3 + 3) & ~3   # Строки выровнены на 4 байта
+
+    def iter_strips(self, stop_row: Optional[int] = None) -> Iterator[tuple[int, np.ndarray]]:
+        stop_row = self.height if stop_row is None else min(stop_row, self.height)
+        step = self.strip_rows()
+        for start in range(0, stop_row, step):
+            count = min(step, stop_row - start)
+            first = self.height - start - count if self.bottom_up else start
+            # Отдельное отображение на полосу: прочитанные страницы не копятся в памяти процесса
+            mapped = np.memmap(self.path, np.uint8, 'r', self.offset + first * self.stride, (count, self.stride))
+            strip = np.array(mapped[:, :self.width * 3]).reshape(count, self.width, 3)
+            del mapped
+            yield start, strip[::-1] if self.bottom_up else strip
+
+
+class PngStripReader(StripReader):
+    def __init__(self, path: str, width: int, height: int, depth: int, color_type: int,
+                 trns: Optional[bytes], idat: list[tuple[int, int]]):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.color_type = color_type
+        self.trns = trns
+        self.idat = idat   # (смещение, длина) данных каждого чанка IDAT
+        self.samples = _PNG_SAMPLES[color_type]
+        # Серый с альфой, а также прозрачность через tRNS OpenCV отдаёт как BGRA
+        self.channels = 4 if color_type in (4, 6) or trns is not None else (1 if color_type == 0 else 3)
+        self.dtype = np.dtype(np.uint16 if depth == 16 else np.uint8)
+        self.row_bytes = width * self.samples * depth // 8
+
+    def _raw_row(self, row: np.ndarray) -> bytes:
+        """Строка PNG до фильтрации по строке, декодированной OpenCV."""
+        if self.color_type == 0:
+            samples = row[:, 0] if row.ndim == 2 else row
+        elif self.color_type == 2:
+            samples = row[:, 2::-1]
+        elif self.color_type == 4:
+            samples = row[:, [0, 3]]
+        else:
+            samples = row[:, [2, 1, 0, 3]]
+        return np.ascontiguousarray(samples, dtype='>u2' if self.depth == 16 else np.uint8).tobytes()
+
+    def _decode(self, filtered: bytes, rows: int, previous: Optional[bytes]) -> np.ndarray:
+        """Декодировать полосу отфильтрованных строк; previous — восстановленная строка над ней."""
+        if previous is not None:
+            filtered = b'\x00' + previous + filtered
+            rows += 1
+        ihdr = struct.pack('>IIBBBBB', self.width, rows, self.depth, self.color_type, 0, 0, 0)
+        chunks = [(b'IHDR', ihdr)]
+        if self.trns is not None:
+            chunks.append((b'tRNS', self.trns))
+        # Данные уже сжаты в исходном файле, здесь важна только скорость
+        chunks += [(b'IDAT', zlib.compress(filtered, 0)), (b'IEND', b'')]
+        data = bytearray(_PNG_SIGNATURE)
+        for kind, body in chunks:
+            data += struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body))
+        strip = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+        if strip is None:
+            raise ValueError('cannot decode PNG strip')
+        return strip[1:] if previous is not None else strip
+
+    def _inflate(self, limit: int) -> Iterator[bytes]:
+        """Распакованные данные IDAT порциями не больше limit."""
+        inflater = zlib.decompressobj()
+        with open(self.path, 'rb') as file:
+            for offset, length in self.idat:
+                file.seek(offset)
+                while length:
+                    compressed = file.read(min(READ_CHUNK, length))
+                    if not compressed:
+                        raise ValueError('truncated PNG file')
+                    length -= len(compressed)
+                    while compressed:
+                        # Белые поля сжимаются в сотни раз, поэтому порция ограничена
+                        yield inflater.decompress(compressed, limit)
+                        compressed = inflater.unconsumed_tail
+        while not inflater.eof:
+            piece = inflater.decompress(b'', limit)
+            if not piece:
+                break
+            yield piece
+
+    def iter_strips(self, stop_row: Optional[int] = None) -> Iterator[tuple[int, np.ndarray]]:
+        stop_row = self.height if stop_row is None else min(stop_row, self.height)
+        line = self.row_bytes + 1   # Байт типа фильтра и строка
+        strip_bytes = self.strip_rows() * line
+        pending = bytearray()
+        previous = None
+        start = 0
+        for piece in self._inflate(strip_bytes):
+            pending += piece
+            while len(pending) >= min(strip_bytes, (self.height - start) * line):
+                rows = min(len(pending) // line, self.height - start)
+                strip = self._decode(bytes(pending[:rows * line]), rows, previous)
+                del pending[:rows * line]
+                previous = self._raw_row(strip[-1])
+                yield start, strip
+                start += rows
+                if start >= stop_row:
+                    return
+        raise ValueError('truncated PNG data')
+
+
+def _open_png(path: str) -> Optional[PngStripReader]:
+    with open(path, 'rb') as file:
+        if file.read(8) != _PNG_SIGNATURE:
+            return None
+        header = None
+        trns = None
+        idat = []
+        while True:
+            head = file.read(8)
+            if len(head) < 8:
+                return None
+            length, kind = struct.unpack('>I4s', head)
+            if kind == b'IHDR':
+                header = struct.unpack('>IIBBBBB', file.read(13))
+                file.seek(length - 13 + 4, os.SEEK_CUR)
+                continue
+            if kind == b'tRNS':
+                trns = file.read(length)
+                file.seek(4, os.SEEK_CUR)
+                continue
+            if kind == b'IDAT':
+                idat.append((file.tell(), length))
+            elif kind == b'IEND':
+                break
+            file.seek(length + 4, os.SEEK_CUR)
+    if header is None or not idat:
+        return None
+    width, height, depth, color_type, compression, filter_method, interlace = header
+    # Палитра, глубина меньше 8 бит и чересстрочность читаются обычным путём
+    if color_type not in _PNG_SAMPLES or depth not in (8, 16) or interlace or compression or filter_method:
+        return None
+    return PngStripReader(path, width, height, depth, color_type, trns, idat)
+
+
+def _open_bmp(path: str) -> Optional[BmpStripReader]:
+    with open(path, 'rb') as file:
+        head = file.read(34)
+    if len(head) < 34 or head[:2] != b'BM':
+        return None
+    offset = struct.unpack('<I', head[10:14])[0]
+    width, height = struct.unpack('<ii', head[18:26])
+    bits, compression = struct.unpack('<HI', head[28:34])
+    # Только 24 бита без сжатия: остальные варианты декодирует OpenCV
+    if bits != 24 or compression != 0 or width <= 0 or height == 0:
+        return None
+    if offset + ((width * 3 + 3) & ~3) * abs(height) > os.path.getsize(path):
+        return None
+    return BmpStripReader(path, offset, width, height)
+
+
+def open_strip_reader(path: str, min_bytes: int) -> Optional[StripReader]:
+    """Читатель полос, если изображение в декодированном виде не меньше min_bytes и формат это позволяет."""
+    if not is_stripwise(path, read_image_header(path), min_bytes):
+        return None
+    try:
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.png':
+            return _open_png(path)
+        if ext == '.bmp':
+            return _open_bmp(path)
+    except (OSError, struct.error):
+        pass
+    return None
@@ -0,0 +1,178 @@
+"""Наблюдение за папками: новые изображения отдаются в обработку, когда их запись закончена.
+
+Снимок папок строится через os.scandir и сравнивается с прошлым. Чтобы не
+перечитывать всё дерево, на каждом опросе проверяется только время изменения
+папок: оно меняется, когда в папке появляются, исчезают или переименовываются
+файлы, и только такие папки просматриваются заново, а stat вызывается лишь
+для новых имён. Файлы, запись которых ещё идёт, опрашиваются по отдельности.
+Сетевые папки не всегда обновляют время изменения папки, поэтому раз в
+FULL_RESCAN_INTERVAL секунд дерево полностью просматривается заново.
+Модуль не зависит ни от OpenCV, ни от Qt.
+"""
+
+import os
+import threading
+import time
+from typing import Iterable, Optional
+
+from .constants import CROPPED_SUFFIX, SUPPORTED_EXTENSIONS
+
+POLL_INTERVAL = 0.1          # Секунд между опросами папок
+SETTLE_TIME = 0.3            # Файл готов, если размер и время изменения не менялись столько секунд
+FULL_RESCAN_INTERVAL = 10.0  # Секунд между полными просмотрами дерева
+# Папка, изменённая недавно, просматривается на каждом опросе: время изменения
+# грубее реального порядка событий, и второй файл в тот же квант его не меняет
+RECENT_WINDOW = 2.0
+
+Signature = tuple[int, int]   # (размер, время изменения в нс)
+
+
+def _signature(path: str) -> Optional[Signature]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _can_open(path: str) -> bool:
+    """Открывается ли файл на чтение: в Windows файл, который ещё пишется, обычно заблокирован."""
+    try:
+        open(path, 'rb').close()
+    except OSError:
+        return False
+    return True
+
+
+class FolderWatcher:
+    """Находит в папках новые и изменённые изображения, дождавшись окончания их записи.
+
+    poll() возвращает файлы, размер и время изменения которых не менялись
+    settle секунд. Файл, уже отданный в обработку, возвращается снова, только
+    если он изменился. Файлы с ignore_suffix в имени (обрезанные копии)
+    пропускаются; перезаписанный оригинал нужно отметить mark_processed(),
+    иначе он будет найден как изменённый.
+    """
+
+    def __init__(
+        self,
+        roots: Iterable[str],
+        settle: float = SETTLE_TIME,
+        ignore_suffix: Optional[str] = CROPPED_SUFFIX,
+        full_rescan: float = FULL_RESCAN_INTERVAL,
+    ):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.settle = settle
+        self.ignore_suffix = ignore_suffix
+        self.full_rescan = full_rescan
+        self._dirs = {}      # Папка -> (время изменения в нс, множество путей изображений в ней)
+        self._known = {}     # Путь -> подпись, с которой файл отдан в обработку
+        self._pending = {}   # Путь -> (подпись, когда она замечена): файл, возможно, ещё пишется
+        self._last_full = None
+        self._lock = threading.Lock()
+
+    def _is_image(self, name: str) -> bool:
+        if not name.lower().endswith(SUPPORTED_EXTENSIONS):
+            return False
+        return not (self.ignore_suffix and os.path.splitext(name)[0].endswith(self.ignore_suffix))
+
+    def _forget(self, paths: Iterable[str]) -> None:
+        for path in paths:
+            self._known.pop(path, None)
+            self._pending.pop(path, None)
+
+    def _scan(self, directory: str, mtime_ns: int, full: bool, pending_dirs: list[str]) -> set[str]:
+        """Просмотреть папку; вернуть изображения, которые нужно проверить через stat."""
+        files = set()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        # Как при обходе перетащенных папок: по ссылкам на папки не спускаемся
+                        if entry.is_dir():
+                            if not entry.is_symlink() and (full or entry.path not in self._dirs):
+                                pending_dirs.append(entry.path)
+                        elif self._is_image(entry.name):
+                            files.add(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            self._forget_dir(directory)
+            return set()
+        previous = self._dirs.get(directory, (0, set()))[1]
+        self._forget(previous - files)
+        self._dirs[directory] = mtime_ns, files
+        return files if full else files - previous
+
+    def _forget_dir(self, directory: str) -> None:
+        entry = self._dirs.pop(directory, None)
+        if entry is not None:
+            self._forget(entry[1])
+
+    def _changed_dirs(self) -> list[str]:
+        changed = []
+        now = time.time()
+        for directory, (mtime_ns, _) in list(self._dirs.items()):
+            try:
+                stat = os.stat(directory)
+            except OSError:
+                self._forget_dir(directory)
+                continue
+            if stat.st_mtime_ns != mtime_ns or now - stat.st_mtime < RECENT_WINDOW:
+                changed.append(directory)
+        return changed
+
+    def poll(self) -> list[str]:
+        """Пути изображений, которые появились или изменились и больше не пишутся."""
+        with self._lock:
+            now = time.monotonic()
+            full = self._last_full is None or now - self._last_full >= self.full_rescan
+            if full:
+                self._last_full = now
+                visited = set()
+                pending_dirs = list(self.roots)
+            else:
+                pending_dirs = self._changed_dirs()
+            candidates = set(self._pending)
+            while pending_dirs:
+                directory = pending_dirs.pop()
+                try:
+                    mtime_ns = os.stat(directory).st_mtime_ns
+                except OSError:
+                    self._forget_dir(directory)
+                    continue
+                if full:
+                    visited.add(directory)
+                candidates |= self._scan(directory, mtime_ns, full, pending_dirs)
+            if full:
+                for directory in set(self._dirs) - visited:
+                    self._forget_dir(directory)
+
+            ready = []
+            for path in sorted(candidates):
+                signature = _signature(path)
+                if signature is None:
+                    self._forget([path])
+                    continue
+                if signature == self._known.get(path):
+                    self._pending.pop(path, None)
+                    continue
+                seen = self._pending.get(path)
+                if seen is None or seen[0] != signature:
+                    self._pending[path] = signature, now
+                elif now - seen[1] >= self.settle and _can_open(path):
+                    del self._pending[path]
+                    self._known[path] = signature
+                    ready.append(path)
+            return ready
+
+    def mark_processed(self, path: str) -> None:
+        """Запомнить файл в текущем виде: например, оригинал, перезаписанный обрезанной версией."""
+        path = os.path.abspath(path)
+        signature = _signature(path)
+        with self._lock:
+            if signature is None:
+                self._forget([path])
+            else:
+                self._known[path] = signature
+                self._pending.pop(path, None)
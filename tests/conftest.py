@@ -0,0 +1,24 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_image(tmp_path):
+    """Записать изображение с белой рамкой шириной border вокруг шума; вернуть путь."""
+    def make(name: str, size: tuple[int, int] = (200, 300), border: int = 20, seed: int = 0) -> str:
+        height, width = size
+        image = np.full((height, width, 3), 255, np.uint8)
+        image[border:height - border, border:width - border] = np.random.default_rng(seed).integers(
+            0, 200, (height - 2 * border, width - 2 * border, 3), np.uint8
+        )
+        path = str(tmp_path / name)
+        assert cv2.imwrite(path, image)
+        return path
+
+    return make
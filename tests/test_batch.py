@@ -0,0 +1,260 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import pytest
+
+from stripeoff import batch
+from stripeoff.batch import BatchProcessor, ProcessingOptions, _compute, make_output_path
+from stripeoff.constants import ProcessResult
+from stripeoff.headers import estimate_memory
+from stripeoff.profiling import Profiler
+
+
+@pytest.mark.parametrize('io_threads', [0, 2])
+def test_worker_crash_does_not_stop_the_batch(make_image, io_threads):
+    paths = [make_image(f'img{index}.png', size=(80, 120), seed=index) for index in range(12)]
+    results = []
+
+    def on_result(task, result):
+        if not results:
+            # Процесс пула «падает» посреди пакета, как при нехватке памяти
+            for child in multiprocessing.active_children():
+                child.kill()
+        results.append(result)
+
+    # Процессы пула возвращают короткие результаты, даже с закодированным файлом (io_threads > 0):
+    # сообщение больше 16 КБ multiprocessing пишет в две записи, убитый между ними процесс
+    # оставляет канал ProcessPoolExecutor недочитанным, и пул зависает
+    processor = BatchProcessor(on_result, max_workers=1, io_threads=io_threads, dedup=False)
+    for index, path in enumerate(paths):
+        processor.add_task(index, path, make_output_path(path))
+    processor.close()
+    processor.run()
+
+    # Файлы, бывшие в упавшем пуле, обработаны новым вместе с остальными
+    assert results == [ProcessResult.SUCCESS] * len(paths)
+
+
+@pytest.mark.parametrize('io_threads', [0, 2])
+def test_memory_limit_bounds_files_in_the_pool(make_image, monkeypatch, io_threads):
+    medium = [make_image(f'medium{index}.png', size=(600, 800), seed=index) for index in range(8)]
+    large = make_image('large.png', size=(1200, 1600), seed=8)
+    memory = {path: estimate_memory(path) for path in [*medium, large]}
+    limit = int(memory[medium[0]] * 2.5)
+    assert memory[large] > limit
+    in_pool = {}
+    snapshots = []   # Файлы в пуле в момент каждой отправки
+    lock = threading.Lock()
+
+    class TrackingPool(ProcessPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            future = super().submit(fn, *args, **kwargs)
+            if fn is not batch._warm_up:
+                with lock:
+                    in_pool[future] = args[0]
+                    snapshots.append(sorted(in_pool.values()))
+                future.add_done_callback(self.done)
+            return future
+
+        @staticmethod
+        def done(future):
+            with lock:
+                in_pool.pop(future, None)
+
+    monkeypatch.setattr(batch, 'ProcessPoolExecutor', TrackingPool)
+    results = {}
+    deadline = time.monotonic() + 60
+    # Если файл больше предела так и не запустится, пакет останавливается, а не зависает
+    processor = BatchProcessor(lambda task, result: results.setdefault(task.path, result), max_workers=2,
+                               on_tick=lambda: time.monotonic() > deadline and processor.stop(),
+                               memory_limit=limit, io_threads=io_threads, dedup=False)
+    for index, path in enumerate([*medium[:4], large, *medium[4:]]):
+        processor.add_task(index, path, make_output_path(path))
+    processor.close()
+    processor.run()
+
+    # Файл больше предела тоже обработан
+    assert results == {path: ProcessResult.SUCCESS for path in [*medium, large]}
+    assert len(snapshots) == 9
+    for paths in snapshots:
+        # Сумма оценок в пределе, а файл больше предела — в пуле один
+        assert sum(memory[path] for path in paths) <= limit or paths == [large]
+    # Без предела в пуле было бы до 2 x max_workers файлов
+    assert max(map(len, snapshots)) == 2
+
+
+def read(path: str) -> bytes:
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def test_duplicates_get_a_copy_of_the_leader_result(make_image, tmp_path):
+    scan = make_image('scan.png', seed=1)
+    content = read(scan)
+    copies = [scan]
+    for name in ('copy1.png', 'copy2.png', 'copy.webp'):
+        copies.append(str(tmp_path / name))
+        with open(copies[-1], 'wb') as file:
+            file.write(content)
+    unique = make_image('unique.png', seed=2)
+    results = {}
+    profiler = Profiler()
+    processor = BatchProcessor(lambda task, result: results.setdefault(task.path, result), max_workers=2,
+                               profiler=profiler)
+    for index, path in enumerate([*copies, unique]):
+        processor.add_task(index, path, make_output_path(path))
+    processor.close()
+    processor.run()
+
+    assert set(results.values()) == {ProcessResult.SUCCESS} and len(results) == 5
+    # Файл с тем же содержимым, но другим форматом результата обрабатывается сам
+    assert (processor.duplicates, processor.duplicate_bytes) == (2, 2 * len(content))
+    leaders = {profile.path: profile.duplicate_of for profile in profiler.records}
+    png_copies = copies[:3]
+    [leader] = [path for path in png_copies if leaders[path] is None]
+    assert all(leaders[path] == leader for path in png_copies if path != leader)
+    assert leaders[copies[3]] is None and leaders[unique] is None
+    for path in png_copies:
+        assert read(make_output_path(path)) == read(make_output_path(leader))
+    assert cv2.imread(make_output_path(copies[3])).shape == (160, 260, 3)
+
+
+def test_duplicate_in_overwrite_mode_copies_the_overwritten_leader(make_image, tmp_path):
+    scan = make_image('scan.png', seed=1)
+    content = read(scan)
+    other = str(tmp_path / 'other.png')
+    late = str(tmp_path / 'late.png')
+    for path in (other, late):
+        with open(path, 'wb') as file:
+            file.write(content)
+    results = []
+    profiler = Profiler()
+
+    def on_result(task, result):
+        results.append((task.path, result))
+        if len(results) == 2:
+            # Перезаписанный результат первого файла заменили: дубликат берёт подпись записи,
+            # а не путь, и обрабатывается сам
+            make_image(results[0][0].rsplit(os.sep, 1)[1], size=(100, 100), border=0, seed=3)
+            processor.add_task(2, late, late)
+            processor.close()
+
+    processor = BatchProcessor(on_result, max_workers=1, profiler=profiler)
+    for index, path in enumerate((scan, other)):
+        processor.add_task(index, path, path)
+    processor.run()
+
+    assert [result for _, result in results] == [ProcessResult.SUCCESS] * 3
+    first, second = (path for path, _ in results[:2])
+    duplicate_of = {profile.path: profile.duplicate_of for profile in profiler.records}
+    assert duplicate_of == {first: None, second: first, late: None}
+    assert processor.duplicates == 1
+    assert cv2.imread(second).shape == (160, 260, 3)
+    assert cv2.imread(late).shape == (160, 260, 3)
+    assert read(late) == read(second)
+
+
+def test_duplicate_is_not_copied_from_overwritten_result(make_image):
+    # scan.png с содержимым A обработан, затем перезаписан содержимым B и обработан снова;
+    # other.png с содержимым A не должен получить копию scan_cropped.png, где теперь обрезанный B
+    scan = make_image('scan.png', seed=1)
+    with open(scan, 'rb') as file:
+        content_a = file.read()
+    other = os.path.join(os.path.dirname(scan), 'other.png')
+    results = []
+
+    def on_result(task, result):
+        results.append(result)
+        if len(results) == 1:
+            make_image('scan.png', size=(120, 180), border=10, seed=2)
+            processor.add_task(1, scan, make_output_path(scan))
+        elif len(results) == 2:
+            with open(other, 'wb') as file:
+                file.write(content_a)
+            processor.add_task(2, other, make_output_path(other))
+            processor.close()
+
+    processor = BatchProcessor(on_result, max_workers=1)
+    processor.add_task(0, scan, make_output_path(scan))
+    processor.run()
+
+    assert results == [ProcessResult.SUCCESS] * 3
+    assert processor.duplicates == 0
+    assert cv2.imread(make_output_path(scan)).shape == (100, 160, 3)
+    assert cv2.imread(make_output_path(other)).shape == (160, 260, 3)
+
+
+def test_cancel_mid_batch_leaves_no_partial_outputs(make_image, tmp_path):
+    kept = [make_image(f'kept{index}.png', seed=index) for index in range(4)]
+    dropped = [make_image(f'dropped{index}.png', size=(600, 800), seed=index) for index in range(20)]
+    results = {}
+
+    def on_result(task, result):
+        if not results:
+            # Отмена, пока часть файлов группы в пуле, часть прочитана наперёд, а часть ждёт в очереди
+            processor.cancel('drop')
+        results[task.path] = result
+
+    processor = BatchProcessor(on_result, max_workers=1, dedup=False)
+    for path in [*dropped, *kept]:
+        processor.add_task(path, path, make_output_path(path), group='drop' if path in dropped else 'keep')
+    processor.close()
+    processor.run()
+
+    assert set(results) == {*kept, *dropped}
+    assert all(results[path] == ProcessResult.SUCCESS for path in kept)
+    assert {results[path] for path in dropped} <= {ProcessResult.SUCCESS, ProcessResult.CANCELLED}
+    assert sum(results[path] == ProcessResult.CANCELLED for path in dropped) >= len(dropped) // 2
+    for path, result in results.items():
+        if result == ProcessResult.CANCELLED:
+            assert not os.path.exists(make_output_path(path))
+        else:
+            # Записанный результат целый: отмена не обрывает начатую запись
+            border = 20
+            height, width = cv2.imread(path).shape[:2]
+            assert cv2.imread(make_output_path(path)).shape == (height - 2 * border, width - 2 * border, 3)
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        os.path.basename(path) for path in [*results, *(make_output_path(path) for path, result in results.items()
+                                                       if result != ProcessResult.CANCELLED)]
+    )
+
+
+def test_large_file_is_not_starved_by_a_stream_of_small_ones(make_image, tmp_path):
+    small = make_image('small.png', size=(60, 80), border=10)
+    # Оценка памяти ~19 МБ: при AGING_BYTES_PER_SECOND крупный файл уступает мелким не дольше ~0.6 с
+    large = make_image('large.png', size=(1600, 2000), border=20)
+    order = []
+
+    def on_result(task, result):
+        order.append(task.task_id)
+        if len(order) == 20:
+            # Крупный файл добавляется, когда очередь уже полна мелких
+            processor.add_task('large', large, make_output_path(large))
+        if 'large' in order or len(order) > 2000:
+            processor.close()
+        else:
+            # Мелкие файлы поступают непрерывно: очередь ни на миг не пустеет
+            processor.add_task(len(order), small, str(tmp_path / f'out{len(order) % 8}.png'))
+
+    processor = BatchProcessor(on_result, max_workers=1, dedup=False)
+    for index in range(8):
+        processor.add_task(f'first{index}', small, str(tmp_path / f'out{index}.png'))
+    processor.run()
+
+    assert 'large' in order
+    assert order.index('large') < 2000
+
+
+def test_worker_uses_content_read_ahead(make_image):
+    path = make_image('img.png')
+    with open(path, 'rb') as file:
+        data = file.read()
+    # Процесс пула не читает файл снова, если этап чтения передал его содержимое
+    os.remove(path)
+    result, box, encoded, _ = _compute(path, make_output_path(path), ProcessingOptions(), None, data=data)
+    assert (result, box) == (ProcessResult.SUCCESS, (20, 180, 20, 280))
+    assert cv2.imdecode(encoded, cv2.IMREAD_UNCHANGED).shape == (160, 260, 3)
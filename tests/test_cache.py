@@ -0,0 +1,153 @@
+import itertools
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import stripeoff.cache as cache_module
+from stripeoff.batch import BatchProcessor, ProcessingOptions, make_output_path
+from stripeoff.cache import CacheEntry, ResultCache, encoding_key
+from stripeoff.constants import ProcessResult
+
+
+def run_batch(paths: list[str], options: ProcessingOptions) -> list[ProcessResult]:
+    results = []
+    processor = BatchProcessor(lambda task, result: results.append(result), max_workers=1, options=options)
+    for index, path in enumerate(paths):
+        processor.add_task(index, path, make_output_path(path))
+    processor.close()
+    processor.run()
+    return results
+
+
+def test_changed_encoder_preset_is_a_cache_miss(make_image, tmp_path):
+    path = make_image('img.png')
+    output_path = make_output_path(path)
+    options = ProcessingOptions(cache_path=str(tmp_path / 'cache.sqlite3'))
+
+    assert run_batch([path], options) == [ProcessResult.SUCCESS]
+    with open(output_path, 'rb') as file:
+        fastest = file.read()
+    assert run_batch([path], options) == [ProcessResult.SUCCESS]
+    assert run_batch([path], options._replace(encoder_preset='smallest')) == [ProcessResult.SUCCESS]
+    with open(output_path, 'rb') as file:
+        smallest = file.read()
+    # Копия перекодирована с новым набором параметров, а не взята из индекса
+    assert smallest != fastest
+
+
+def stored_cache(tmp_path, path: str, output_path: str, result=ProcessResult.SUCCESS, **kwargs) -> ResultCache:
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'), **kwargs)
+    cache.store(cache.file_key(path), output_path, result, (1, 2, 3, 4), encoding_key('fastest', False))
+    return cache
+
+
+def test_changed_thresholds_are_a_cache_miss(make_image, tmp_path, monkeypatch):
+    path = make_image('img.png')
+    output_path = make_image('out.png')
+    stored_cache(tmp_path, path, output_path).close()
+
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'))
+    assert cache.lookup(cache.file_key(path), output_path, encoding_key('fastest', False)) == CacheEntry(
+        ProcessResult.SUCCESS, (1, 2, 3, 4))
+    cache.close()
+    monkeypatch.setattr(cache_module, 'WHITE_THRESHOLD', 240)
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'))
+    assert cache.lookup(cache.file_key(path), output_path, encoding_key('fastest', False)) is None
+
+
+@pytest.mark.parametrize('change', ['deleted', 'touched', 'moved'])
+def test_changed_output_is_a_cache_miss(make_image, tmp_path, change):
+    path = make_image('img.png')
+    output_path = make_image('out.png')
+    cache = stored_cache(tmp_path, path, output_path)
+    key = cache.file_key(path)
+    encoding = encoding_key('fastest', False)
+    assert cache.lookup(key, output_path, encoding) is not None
+
+    if change == 'deleted':
+        os.remove(output_path)
+    elif change == 'touched':
+        stat = os.stat(output_path)
+        os.utime(output_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    else:
+        # Та же копия под другим именем: время изменения совпадает
+        stat = os.stat(output_path)
+        output_path = make_image('other.png')
+        os.utime(output_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.lookup(key, output_path, encoding) is None
+
+
+def test_content_hash_mismatch_is_a_cache_miss(make_image, tmp_path):
+    path = make_image('img.png')
+    output_path = make_image('out.png')
+    cache = stored_cache(tmp_path, path, output_path, use_hash=True)
+    encoding = encoding_key('fastest', False)
+
+    # Содержимое другое, а размер и время изменения те же
+    stat = os.stat(path)
+    with open(path, 'r+b') as file:
+        file.seek(-1, os.SEEK_END)
+        last = file.read(1)
+        file.seek(-1, os.SEEK_END)
+        file.write(bytes([last[0] ^ 1]))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    key = cache.file_key(path)
+    assert cache.lookup(key, output_path, encoding) is None
+    # Без хэша подмена незаметна
+    assert cache.lookup(key._replace(digest=None), output_path, encoding) is not None
+
+
+def test_evict_drops_least_recently_used_rows(make_image, tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(cache_module, 'time', SimpleNamespace(time=lambda: next(clock)))
+    path = make_image('img.png')
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'))
+    key = cache.file_key(path)
+    encoding = encoding_key('fastest', False)
+    names = [f'{tmp_path}/{index:04}-{"x" * 200}.png' for index in range(400)]
+    for name in names:
+        cache.store(key._replace(path=name), name, ProcessResult.SKIPPED, None, encoding)
+    # Первые записи использованы последними
+    for name in names[:10]:
+        assert cache.lookup(key._replace(path=name), name, encoding) is not None
+
+    cache.max_bytes = cache.size_bytes() // 2
+    cache.evict()
+    assert cache.size_bytes() <= cache.max_bytes
+    kept = [name for name in names if cache.lookup(key._replace(path=name), name, encoding) is not None]
+    assert names[:10] == kept[:10]
+    assert kept[10:] == names[-len(kept) + 10:]
+    assert 10 < len(kept) < len(names)
+
+
+def test_store_evicts_when_over_the_limit(make_image, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, 'EVICTION_CHECK_INTERVAL', 50)
+    path = make_image('img.png')
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'), max_bytes=32 * 1024)
+    key = cache.file_key(path)
+    for index in range(1000):
+        name = f'{tmp_path}/{index:04}-{"x" * 200}.png'
+        cache.store(key._replace(path=name), name, ProcessResult.SKIPPED, None, encoding_key('fastest', False))
+    assert cache.size_bytes() <= cache.max_bytes + 50 * 1024
+
+
+@pytest.mark.parametrize('result', [ProcessResult.ERROR, ProcessResult.CANCELLED])
+def test_errors_and_cancellations_are_not_stored(make_image, tmp_path, result):
+    path = make_image('img.png')
+    cache = stored_cache(tmp_path, path, make_output_path(path), result)
+    assert cache.lookup(cache.file_key(path), make_output_path(path), encoding_key('fastest', False)) is None
+    assert cache._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0] == 0
+
+
+def test_skipped_result_survives_an_encoder_preset_change(make_image, tmp_path):
+    path = make_image('img.png', border=0)
+    cache = stored_cache(tmp_path, path, make_output_path(path), ProcessResult.SKIPPED)
+    key = cache.file_key(path)
+
+    # Пропущенный файл не записывался, его результат от набора параметров кодера не зависит
+    assert cache.lookup(key, make_output_path(path), encoding_key('smallest', False)) == CacheEntry(
+        ProcessResult.SKIPPED, (1, 2, 3, 4))
+    # А от режима JPEG без потерь зависит
+    assert cache.lookup(key, make_output_path(path), encoding_key('fastest', True)) is None
@@ -0,0 +1,114 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from stripeoff import jpeg
+from stripeoff.constants import MIN_BORDER_WIDTH, PREVIEW_MARGIN, WHITE_THRESHOLD, ProcessResult
+from stripeoff.core import (
+    CropResult, _build_empty_mask, _crop_data, _find_content_box, crop_array, crop_bytes, remove_borders,
+)
+from stripeoff.profiling import FileProfile
+
+
+def random_bordered_image(seed: int, channels: int, max_size: int = 120, narrow: bool = False) -> np.ndarray:
+    """Белая рамка случайной ширины (бывает и нулевой) вокруг шума с яркостью у порогов.
+
+    narrow=True — рамка уже MIN_BORDER_WIDTH: на таких файлах срабатывает превью JPEG.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = (int(value) for value in rng.integers(8, max_size, 2))
+    image = np.full((height, width, channels), 255, np.uint8)
+    top, bottom, left, right = (
+        int(rng.choice([0, rng.integers(0, MIN_BORDER_WIDTH) if narrow else rng.integers(0, size // 2)]))
+        for size in (height, height, width, width)
+    )
+    content = image[top:height - bottom, left:width - right]
+    # Тёмный шум или шум со средним около WHITE_THRESHOLD - PREVIEW_MARGIN: пиксели превью на грани «непустых»
+    low = int(rng.choice([0, WHITE_THRESHOLD - 2 * PREVIEW_MARGIN - 8]))
+    content[..., :3] = rng.integers(low, 256, content[..., :3].shape, np.uint8)
+    # Редкие одиночные непустые пиксели в самой рамке
+    for _ in range(int(rng.integers(0, 3))):
+        image[rng.integers(height), rng.integers(width), :3] = rng.integers(low, WHITE_THRESHOLD)
+    if channels == 4:
+        # Прозрачные пиксели пустые при любом цвете
+        image[..., 3] = np.where(rng.random((height, width)) < 0.1, 0, 255)
+    return image[..., 0] if channels == 1 else image
+
+
+def reference_box(image: np.ndarray):
+    """Границы содержимого по полной маске пустых пикселей."""
+    rows, columns = np.nonzero(~_build_empty_mask(image))
+    if not rows.size:
+        return None
+    return int(rows.min()), int(rows.max()) + 1, int(columns.min()), int(columns.max()) + 1
+
+
+@pytest.mark.parametrize('channels', [1, 3, 4])
+@pytest.mark.parametrize('seed', range(50))
+def test_edge_scan_matches_full_mask(seed, channels):
+    image = random_bordered_image(seed, channels)
+    assert _find_content_box(image) == reference_box(image)
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_jpeg_preview_gives_same_result_as_full_decode(seed):
+    image = random_bordered_image(seed, 3, max_size=400, narrow=seed % 2 == 0)
+    quality = int(np.random.default_rng(seed).integers(50, 100))
+    data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1]
+    full = _crop_data(data, '.jpg', False, False, 'fastest', None, encode=False)
+    fast = _crop_data(data, '.jpg', True, False, 'fastest', None, encode=False)
+    # Превью лишь пропускает файлы без рамки, поэтому итог и найденная рамка те же
+    assert fast[0] == full[0]
+    if full[0] == ProcessResult.SUCCESS:
+        assert fast[1] == full[1] == reference_box(cv2.imdecode(data, cv2.IMREAD_UNCHANGED))
+
+
+def test_lossless_jpeg_skips_border_narrower_than_mcu(tmp_path, monkeypatch):
+    # Рамка 10 пикселей сверху и слева: после выравнивания по MCU 16x16 обрезать нечего
+    image = np.full((160, 240, 3), 60, np.uint8)
+    image[:10], image[:, :10] = 255, 255
+    path = str(tmp_path / 'img.jpg')
+    assert cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 95, cv2.IMWRITE_JPEG_SAMPLING_FACTOR,
+                                     cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420])
+    # jpegtran до этого случая не доходит, поэтому достаточно файла, который всегда завершается ошибкой
+    jpegtran = tmp_path / 'jpegtran'
+    jpegtran.write_text('#!/bin/sh\nexit 1\n')
+    jpegtran.chmod(0o755)
+    monkeypatch.setenv(jpeg.JPEGTRAN_ENV, str(jpegtran))
+    jpeg.find_jpegtran.cache_clear()
+    try:
+        output_path = str(tmp_path / 'img_cropped.jpg')
+        assert remove_borders(path, output_path, lossless_jpeg=True) == ProcessResult.SKIPPED
+        assert not os.path.exists(output_path)
+        # Без обрезки без перекодирования та же рамка обрезается как обычно
+        assert remove_borders(path, output_path) == ProcessResult.SUCCESS
+    finally:
+        jpeg.find_jpegtran.cache_clear()
+
+
+def test_crop_bytes_accepts_extension_without_dot(make_image):
+    with open(make_image('img.png'), 'rb') as file:
+        data = file.read()
+    result = crop_bytes(data, 'PNG')
+    assert result.result == ProcessResult.SUCCESS
+    assert bytes(result.encoded[:8]) == b'\x89PNG\r\n\x1a\n'
+
+
+@pytest.mark.parametrize('data', [b'', b'garbage', np.empty(0, np.uint8)])
+def test_crop_bytes_reports_undecodable_data_as_error(data):
+    profile = FileProfile('<memory>')
+    assert crop_bytes(data, '.png', profile=profile) == CropResult(ProcessResult.ERROR, None)
+    assert profile.error == 'DecodeFailed'
+
+
+@pytest.mark.parametrize('ext', ['.tif', 'gif'])
+def test_unsupported_output_format_is_rejected(make_image, ext):
+    path = make_image('img.png')
+    with open(path, 'rb') as file:
+        data = file.read()
+    with pytest.raises(ValueError):
+        crop_bytes(data, ext)
+    with pytest.raises(ValueError):
+        crop_array(cv2.imread(path), ext)
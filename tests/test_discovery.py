@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from stripeoff.constants import SUPPORTED_EXTENSIONS
+from stripeoff.discovery import collect_images_from_paths, iter_images_from_paths
+
+
+def walk_images(root: str) -> list[str]:
+    """Прежний обход через os.walk: образец порядка и обработки ссылок."""
+    return [
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(root)
+        for name in names
+        if name.lower().endswith(SUPPORTED_EXTENSIONS)
+    ]
+
+
+def touch(path) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return str(path)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'root'
+    for name in ('b.png', 'A.JPG', 'notes.txt', 'c.webp', 'x/1.bmp', 'x/y/2.jpeg', 'x/y/z/3.png', 'x/readme.md',
+                 'w/4.PNG', 'w/deep/er/5.jpg', 'empty/.keep', 'v.png/6.png'):
+        touch(root / name)
+    return root
+
+
+def test_order_matches_os_walk(tree):
+    found = list(iter_images_from_paths([str(tree)]))
+    assert found == walk_images(str(tree))
+    assert len(found) == 9
+    # Папка с «расширением» изображения — всё равно папка
+    assert str(tree / 'v.png') not in found and str(tree / 'v.png' / '6.png') in found
+
+
+def test_symlinks_are_handled_like_os_walk(tree, tmp_path):
+    outside = tmp_path / 'outside'
+    touch(outside / 'linked.png')
+    os.symlink(outside, tree / 'x' / 'link_to_dir')
+    os.symlink(outside, tree / 'dir_link.png')
+    os.symlink(tree, tree / 'x' / 'y' / 'loop')
+    os.symlink(outside / 'linked.png', tree / 'link_to_file.png')
+    os.symlink(tmp_path / 'missing.png', tree / 'broken.png')
+
+    found = list(iter_images_from_paths([str(tree)]))
+    assert found == walk_images(str(tree))
+    # По ссылкам на папки не спускаемся (и не зацикливаемся), а ссылки на файлы перечисляются
+    assert not any(path.startswith(str(tree / 'x' / 'link_to_dir')) for path in found)
+    assert not any(path.startswith(str(tree / 'dir_link.png')) for path in found)
+    assert str(tree / 'link_to_file.png') in found
+    assert str(tree / 'broken.png') in found
+    # Переданная ссылка на папку раскрывается, как os.walk раскрывает корень
+    assert list(iter_images_from_paths([str(tree / 'x' / 'link_to_dir')])) == [
+        str(tree / 'x' / 'link_to_dir' / 'linked.png')]
+
+
+def test_paths_are_listed_in_the_given_order(tree, tmp_path):
+    single = touch(tmp_path / 'single.PNG')
+    ignored = touch(tmp_path / 'doc.pdf')
+    paths = [str(tree / 'x'), single, ignored, str(tmp_path / 'missing'), str(tree / 'w')]
+    assert collect_images_from_paths(paths) == [
+        *walk_images(str(tree / 'x')), single, *walk_images(str(tree / 'w'))]
+
+
+def test_stopped_interrupts_the_walk(tree):
+    seen = []
+
+    def stopped():
+        return len(seen) >= 3
+
+    for path in iter_images_from_paths([str(tree), str(tree / 'x')], stopped):
+        seen.append(path)
+    assert seen == walk_images(str(tree))[:3]
@@ -0,0 +1,48 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from stripeoff.batch import make_output_path
+from stripeoff.cli import main
+from stripeoff.constants import ProcessResult
+from stripeoff.core import remove_borders
+from stripeoff.manifest import read_manifest
+
+
+@pytest.mark.parametrize('manifest_name', ['boxes.jsonl', 'boxes.csv'])
+def test_apply_manifest_matches_direct_crop(make_image, tmp_path, capsys, manifest_name):
+    cropped = [make_image('a.png', seed=1), make_image('b.png', size=(150, 90), border=12, seed=2)]
+    jpeg = str(tmp_path / 'c.jpg')
+    assert cv2.imwrite(jpeg, cv2.imread(cropped[0]))
+    cropped.append(jpeg)
+    changed = make_image('changed.png', seed=3)
+    borderless = make_image('borderless.png', border=0, seed=4)
+    manifest = str(tmp_path / 'manifest' / manifest_name)
+    os.mkdir(os.path.dirname(manifest))
+
+    assert main([str(tmp_path), '--detect-only', manifest, '--no-cache', '-j', '1']) == 0
+    entries = {entry.path: entry for entry in read_manifest(manifest)}
+    assert {path: entry.result for path, entry in entries.items()} == {
+        **{path: ProcessResult.SUCCESS for path in [*cropped, changed]}, borderless: ProcessResult.SKIPPED,
+    }
+    # Поиск рамок ничего не записывает
+    assert not any(os.path.exists(make_output_path(path)) for path in entries)
+
+    # Файл изменился после поиска: его рамка больше не верна, хотя и помещается в изображение
+    make_image('changed.png', size=(240, 320), border=40, seed=5)
+    capsys.readouterr()
+    assert main(['--apply', manifest, '--no-cache', '-j', '1']) == 1
+    assert f'changed  {changed}' in capsys.readouterr().out.splitlines()
+    assert not os.path.exists(make_output_path(changed))
+    assert not os.path.exists(make_output_path(borderless))
+
+    for path in cropped:
+        base, ext = os.path.splitext(path)
+        reference = f'{base}_reference{ext}'
+        assert remove_borders(path, reference) == ProcessResult.SUCCESS
+        assert entries[path].box is not None
+        with open(make_output_path(path), 'rb') as applied, open(reference, 'rb') as direct:
+            assert applied.read() == direct.read()
+    assert np.array_equal(cv2.imread(make_output_path(cropped[0])), cv2.imread(cropped[0])[20:180, 20:280])
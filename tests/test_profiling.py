@@ -0,0 +1,132 @@
+import json
+
+import pytest
+
+from stripeoff.cli import main
+from stripeoff.constants import ProcessResult
+from stripeoff.core import remove_borders
+from stripeoff.profiling import STAGES, FileProfile, Profiler, percentile
+
+
+@pytest.mark.parametrize('values, q, expected', [
+    ([], 50, 0.0),
+    ([3.0], 95, 3.0),
+    ([1.0, 2.0, 3.0, 4.0], 0, 1.0),
+    ([1.0, 2.0, 3.0, 4.0], 50, 2.5),
+    ([1.0, 2.0, 3.0, 4.0], 95, 3.85),
+    ([1.0, 2.0, 3.0, 4.0], 100, 4.0),
+    ([float(value) for value in range(101)], 95, 95.0),
+])
+def test_percentile(values, q, expected):
+    assert percentile(values, q) == pytest.approx(expected)
+
+
+def make_profiles() -> list[FileProfile]:
+    profiles = []
+    for index in range(20):
+        profile = FileProfile(f'{index}.png', result='success', input_bytes=100, output_bytes=60, total=index + 1.0)
+        # Этапы в разном порядке: сводка всё равно идёт в порядке STAGES
+        profile.stages = {'encode': 0.1 * (index + 1), 'decode': 0.01 * (index + 1)}
+        profiles.append(profile)
+    profiles.append(FileProfile('cached.png', result='skipped', cached=True, stages={'cache': 0.5}))
+    broken = FileProfile('broken.png', result='error', input_bytes=10)
+    broken.set_error(FileNotFoundError(2, 'No such file'))
+    profiles.append(broken)
+    return profiles
+
+
+def test_summary_reports_stage_percentiles():
+    profiler = Profiler()
+    for profile in make_profiles():
+        profiler.add(profile)
+    summary = profiler.summary()
+
+    assert summary['files'] == 22
+    assert (summary['input_bytes'], summary['output_bytes']) == (2010, 1200)
+    assert summary['results'] == {'success': 20, 'skipped': 1, 'error': 1}
+    assert summary['errors'] == {'FileNotFoundError': 1}
+    assert list(summary['stages']) == ['cache', 'decode', 'encode', 'total']
+    encode = summary['stages']['encode']
+    assert encode['count'] == 20
+    assert encode['sum'] == pytest.approx(21.0)
+    assert encode['p50'] == pytest.approx(1.05)
+    assert encode['p95'] == pytest.approx(1.905)
+    assert encode['max'] == pytest.approx(2.0)
+    assert summary['stages']['decode']['p50'] == pytest.approx(0.105)
+    assert summary['stages']['total']['count'] == 22
+
+    table = profiler.format_summary().splitlines()
+    assert table[0].split() == ['stage', 'count', 'total', 's', 'p50', 'ms', 'p95', 'ms', 'max', 'ms']
+    assert table[3].split() == ['encode', '20', '21.00', '1050.0', '1905.0', '2000.0']
+    assert table[-1] == 'errors: FileNotFoundError x1'
+
+
+def test_jsonl_export(tmp_path):
+    streamed = str(tmp_path / 'streamed.jsonl')
+    profiler = Profiler(streamed)
+    profiles = make_profiles()
+    for profile in profiles:
+        profiler.add(profile)
+    # Записи дописываются сразу, до закрытия: прерванный запуск их не теряет
+    with open(streamed, encoding='utf-8') as file:
+        assert len(file.readlines()) == len(profiles)
+    profiler.close()
+    exported = str(tmp_path / 'exported.jsonl')
+    profiler.write_jsonl(exported)
+
+    for path in (streamed, exported):
+        with open(path, encoding='utf-8') as file:
+            records = [json.loads(line) for line in file]
+        assert records == [json.loads(json.dumps(profile.to_dict())) for profile in profiles]
+    assert records[-1]['error'] == 'FileNotFoundError'
+    assert records[-1]['error_message'] == '[Errno 2] No such file'
+
+
+def test_set_error_records_exception_type(make_image, tmp_path):
+    missing = FileProfile(str(tmp_path / 'missing.png'))
+    assert remove_borders(missing.path, str(tmp_path / 'out.png'), profile=missing) == ProcessResult.ERROR
+    assert missing.error == 'FileNotFoundError'
+
+    unwritable = FileProfile(make_image('img.png'))
+    output_path = str(tmp_path / 'no-such-folder' / 'out.png')
+    assert remove_borders(unwritable.path, output_path, profile=unwritable) == ProcessResult.ERROR
+    assert unwritable.error == 'FileNotFoundError'
+    assert 'write' in unwritable.stages
+    assert output_path in unwritable.error_message
+
+    undecodable = FileProfile(str(tmp_path / 'broken.png'))
+    with open(undecodable.path, 'wb') as file:
+        file.write(b'\x89PNG\r\n\x1a\n' + b'\0' * 100)
+    assert remove_borders(undecodable.path, str(tmp_path / 'out.png'), profile=undecodable) == ProcessResult.ERROR
+    assert (undecodable.error, undecodable.error_message) == ('DecodeFailed', None)
+
+
+def test_cli_profile_writes_jsonl(make_image, tmp_path, capsys):
+    folder = tmp_path / 'in'
+    folder.mkdir()
+    cropped = make_image('in/a.png')
+    skipped = make_image('in/b.png', border=0, seed=1)
+    broken = str(folder / 'c.png')
+    with open(broken, 'wb') as file:
+        file.write(b'\x89PNG\r\n\x1a\n' + b'\0' * 100)
+    timings = str(tmp_path / 'timings.jsonl')
+
+    assert main([str(folder), '--profile', timings, '--no-cache', '-j', '1']) == 1
+    with open(timings, encoding='utf-8') as file:
+        records = {record['path']: record for record in map(json.loads, file)}
+    assert set(records) == {cropped, skipped, broken}
+    assert records[cropped]['result'] == 'success'
+    assert records[cropped]['box'] == [20, 180, 20, 280]
+    assert (records[cropped]['height'], records[cropped]['width'], records[cropped]['channels']) == (200, 300, 3)
+    assert records[cropped]['output_bytes'] > 0
+    assert {'read', 'decode', 'detect', 'encode', 'write'} <= set(records[cropped]['stages'])
+    assert records[skipped]['result'] == 'skipped'
+    assert records[broken]['result'] == 'error'
+    assert records[broken]['error'] == 'DecodeFailed'
+    for record in records.values():
+        assert set(record['stages']) <= set(STAGES)
+        assert record['total'] >= sum(record['stages'].values()) * 0.99
+        assert record['input_bytes'] > 0
+    # Сводка по этапам печатается после итогов
+    out = capsys.readouterr().out
+    assert 'p50 ms' in out and 'errors: DecodeFailed x1' in out
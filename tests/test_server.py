@@ -0,0 +1,241 @@
+import http.client
+import json
+import threading
+import time
+from contextlib import contextmanager
+from email import policy
+from email.parser import BytesParser
+from typing import Callable, Iterator
+from urllib.parse import quote
+
+import cv2
+import numpy as np
+import pytest
+
+from stripeoff.server import CropServer
+
+
+@contextmanager
+def running_server(**kwargs) -> Iterator[CropServer]:
+    server = CropServer(('127.0.0.1', 0), workers=1, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(scope='module')
+def server():
+    with running_server() as server:
+        yield server
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    """Счётчики запроса обновляются после отправки ответа: клиент может их опередить."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def request(server: CropServer, path: str, body: bytes = None, headers: dict = None,
+            method: str = 'POST') -> tuple[http.client.HTTPResponse, bytes]:
+    connection = http.client.HTTPConnection(*server.server_address, timeout=30)
+    connection.request(method, path, body, headers or {})
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    return response, data
+
+
+def multipart(files: list[tuple[str, bytes]]) -> tuple[bytes, dict]:
+    body = b''.join(
+        f'--x\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n\r\n'.encode() + data + b'\r\n'
+        for name, data in files
+    )
+    return body + b'--x--\r\n', {'Content-Type': 'multipart/form-data; boundary=x'}
+
+
+def parse_mixed(response: http.client.HTTPResponse, payload: bytes) -> list:
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b'Content-Type: ' + response.getheader('Content-Type').encode() + b'\r\n\r\n' + payload
+    )
+    return list(message.iter_parts())
+
+
+def read(path: str) -> bytes:
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def test_crop_round_trip(server, make_image):
+    path = make_image('img.png')
+    response, data = request(server, '/crop', read(path))
+    assert response.status == 200
+    assert response.getheader('Content-Type') == 'image/png'
+    assert response.getheader('X-StripeOff-Result') == 'success'
+    assert response.getheader('X-StripeOff-Box') == '20,180,20,280'
+    cropped = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+    assert np.array_equal(cropped, cv2.imread(path)[20:180, 20:280])
+
+    response, data = request(server, '/crop?format=jpg&preset=smallest', read(path))
+    assert response.status == 200
+    assert response.getheader('Content-Type') == 'image/jpeg'
+    assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED).shape == (160, 260, 3)
+
+
+def test_crop_returns_original_when_skipped(server, make_image):
+    body = read(make_image('img.png', border=0))
+    response, data = request(server, '/crop?format=webp', body)
+    assert response.status == 200
+    assert response.getheader('X-StripeOff-Result') == 'skipped'
+    assert response.getheader('X-StripeOff-Box') == '0,200,0,300'
+    assert response.getheader('Content-Type') == 'image/png'
+    assert data == body
+
+
+def test_detect_returns_json(server, make_image):
+    response, data = request(server, '/detect', read(make_image('img.png')))
+    assert response.status == 200
+    assert response.getheader('Content-Type') == 'application/json'
+    assert json.loads(data) == {'result': 'success', 'box': [20, 180, 20, 280]}
+    response, data = request(server, '/detect', read(make_image('plain.png', border=0)))
+    assert json.loads(data) == {'result': 'skipped', 'box': [0, 200, 0, 300]}
+
+
+@pytest.mark.parametrize('path', ['/crop', '/detect'])
+def test_undecodable_image_is_422(server, make_image, path):
+    truncated = read(make_image('img.png'))[:200]
+    response, data = request(server, path, truncated)
+    assert response.status == 422
+    assert 'cannot be decoded' in json.loads(data)['error']
+
+
+@pytest.mark.parametrize('query', ['format=tiff', 'preset=tiny'])
+def test_bad_query_is_400(server, make_image, query):
+    response, data = request(server, f'/crop?{query}', read(make_image('img.png')))
+    assert response.status == 400
+    assert query.split('=')[1] in json.loads(data)['error']
+
+
+@pytest.mark.parametrize('length, status', [(None, 411), (1001, 413)])
+def test_missing_or_too_large_length(server, monkeypatch, length, status):
+    monkeypatch.setattr(server, 'max_body', 1000)
+    # Только заголовки: тело без Content-Length или сверх предела сервер не читает
+    connection = http.client.HTTPConnection(*server.server_address, timeout=30)
+    connection.putrequest('POST', '/crop')
+    if length is not None:
+        connection.putheader('Content-Length', str(length))
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == status
+    assert 'error' in json.loads(response.read())
+    connection.close()
+
+
+def test_body_that_is_not_an_image_is_415(server):
+    response, data = request(server, '/crop', b'not an image at all')
+    assert response.status == 415
+    assert json.loads(data) == {'error': 'body is not a PNG, JPEG, BMP or WebP image'}
+
+
+def test_busy_server_answers_503(make_image):
+    with running_server(max_concurrency=1, queue_timeout=0.1) as server:
+        body = read(make_image('img.png'))
+        # Место в пуле занято другим запросом
+        assert server._slots.acquire(timeout=1)
+        try:
+            response, data = request(server, '/crop', body)
+            assert response.status == 503
+            assert json.loads(data) == {'error': 'server is busy, retry later'}
+        finally:
+            server._slots.release()
+        assert request(server, '/crop', body)[0].status == 200
+        wait_for(lambda: sum(server.metrics.responses.values()) == 2)
+        assert server.metrics.rejected == 1
+
+
+def test_batch(server, make_image):
+    files = [('a.png', read(make_image('a.png'))), ('b.png', read(make_image('b.png', border=0, seed=1))),
+             ('c.png', b'broken')]
+    response, payload = request(server, '/batch', *multipart(files))
+    assert response.status == 200
+    parts = parse_mixed(response, payload)
+    assert [part['X-StripeOff-Result'] for part in parts] == ['success', 'skipped', 'error']
+    assert [part.get_filename() for part in parts] == ['a.png', 'b.png', 'c.png']
+    assert parts[0]['X-StripeOff-Box'] == '20,180,20,280'
+    cropped = cv2.imdecode(np.frombuffer(parts[0].get_payload(decode=True), np.uint8), cv2.IMREAD_UNCHANGED)
+    assert cropped.shape == (160, 260, 3)
+    assert parts[1].get_payload(decode=True) == files[1][1]
+    assert parts[2].get_content_type() == 'application/json'
+
+    response, payload = request(server, '/batch?detect=1', *multipart(files))
+    assert response.status == 200
+    items = json.loads(payload)
+    assert items[:2] == [{'name': 'a.png', 'result': 'success', 'box': [20, 180, 20, 280]},
+                         {'name': 'b.png', 'result': 'skipped', 'box': [0, 200, 0, 300]}]
+    assert items[2]['name'] == 'c.png' and items[2]['result'] == 'error'
+
+    response, _ = request(server, '/batch', files[0][1], {'Content-Type': 'image/png'})
+    assert response.status == 400
+
+
+def test_metrics(make_image):
+    with running_server() as server:
+        body = read(make_image('img.png'))
+        for _ in range(3):
+            assert request(server, '/crop', body)[0].status == 200
+        assert request(server, '/detect', b'garbage')[0].status == 415
+        assert request(server, '/unknown', body)[0].status == 404
+        wait_for(lambda: sum(server.metrics.requests.values()) == 5)
+        response, data = request(server, '/metrics', method='GET')
+    assert response.status == 200
+    metrics = json.loads(data)
+    assert metrics['requests'] == {'/crop': 3, '/detect': 1, '/unknown': 1}
+    assert metrics['responses'] == {'200': 3, '415': 1, '404': 1}
+    assert metrics['results'] == {'success': 3}
+    assert metrics['bytes_in'] == 4 * len(body) + len(b'garbage')
+    assert metrics['latency_ms']['window'] == 5
+    assert metrics['latency_ms']['p50'] <= metrics['latency_ms']['p95'] <= metrics['latency_ms']['p99']
+    assert (metrics['workers'], metrics['max_concurrency'], metrics['inflight']) == (1, 2, 0)
+
+
+def test_batch_part_with_non_ascii_filename(server, make_image):
+    with open(make_image('img.png'), 'rb') as file:
+        data = file.read()
+    body = (b'--x\r\nContent-Disposition: form-data; name="file"; filename="\xd1\x81\xd0\xba\xd0\xb0\xd0\xbd.png"\r\n'
+            b'Content-Type: image/png\r\n\r\n' + data + b'\r\n--x--\r\n')
+    connection = http.client.HTTPConnection(*server.server_address, timeout=30)
+    connection.request('POST', '/batch', body, {'Content-Type': 'multipart/form-data; boundary=x'})
+    response = connection.getresponse()
+    assert response.status == 200
+    payload = response.read()
+    connection.close()
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b'Content-Type: ' + response.getheader('Content-Type').encode() + b'\r\n\r\n' + payload
+    )
+    [part] = message.iter_parts()
+    assert part['X-StripeOff-Result'] == 'success'
+    # Имя в UTF-8 — в filename*, а для клиентов без RFC 5987 — ASCII-вариант в filename
+    disposition = f"attachment; filename=\"____.png\"; filename*=UTF-8''{quote('скан.png')}"
+    assert f'Content-Disposition: {disposition}\r\n'.encode() in payload
+
+
+def test_socket_is_closed_when_pool_fails_to_start(monkeypatch):
+    def fail(self):
+        raise OSError('cannot start workers')
+
+    sockets = []
+    original_bind = CropServer.server_bind
+
+    def server_bind(self):
+        sockets.append(self.socket)
+        original_bind(self)
+
+    monkeypatch.setattr(CropServer, '_start_pool', fail)
+    monkeypatch.setattr(CropServer, 'server_bind', server_bind)
+    with pytest.raises(OSError, match='cannot start workers'):
+        CropServer(('127.0.0.1', 0), workers=1)
+    [sock] = sockets
+    assert sock.fileno() == -1
@@ -0,0 +1,130 @@
+import struct
+import zlib
+
+import cv2
+import numpy as np
+import pytest
+
+from stripeoff import core, strips
+from stripeoff.constants import ProcessResult
+from stripeoff.core import _crop_to_buffer, _find_content_box
+from stripeoff.strips import open_strip_reader
+
+
+def paeth(left: int, up: int, up_left: int) -> int:
+    estimate = left + up - up_left
+    distances = abs(estimate - left), abs(estimate - up), abs(estimate - up_left)
+    return (left, up, up_left)[distances.index(min(distances))]
+
+
+def filter_rows(rows: list[bytes], pixel_bytes: int) -> bytes:
+    """Отфильтровать строки PNG, перебирая по очереди все пять фильтров."""
+    filtered = bytearray()
+    previous = bytes(len(rows[0]))
+    for index, row in enumerate(rows):
+        kind = index % 5
+        out = bytearray()
+        for position, value in enumerate(row):
+            left = row[position - pixel_bytes] if position >= pixel_bytes else 0
+            up_left = previous[position - pixel_bytes] if position >= pixel_bytes else 0
+            predictor = (0, left, previous[position], (left + previous[position]) // 2,
+                         paeth(left, previous[position], up_left))[kind]
+            out.append((value - predictor) % 256)
+        filtered += bytes([kind]) + out
+        previous = row
+    return bytes(filtered)
+
+
+def write_png(path: str, samples: np.ndarray, color_type: int, depth: int = 8, chunks: tuple = ()) -> None:
+    """Записать PNG со всеми фильтрами строк: OpenCV не пишет палитру, серый с альфой и tRNS."""
+    samples = samples.astype('>u2' if depth == 16 else np.uint8)
+    height, width = samples.shape[:2]
+    rows = [row.tobytes() for row in samples.reshape(height, -1)]
+    raw = filter_rows(rows, len(rows[0]) // width)
+    data = bytearray(b'\x89PNG\r\n\x1a\n')
+    for kind, body in ((b'IHDR', struct.pack('>IIBBBBB', width, height, depth, color_type, 0, 0, 0)),
+                       *chunks, (b'IDAT', zlib.compress(raw)), (b'IEND', b'')):
+        data += struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body))
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def bordered(rng: np.random.Generator, channels: int, empty: int, full: int) -> np.ndarray:
+    """Поля со значением empty (сверху не уже 5 пикселей) вокруг шума от 0 до full // 2."""
+    height, width = (int(value) for value in rng.integers(40, 90, 2))
+    top, bottom, left, right = (int(value) for value in (rng.integers(5, 16), *rng.integers(0, 16, 3)))
+    image = np.full((height, width, channels), empty, np.uint32)
+    image[top:height - bottom, left:width - right] = rng.integers(0, full // 2, (
+        height - top - bottom, width - left - right, channels))
+    return image
+
+
+def make_file(tmp_path, kind: str, seed: int) -> str:
+    rng = np.random.default_rng(seed)
+    path = str(tmp_path / f'{kind}.{"bmp" if kind.startswith("bmp") else "png"}')
+    if kind in ('png-bgr', 'png-gray', 'png-bgr16', 'png-gray16'):
+        full = 65535 if kind.endswith('16') else 255
+        image = bordered(rng, 1 if 'gray' in kind else 3, full, full)
+        image = image.astype(np.uint16 if full > 255 else np.uint8)
+        assert cv2.imwrite(path, image[..., 0] if 'gray' in kind else image)
+    elif kind == 'png-bgra':
+        image = bordered(rng, 4, 0, 255).astype(np.uint8)
+        # Прозрачные поля с произвольным цветом
+        image[..., :3] = np.where(image[..., 3:] == 0, rng.integers(0, 256, image[..., :3].shape), image[..., :3])
+        image[..., 3] = np.where(image[..., 3] == 0, 0, 255)
+        assert cv2.imwrite(path, image)
+    elif kind == 'png-gray-alpha':
+        image = bordered(rng, 1, 0, 255)[..., 0]
+        alpha = np.where(image == 0, 0, 255)
+        write_png(path, np.stack([image, alpha], axis=2), 4)
+    elif kind == 'png-rgb-trns':
+        # Цвет (10, 20, 30) прозрачный по tRNS
+        image = bordered(rng, 3, 0, 255)
+        image[np.all(image == 0, axis=2)] = (10, 20, 30)
+        write_png(path, image, 2, chunks=((b'tRNS', struct.pack('>HHH', 10, 20, 30)),))
+    elif kind == 'png-rgba16':
+        image = bordered(rng, 4, 0, 65535)
+        image[..., 3] = np.where(image[..., 3] == 0, 0, 65535)
+        write_png(path, image, 6, depth=16)
+    elif kind == 'png-palette':
+        palette = bytes(value for index in range(256) for value in (index,) * 3)
+        write_png(path, bordered(rng, 1, 255, 255)[..., 0], 3, chunks=((b'PLTE', palette),))
+    else:
+        assert cv2.imwrite(path, bordered(rng, 3, 255, 255).astype(np.uint8))
+        if kind == 'bmp-top-down':
+            # Отрицательная высота: строки хранятся сверху вниз
+            with open(path, 'rb') as file:
+                data = bytearray(file.read())
+            offset, = struct.unpack('<I', data[10:14])
+            width, height = struct.unpack('<ii', data[18:26])
+            stride = (width * 3 + 3) & ~3
+            rows = np.frombuffer(data[offset:offset + stride * height], np.uint8).reshape(height, stride)
+            data[22:26] = struct.pack('<i', -height)
+            data[offset:offset + stride * height] = rows[::-1].tobytes()
+            with open(path, 'wb') as file:
+                file.write(data)
+    return path
+
+
+@pytest.mark.parametrize('strip_rows', [1, 7, 13])
+@pytest.mark.parametrize('kind', [
+    'png-bgr', 'png-bgra', 'png-gray', 'png-bgr16', 'png-gray16', 'png-gray-alpha', 'png-rgb-trns', 'png-rgba16',
+    'png-palette', 'bmp-bottom-up', 'bmp-top-down',
+])
+def test_stripwise_crop_matches_full_decode(tmp_path, monkeypatch, kind, strip_rows):
+    path = make_file(tmp_path, kind, seed=strip_rows)
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    box = _find_content_box(image)
+    top, bottom, left, right = box
+
+    row_bytes = image.shape[1] * (image.shape[2] if image.ndim == 3 else 1) * image.itemsize
+    monkeypatch.setattr(strips, 'STRIP_BYTES', row_bytes * strip_rows)
+    monkeypatch.setattr(core, 'STRIPWISE_MIN_BYTES', 0)
+    # Палитру читает обычный путь, остальное — полосами
+    assert (open_strip_reader(path, 0) is None) == (kind == 'png-palette')
+    result, stripwise_box, encoded = _crop_to_buffer(path, path, False, False)
+
+    assert result == ProcessResult.SUCCESS
+    assert stripwise_box == box
+    cropped = cv2.imdecode(np.asarray(encoded), cv2.IMREAD_UNCHANGED)
+    assert np.array_equal(cropped, image[top:bottom, left:right])
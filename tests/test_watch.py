@@ -0,0 +1,89 @@
+import os
+import time
+
+from stripeoff.watch import FolderWatcher
+
+SETTLE = 0.2
+
+
+def poll_until(watcher: FolderWatcher, expected: int, timeout: float = 5.0) -> list[str]:
+    """Опрашивать, пока не найдено expected файлов или не вышло время."""
+    found = []
+    deadline = time.monotonic() + timeout
+    while len(found) < expected and time.monotonic() < deadline:
+        found += watcher.poll()
+        time.sleep(0.02)
+    return found
+
+
+def test_new_file_is_reported_once_settled(make_image, tmp_path):
+    watcher = FolderWatcher([str(tmp_path)], settle=SETTLE)
+    assert watcher.poll() == []
+    path = make_image('img.png')
+
+    start = time.monotonic()
+    assert watcher.poll() == []
+    while time.monotonic() - start < SETTLE / 2:
+        assert watcher.poll() == []
+        time.sleep(0.02)
+    assert poll_until(watcher, 1) == [path]
+    assert time.monotonic() - start >= SETTLE
+    # Отданный файл не возвращается, пока не изменится
+    time.sleep(SETTLE)
+    assert watcher.poll() == []
+
+
+def test_growing_file_waits_until_writing_stops(make_image, tmp_path):
+    with open(make_image('source.png'), 'rb') as file:
+        data = file.read()
+    os.mkdir(tmp_path / 'in')
+    path = str(tmp_path / 'in' / 'img.png')
+    watcher = FolderWatcher([str(tmp_path / 'in')], settle=SETTLE)
+    step = len(data) // 4 + 1
+    with open(path, 'wb') as file:
+        for start in range(0, len(data), step):
+            file.write(data[start:start + step])
+            file.flush()
+            # Каждая порция дописывается раньше, чем файл успевает устояться
+            for _ in range(3):
+                assert watcher.poll() == []
+                time.sleep(SETTLE / 4)
+    assert poll_until(watcher, 1) == [path]
+
+
+def test_cropped_copies_and_own_results_are_ignored(make_image, tmp_path):
+    original = make_image('a.png')
+    # Каждый опрос — полный просмотр: уже известные файлы тоже проверяются через stat
+    watcher = FolderWatcher([str(tmp_path)], settle=SETTLE, full_rescan=0)
+    assert poll_until(watcher, 1) == [original]
+
+    make_image('a_cropped.png', seed=1)
+    make_image('b.JPG_cropped.png', seed=2)
+    # Обрезанная версия записана поверх оригинала самим обработчиком
+    make_image('a.png', size=(160, 260), seed=3)
+    watcher.mark_processed(original)
+    time.sleep(SETTLE)
+    assert poll_until(watcher, 1, timeout=SETTLE * 3) == []
+
+
+def test_file_changed_after_mark_processed_is_reported_again(make_image, tmp_path):
+    path = make_image('a.png')
+    # Перезапись на месте не меняет время изменения папки и находится полным просмотром
+    watcher = FolderWatcher([str(tmp_path)], settle=SETTLE, full_rescan=SETTLE)
+    assert poll_until(watcher, 1) == [path]
+    watcher.mark_processed(path)
+    time.sleep(SETTLE)
+    assert watcher.poll() == []
+
+    make_image('a.png', size=(220, 320), seed=1)
+    assert poll_until(watcher, 1) == [path]
+
+
+def test_files_in_new_subfolder_are_found(make_image, tmp_path):
+    # Полный просмотр только при первом опросе: подпапка находится по изменению времени папки
+    watcher = FolderWatcher([str(tmp_path)], settle=SETTLE, full_rescan=3600)
+    assert watcher.poll() == []
+    os.makedirs(tmp_path / 'new' / 'deep')
+    paths = [make_image('new/img.png'), make_image('new/deep/img.png', seed=1)]
+
+    assert sorted(poll_until(watcher, 2)) == sorted(paths)